@@ -1,9 +1,14 @@
 # home/admin.py
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 from .models import CustomUser, ProPlugin, AlternativePlugin, AudioDemo, Category, Subcategory, PluginSuggestion
+from .ranking import SCORE_FIELDS, recompute_plugins
+from . import leaderboards, moderation
 
 
 class CustomUserAdmin(UserAdmin):
@@ -28,9 +33,129 @@ class CustomUserAdmin(UserAdmin):
 
 
 admin.site.register(CustomUser, CustomUserAdmin)
-admin.site.register(ProPlugin)
-admin.site.register(AlternativePlugin)
-admin.site.register(AudioDemo)
-admin.site.register(Category)
-admin.site.register(Subcategory)
-admin.site.register(PluginSuggestion)
\ No newline at end of file
+
+
+# -----------------------
+# CATALOG ADMINS
+# -----------------------
+
+# changelists here can run to hundreds of thousands of rows: every list column
+# comes from the row itself or a select_related join, relation widgets are
+# autocompletes/raw ids instead of a <select> of the whole table, and counts are
+# estimated where the database can do that cheaply.
+
+# below this many rows an exact COUNT(*) is cheap enough
+ESTIMATE_ABOVE = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    # postgres keeps a row estimate per table in pg_class; good enough for the
+    # page links of an unfiltered changelist, which otherwise COUNT(*)s every load
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if hasattr(qs, "query") and not qs.query.where:
+            connection = connections[qs.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [qs.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] > ESTIMATE_ABOVE:
+                    return row[0]
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # no second COUNT(*) for the "x of y selected" line
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.action(description="Recompute ratings and ranking scores")
+def recompute_ratings(modeladmin, request, queryset):
+    pks = list(queryset.values_list("pk", flat=True))
+    updated = recompute_plugins(queryset.model, pks)
+    # bulk_update skips the signals that keep the category boards current
+    slugs = leaderboards.subcategory_slugs(queryset.model.subcategories.through.objects.filter(
+        **{f"{queryset.model._meta.model_name}_id__in": pks}
+    ).values("subcategory_id"))
+    leaderboards.mark_dirty(queryset.model.plugin_type, slugs, leaderboards.metrics_for(SCORE_FIELDS))
+    modeladmin.message_user(request, f"Recomputed {len(pks)} plugins, {updated} changed.", messages.SUCCESS)
+
+
+class PluginAdmin(LargeTableAdmin):
+    list_display = ("name", "price", "rating", "rating_count", "date_released", "submitter")
+    list_select_related = ("submitter",)
+    # the default order scans alt_released_idx/pro_released_idx
+    ordering = ("-date_released",)
+    search_fields = ("name",)
+    raw_id_fields = ("submitter",)
+    readonly_fields = ("rating", "rating_count", "bayes_score", "trending_score", "updated_at")
+    actions = [recompute_ratings]
+
+
+@admin.register(ProPlugin)
+class ProPluginAdmin(PluginAdmin):
+    autocomplete_fields = ("subcategories", "alternatives")
+
+
+@admin.register(AlternativePlugin)
+class AlternativePluginAdmin(PluginAdmin):
+    autocomplete_fields = ("subcategories",)
+
+
+@admin.register(AudioDemo)
+class AudioDemoAdmin(LargeTableAdmin):
+    list_display = ("title", "pro_plugin", "alt_plugin")
+    list_select_related = ("pro_plugin", "alt_plugin")
+    ordering = ("-pk",)
+    search_fields = ("title",)
+    autocomplete_fields = ("pro_plugin", "alt_plugin")
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("name", "slug")
+    search_fields = ("name",)
+
+
+@admin.register(Subcategory)
+class SubcategoryAdmin(admin.ModelAdmin):
+    # __str__ would follow parent for every row
+    list_display = ("name", "slug", "parent")
+    list_select_related = ("parent",)
+    list_filter = ("parent",)
+    ordering = ("parent__name", "name")
+    # the plugin admins' subcategory autocompletes search these
+    search_fields = ("name", "parent__name")
+
+    def get_queryset(self, request):
+        # autocomplete results are labelled with __str__ too
+        return super().get_queryset(request).select_related("parent")
+
+
+def _set_status(modeladmin, request, queryset, status):
+    ids = moderation.set_status(queryset.values("pk"), status)
+    modeladmin.message_user(request, f"Marked {len(ids)} suggestions as {status.lower()}.", messages.SUCCESS)
+
+
+@admin.action(description="Approve selected suggestions")
+def approve_suggestions(modeladmin, request, queryset):
+    _set_status(modeladmin, request, queryset, "APPROVED")
+
+
+@admin.action(description="Reject selected suggestions")
+def reject_suggestions(modeladmin, request, queryset):
+    _set_status(modeladmin, request, queryset, "REJECTED")
+
+
+@admin.register(PluginSuggestion)
+class PluginSuggestionAdmin(LargeTableAdmin):
+    list_display = ("name", "suggested_type", "status", "submitter", "date_suggested", "duplicate_name")
+    list_select_related = ("submitter",)
+    list_filter = ("status", "suggested_type")
+    ordering = ("-date_suggested",)
+    search_fields = ("name", "link")
+    raw_id_fields = ("submitter",)
+    actions = [approve_suggestions, reject_suggestions]
\ No newline at end of file
@@ -0,0 +1,172 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import StoredAsset
+from . import metrics
+
+# -----------------------
+# MEDIA ASSET MANIFEST
+# -----------------------
+
+# cloudinary has no cheap "is this file there" call, so the storage records every
+# upload and delete in StoredAsset and answers exists()/size()/listdir() from it.
+# each process keeps the rows it has looked up (misses included) in a dict. a
+# write bumps a version number in the shared cache (settings.CACHES); a process
+# re-reads that version at most every VERSION_CHECK_INTERVAL seconds and drops
+# its dict when it changed, and drops it every MAX_AGE seconds regardless, in
+# case a bump got lost with an evicted key. so another worker's upload or delete
+# can take a second to show up here. the one check that can't wait,
+# get_available_name picking a free name for an upload, goes through uncached().
+#
+# files that reach the store some other way (the cloudinary console) only show up
+# after `manage.py reconcile_assets`. media from before the manifest existed is
+# listed once by migration 0047.
+
+VERSION_KEY = "assets:version"
+VERSION_CHECK_INTERVAL = 1.0
+MAX_AGE = 300
+
+# the dict is dropped past this many names, it only ever holds names the site asked about
+MAX_CACHED = 10000
+
+RESOURCE_TYPES = ("image", "video")
+
+_entries = {}
+_version = None
+_checked_at = 0.0
+_filled_at = 0.0
+_uncached = ContextVar("assets_uncached", default=False)
+
+
+def stored_names(name):
+    # the manifest names a storage name could mean: a stored "image:x" is itself,
+    # a bare name is a legacy row or an upload name ("plugin_images/x.png" is
+    # stored as "image:plugin_images/x")
+    if ":" in name:
+        return [name]
+    from .storage import resource_type_for
+
+    return [name, f"{resource_type_for(name)}:{os.path.splitext(name)[0]}"]
+
+
+def _current_entries():
+    global _entries, _version, _checked_at, _filled_at
+    now = time.monotonic()
+    if now - _checked_at < VERSION_CHECK_INTERVAL and len(_entries) <= MAX_CACHED:
+        return _entries
+    version = cache.get(VERSION_KEY, 0)
+    _checked_at = now
+    if version != _version or now - _filled_at > MAX_AGE or len(_entries) > MAX_CACHED:
+        _entries, _version, _filled_at = {}, version, now
+    return _entries
+
+
+def _bump_version():
+    global _entries, _checked_at
+    try:
+        cache.incr(VERSION_KEY)
+        # the database cache's incr is a set, which puts the default timeout back on
+        cache.touch(VERSION_KEY, None)
+    except ValueError:
+        # a fresh epoch, so a lost counter can't come back round to a version a process still holds
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+    # this process sees its own writes straight away
+    _entries, _checked_at = {}, 0.0
+
+
+@contextmanager
+def uncached():
+    # lookups inside go straight to the table
+    token = _uncached.set(True)
+    try:
+        yield
+    finally:
+        _uncached.reset(token)
+
+
+def lookup(name):
+    # (size, resource_type, checksum) for a stored file, None if there's no such file
+    candidates = stored_names(name)
+    entries = {} if _uncached.get() else _current_entries()
+    missing = [candidate for candidate in candidates if candidate not in entries]
+    metrics.cache_lookup("asset_manifest", hits=not missing, misses=bool(missing))
+    if missing:
+        found = {
+            row[0]: row[1:]
+            for row in StoredAsset.objects.filter(name__in=missing).values_list("name", "size", "resource_type", "checksum")
+        }
+        for candidate in missing:
+            entries[candidate] = found.get(candidate)
+    return next((entries[candidate] for candidate in candidates if entries[candidate]), None)
+
+
+def listing(path):
+    # (directories, files) directly under a public id prefix, over every resource type
+    prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+    directories, files = set(), set()
+    for public_id in StoredAsset.objects.filter(public_id__startswith=prefix).values_list("public_id", flat=True):
+        head, sep, _ = public_id[len(prefix):].partition("/")
+        (directories if sep else files).add(head)
+    return sorted(directories), sorted(files)
+
+
+def record(name, resource_type, public_id, size, checksum):
+    StoredAsset.objects.update_or_create(
+        name=name,
+        defaults={
+            "resource_type": resource_type,
+            "public_id": public_id,
+            "size": size,
+            "checksum": checksum,
+            "verified_at": timezone.now(),
+        },
+    )
+    _bump_version()
+
+
+def forget(names):
+    stored = {candidate for name in names for candidate in stored_names(name)}
+    if stored:
+        StoredAsset.objects.filter(name__in=stored).delete()
+        _bump_version()
+
+
+def reconcile(storage, page_size=500, log=None, model=StoredAsset):
+    # pages through everything in the store, upserts a row per file and then drops
+    # the rows nothing vouched for. anything uploaded while this runs is newer than
+    # `started`, so it's kept. `model` is for the backfill migration's historical
+    # model. returns (seen, removed)
+    started = timezone.now()
+    seen = 0
+    for resource_type in RESOURCE_TYPES:
+        cursor = None
+        while True:
+            items, cursor = storage.list_resources(resource_type, cursor, page_size)
+            rows = [
+                model(
+                    name=f"{resource_type}:{public_id}", resource_type=resource_type, public_id=public_id,
+                    size=size, checksum=checksum, verified_at=started,
+                )
+                for public_id, size, checksum in items
+            ]
+            # a listing without checksums keeps the ones the uploads recorded
+            for with_checksum in (True, False):
+                batch = [row for row in rows if bool(row.checksum) == with_checksum]
+                fields = ["resource_type", "public_id", "size", "verified_at"]
+                model.objects.bulk_create(
+                    batch, update_conflicts=True, unique_fields=["name"],
+                    update_fields=fields + ["checksum"] if with_checksum else fields,
+                )
+            seen += len(rows)
+            if log:
+                log(f"{resource_type}: {seen} files so far")
+            if not cursor:
+                break
+    removed, _ = model.objects.filter(verified_at__lt=started).delete()
+    _bump_version()
+    return seen, removed
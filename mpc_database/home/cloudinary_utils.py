@@ -1,17 +1,15 @@
-import cloudinary.uploader
 import logging
 
+from django.core.files.storage import default_storage
+
 logger = logging.getLogger(__name__)
 
+# delete a stored media file without letting a storage error take the request
+# down with it. default_storage is CloudinaryStorage, or its local stand-in
 def delete_cloudinary_file(name, default_resource_type="image"):
     if not name:
         return
-    if ":" in name:
-        resource_type, public_id = name.split(":", 1)
-    else:
-        public_id = name
-        resource_type = default_resource_type
     try:
-        cloudinary.uploader.destroy(public_id, resource_type=resource_type)
+        default_storage.delete(name, default_resource_type=default_resource_type)
     except Exception as e:
-        logger.warning(f"Failed to delete Cloudinary asset '{public_id}': {e}")
\ No newline at end of file
+        logger.warning(f"Failed to delete Cloudinary asset '{name}': {e}")
@@ -0,0 +1,139 @@
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from django.core.exceptions import ValidationError
+from django.db import connection, router, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed
+
+logger = logging.getLogger(__name__)
+
+# set a many-to-many relation to exactly new_ids with one read of the link table,
+# one bulk DELETE and one bulk INSERT. works on forward and reverse managers
+# (plugin.subcategories, alt.pro_plugins), and still sends m2m_changed so
+# receivers like the alternatives graph see the same add/remove events as .set()
+def sync_m2m(manager, new_ids):
+    instance = manager.instance
+    through = manager.through
+    source, target = manager.source_field_name, manager.target_field_name
+    db = router.db_for_write(through, instance=instance)
+
+    links = through._default_manager.using(db).filter(**{source: instance.pk})
+    current = set(links.values_list(f"{target}_id", flat=True))
+    new = {getattr(obj, "pk", obj) for obj in new_ids}
+    removed, added = current - new, new - current
+    if not removed and not added:
+        return added, removed
+
+    signal_kwargs = {"sender": through, "instance": instance, "reverse": manager.reverse, "model": manager.model, "using": db}
+    with transaction.atomic(using=db):
+        if removed:
+            m2m_changed.send(action="pre_remove", pk_set=removed, **signal_kwargs)
+            links.filter(**{f"{target}_id__in": removed}).delete()
+            m2m_changed.send(action="post_remove", pk_set=removed, **signal_kwargs)
+        if added:
+            m2m_changed.send(action="pre_add", pk_set=added, **signal_kwargs)
+            through._default_manager.using(db).bulk_create([
+                through(**{f"{source}_id": instance.pk, f"{target}_id": pk}) for pk in added
+            ])
+            m2m_changed.send(action="post_add", pk_set=added, **signal_kwargs)
+    return added, removed
+
+
+# logs how many queries (and how long) a block took, without turning on
+# DEBUG-style SQL capture
+@contextmanager
+def log_query_count(label):
+    count = 0
+
+    def counter(execute, sql, params, many, context):
+        nonlocal count
+        count += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        yield
+    logger.info("%s: %d queries in %.1f ms", label, count, (time.perf_counter() - start) * 1000)
+
+
+
+# every connection reports its queries to whoever is listening in the current
+# context: a profiled request, a request being timed. contextvars follow a request
+# across sync_to_async/async_to_sync hops, which an execute_wrapper() on the
+# thread's own `connection` doesn't. installed on each new connection (see
+# signals.py), costing one ContextVar lookup per query while nobody listens
+_query_listeners = contextvars.ContextVar("query_listeners", default=())
+
+
+def _report_queries(execute, sql, params, many, context):
+    listeners = _query_listeners.get()
+    if not listeners:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        for listener in listeners:
+            listener(elapsed)
+
+
+def install_query_reporting(connection):
+    if _report_queries not in connection.execute_wrappers:
+        # at the bottom, so execute_wrapper() blocks still pop their own wrapper
+        connection.execute_wrappers.insert(0, _report_queries)
+
+
+@contextmanager
+def listen_queries(listener):
+    # listener(seconds) is called once per query run inside the block
+    token = _query_listeners.set(_query_listeners.get() + (listener,))
+    try:
+        yield
+    finally:
+        _query_listeners.reset(token)
+
+
+class QueryStats:
+    # a listener that adds up count and time
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, elapsed):
+        self.count += 1
+        self.seconds += elapsed
+
+
+# keyset ("seek") pagination for queues and histories that only ever go forward.
+# the next page starts after the last row shown instead of at an OFFSET, so deep
+# pages cost the same index range scan as the first. rows are ordered by
+# (field, pk), "-field" for newest first, and the cursor is "<value>~<pk>" of
+# the last row on the page
+def keyset_page(qs, order, after=None, size=50):
+    field_name = order.lstrip("-")
+    op = "lt" if order.startswith("-") else "gt"
+    qs = qs.order_by(order, "-pk" if op == "lt" else "pk")
+    if after:
+        try:
+            value, pk = after.rsplit("~", 1)
+            value = qs.model._meta.get_field(field_name).to_python(value)
+            pk = int(pk)
+        except (ValueError, ValidationError):
+            # a mangled cursor starts over from the first page
+            value = None
+        if value is not None:
+            # the plain range condition in front is what the index seeks on
+            qs = qs.filter(**{f"{field_name}__{op}e": value}).filter(
+                Q(**{f"{field_name}__{op}": value}) | Q(**{field_name: value, f"pk__{op}": pk})
+            )
+    rows = list(qs[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    last = rows[size - 1]
+    value = last[field_name] if isinstance(last, dict) else getattr(last, field_name)
+    pk = last["id"] if isinstance(last, dict) else last.id
+    return rows[:size], f"{value.isoformat() if hasattr(value, 'isoformat') else value}~{pk}"
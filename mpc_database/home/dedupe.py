@@ -0,0 +1,292 @@
+import hashlib
+import random
+import re
+import unicodedata
+import zlib
+from urllib.parse import urlsplit
+
+from django.db import transaction
+
+from .models import ProPlugin, AlternativePlugin, PluginSuggestion, DedupeEntry, DedupeKey
+
+# -----------------------
+# DUPLICATE DETECTION
+# -----------------------
+
+# every plugin and pending suggestion is indexed under a small, fixed set of keys:
+# its normalized name, its canonical link and a handful of MinHash LSH bands over
+# the name's trigrams. two things that share any key are candidates, and
+# candidates are confirmed with an exact trigram Jaccard. a lookup is one key__in
+# query on an indexed column, however big the catalog gets. the link's domain is
+# not a key, every plugin on a popular host would be a candidate for every other;
+# it's kept on the entry and only lowers the bar for names that are already
+# candidates.
+
+NUM_HASHES = 32
+BANDS = 16  # 2 hashes per band, names with ~25%+ trigram overlap usually share a band
+
+# names at least this similar are flagged on their own, a shared link domain lowers the bar
+NAME_THRESHOLD = 0.6
+DOMAIN_THRESHOLD = 0.35
+
+# everything else is noise when comparing plugin names
+FORMAT_WORDS = {
+    "vst", "vst2", "vst3", "au", "aax", "clap", "plugin", "plugins", "plug", "x64", "x86",
+    "64bit", "32bit", "win", "mac", "free", "edition", "version", "bundle", "the",
+}
+BRACKETED = re.compile(r"\(.*?\)|\[.*?\]")
+# "Serum by Xfer Records", "Vital - Matt Tytel"
+VENDOR_SUFFIX = re.compile(r"\s+(by|from)\s+.*$|\s+[-|]\s+.*$")
+TRAILING_VERSION = re.compile(r"(\s+v?\d+(\.\d+)*)+$")
+
+# sites that host many vendors, the first path segment is the vendor
+SHARED_HOSTS = {"github.com", "gitlab.com", "gumroad.com", "bandcamp.com", "kvraudio.com", "sourceforge.net"}
+
+_rng = random.Random(0x5eed)
+_PRIME = (1 << 61) - 1
+_HASH_PARAMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+
+def normalize_name(name):
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(c for c in name if not unicodedata.combining(c)).casefold()
+    name = BRACKETED.sub(" ", name)
+    name = VENDOR_SUFFIX.sub("", name)
+    words = [w for w in re.sub(r"[^a-z0-9]+", " ", name).split() if w not in FORMAT_WORDS]
+    return TRAILING_VERSION.sub("", " ".join(words)).strip()
+
+
+def trigrams(normalized):
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)} if normalized else set()
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def minhash(shingles):
+    # stable across processes (unlike hash()), the bands end up in the database
+    values = [zlib.crc32(s.encode()) for s in shingles]
+    return [min((a * v + b) % _PRIME for v in values) for a, b in _HASH_PARAMS]
+
+
+def canonical_link(link):
+    # (domain key, full link key) or (None, None) for anything unparseable
+    parts = urlsplit((link or "").strip().lower())
+    host = (parts.hostname or "").removeprefix("www.")
+    if not host:
+        return None, None
+    path = parts.path.rstrip("/")
+    segments = [s for s in path.split("/") if s]
+    domain = f"{host}/{segments[0]}" if host in SHARED_HOSTS and segments else host
+    return domain, f"{host}{path}"
+
+
+def keys_for(normalized, link):
+    keys = []
+    if normalized:
+        keys.append(f"n:{normalized}")
+        signature = minhash(trigrams(normalized))
+        rows = NUM_HASHES // BANDS
+        for band in range(BANDS):
+            digest = hashlib.blake2b(repr(signature[band * rows:(band + 1) * rows]).encode(), digest_size=8)
+            keys.append(f"b{band}:{digest.hexdigest()}")
+    _, full_link = canonical_link(link)
+    if full_link:
+        keys.append(f"l:{full_link}"[:120])
+    return keys
+
+
+def domain_of(link):
+    return (canonical_link(link)[0] or "")[:120]
+
+
+# --- keeping the index current ---
+
+def _source(obj):
+    if isinstance(obj, PluginSuggestion):
+        return "sugg", obj.name, obj.link
+    return obj.plugin_type, obj.name, obj.download_link
+
+
+def _indexed_fields(obj):
+    # what the index is built from, straight off the instance dict: post_init
+    # mustn't load deferred fields, and one that was never loaded wasn't changed
+    fields = ("name", "link", "status") if isinstance(obj, PluginSuggestion) else ("name", "download_link")
+    return tuple(obj.__dict__.get(field) for field in fields)
+
+
+def remember(obj):
+    # post_init: what the row held when it was loaded
+    obj._dedupe_fields = _indexed_fields(obj)
+
+
+def index_if_changed(obj, created=False):
+    # a vote or an unrelated edit saves the plugin too, only a new name/link
+    # (or a suggestion leaving the queue) touches the index
+    fields = _indexed_fields(obj)
+    if created or fields != getattr(obj, "_dedupe_fields", None):
+        index_object(obj)
+        obj._dedupe_fields = fields
+
+
+def index_object(obj):
+    kind, name, link = _source(obj)
+    if kind == "sugg" and obj.status != "PENDING":
+        # only the open queue is worth matching against
+        return unindex_object(obj)
+    normalized = normalize_name(name)
+    with transaction.atomic():
+        entry, _ = DedupeEntry.objects.update_or_create(
+            kind=kind, object_id=obj.pk,
+            defaults={"label": name[:50], "normalized": normalized[:50], "domain": domain_of(link)},
+        )
+        entry.keys.all().delete()
+        DedupeKey.objects.bulk_create([DedupeKey(entry=entry, key=key) for key in keys_for(normalized, link)])
+
+
+def unindex_object(obj):
+    kind, _, _ = _source(obj)
+    DedupeEntry.objects.filter(kind=kind, object_id=obj.pk).delete()
+
+
+def unindex_suggestions(*ids):
+    # for status changes made with .update(), which skip post_save
+    DedupeEntry.objects.filter(kind="sugg", object_id__in=ids).delete()
+
+
+# --- lookups ---
+
+class Match:
+    __slots__ = ("kind", "object_id", "label", "reason", "score")
+
+    def __init__(self, kind, object_id, label, reason, score):
+        self.kind = kind
+        self.object_id = object_id
+        self.label = label
+        self.reason = reason
+        self.score = score
+
+
+def _best_match(normalized, link, candidates, exclude=None):
+    # candidates: (kind, object_id, label, normalized, domain, matched keys) sharing at least one key
+    shingles = trigrams(normalized)
+    domain, full_link = canonical_link(link)
+    domain = (domain or "")[:120]
+    best = None
+    for kind, object_id, label, other, other_domain, matched in candidates:
+        if (kind, object_id) == exclude:
+            continue
+        score = jaccard(shingles, trigrams(other))
+        if full_link and f"l:{full_link}"[:120] in matched:
+            match = Match(kind, object_id, label, "link", 1.0)
+        elif normalized and normalized == other:
+            match = Match(kind, object_id, label, "name", 1.0)
+        elif score >= NAME_THRESHOLD:
+            match = Match(kind, object_id, label, "similar", score)
+        elif score >= DOMAIN_THRESHOLD and domain and domain == other_domain:
+            match = Match(kind, object_id, label, "domain", score)
+        else:
+            continue
+        # catalog plugins win ties over other suggestions
+        rank = (match.score, match.kind != "sugg")
+        if best is None or rank > (best.score, best.kind != "sugg"):
+            best = match
+    return best
+
+
+def find_duplicate(name, link, exclude=None):
+    normalized = normalize_name(name)
+    keys = keys_for(normalized, link)
+    if not keys:
+        return None
+    candidates = {}
+    rows = DedupeKey.objects.filter(key__in=keys).values_list(
+        "key", "entry__kind", "entry__object_id", "entry__label", "entry__normalized", "entry__domain",
+    )
+    for key, kind, object_id, label, other, domain in rows:
+        candidates.setdefault((kind, object_id, label, other, domain), set()).add(key)
+    return _best_match(normalized, link, [(*c, matched) for c, matched in candidates.items()], exclude)
+
+
+def _apply_flag(suggestion, match):
+    suggestion.duplicate_kind = match.kind if match else ""
+    suggestion.duplicate_id = match.object_id if match else None
+    suggestion.duplicate_name = match.label if match else ""
+    suggestion.duplicate_reason = match.reason if match else ""
+    suggestion.duplicate_score = match.score if match else None
+
+
+DUPLICATE_FIELDS = ["duplicate_kind", "duplicate_id", "duplicate_name", "duplicate_reason", "duplicate_score"]
+
+
+def flag_suggestion(suggestion):
+    match = find_duplicate(suggestion.name, suggestion.link, exclude=("sugg", suggestion.pk))
+    _apply_flag(suggestion, match)
+    PluginSuggestion.objects.filter(pk=suggestion.pk).update(
+        **{field: getattr(suggestion, field) for field in DUPLICATE_FIELDS}
+    )
+    return match
+
+
+# --- batch ---
+
+def rebuild_index(log=None):
+    # rebuild every entry from scratch, then re-flag the whole pending queue in memory
+    sources = [
+        (ProPlugin.objects.values_list("pk", "name", "download_link"), ProPlugin.plugin_type),
+        (AlternativePlugin.objects.values_list("pk", "name", "download_link"), AlternativePlugin.plugin_type),
+        (PluginSuggestion.objects.filter(status="PENDING").values_list("pk", "name", "link"), "sugg"),
+    ]
+    entries, entry_keys = [], []
+    for rows, kind in sources:
+        for pk, name, link in rows.iterator(chunk_size=2000):
+            normalized = normalize_name(name)
+            entries.append(DedupeEntry(
+                kind=kind, object_id=pk, label=name[:50], normalized=normalized[:50], domain=domain_of(link),
+            ))
+            entry_keys.append(keys_for(normalized, link))
+
+    with transaction.atomic():
+        DedupeEntry.objects.all().delete()
+        DedupeEntry.objects.bulk_create(entries, batch_size=1000)
+        # bulk_create only sets pks on some backends, so look them up again
+        ids = {(kind, object_id): pk for pk, kind, object_id in DedupeEntry.objects.values_list("pk", "kind", "object_id")}
+        DedupeKey.objects.bulk_create(
+            [
+                DedupeKey(entry_id=ids[(entry.kind, entry.object_id)], key=key)
+                for entry, keys in zip(entries, entry_keys) for key in keys
+            ],
+            batch_size=5000,
+        )
+    if log:
+        log(f"indexed {len(entries)} plugins/suggestions")
+
+    # key -> entries, so every pending suggestion is matched without another query
+    by_key = {}
+    for entry, keys in zip(entries, entry_keys):
+        for key in keys:
+            by_key.setdefault(key, []).append(entry)
+
+    pending = list(PluginSuggestion.objects.filter(status="PENDING"))
+    flagged = 0
+    for suggestion in pending:
+        normalized = normalize_name(suggestion.name)
+        candidates = {}
+        for key in keys_for(normalized, suggestion.link):
+            for entry in by_key.get(key, ()):
+                candidates.setdefault(
+                    (entry.kind, entry.object_id, entry.label, entry.normalized, entry.domain), set()
+                ).add(key)
+        match = _best_match(
+            normalized, suggestion.link,
+            [(*c, matched) for c, matched in candidates.items()],
+            exclude=("sugg", suggestion.pk),
+        )
+        _apply_flag(suggestion, match)
+        flagged += bool(match)
+    PluginSuggestion.objects.bulk_update(pending, DUPLICATE_FIELDS, batch_size=500)
+    if log:
+        log(f"{flagged} of {len(pending)} pending suggestions look like duplicates")
+    return flagged, len(pending)
@@ -0,0 +1,122 @@
+import time
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import CatalogEvent, EventCheckpoint
+
+# -----------------------
+# CATALOG EVENT LOG
+# -----------------------
+
+# every create/update/delete/link change/vote on the catalog appends one
+# CatalogEvent (see the receivers in signals.py). anything derived from the
+# catalog can tail the log from its own checkpoint instead of rescanning tables:
+#
+#     for batch in consume("search-index"):
+#         for event in batch:
+#             ...
+#
+# ids come from the table's sequence, and a transaction that took its id early
+# can commit after one that took a later id, or roll back and never use it.
+# created_at is when the row went in, not when it committed, so it can't tell
+# the two apart. a reader therefore notes every id it steps over along with when
+# it first saw the gap, and looks for those ids again on every read: one that
+# has committed since is handed out then, one still missing after GAP_TIMEOUT is
+# taken to have rolled back. a consumer's checkpoint keeps those open gaps next
+# to its position, so nothing behind the cursor is lost between runs either.
+
+GAP_TIMEOUT = timedelta(minutes=10)
+# a jump this big is a restored dump or a reset sequence, not transactions in flight
+MAX_GAP = 1000
+BATCH_SIZE = 500
+
+
+def record(action, object_type, object_id, **data):
+    return CatalogEvent.objects.create(action=action, object_type=object_type, object_id=object_id, data=data)
+
+
+def record_many(action, object_type, object_ids, **data):
+    # one insert for a set-based change (a bulk approve, say)
+    now = timezone.now()
+    CatalogEvent.objects.bulk_create([
+        CatalogEvent(action=action, object_type=object_type, object_id=object_id, data=data, created_at=now)
+        for object_id in object_ids
+    ])
+
+
+def tail(after=0, batch_size=BATCH_SIZE, gaps=None, gap_timeout=GAP_TIMEOUT):
+    # yields lists of events with ids after `after`, in order, until caught up.
+    # `gaps` ({id: first seen}) is updated in place: ids stepped over are added,
+    # and the ones that commit later come out at the front of the next batch
+    gaps = {} if gaps is None else gaps
+    now = timezone.now()
+    late = []
+    if gaps:
+        late = list(CatalogEvent.objects.filter(pk__in=list(gaps)).order_by("pk"))
+        for event in late:
+            del gaps[event.pk]
+        for pk, seen in list(gaps.items()):
+            if now - seen > gap_timeout:
+                del gaps[pk]
+
+    position = after
+    while True:
+        events = list(CatalogEvent.objects.filter(pk__gt=position).order_by("pk")[:batch_size])
+        for event in events:
+            if event.pk - position - 1 <= MAX_GAP:
+                for missing in range(position + 1, event.pk):
+                    gaps.setdefault(missing, now)
+            position = event.pk
+        if late or events:
+            yield late + events
+        late = []
+        if len(events) < batch_size:
+            return
+
+
+def checkpoint(consumer):
+    # (position, open gaps) for a named consumer
+    point = EventCheckpoint.objects.get_or_create(consumer=consumer)[0]
+    return point.position, {int(pk): datetime.fromisoformat(seen) for pk, seen in point.gaps.items()}
+
+
+def advance(consumer, position, gaps):
+    EventCheckpoint.objects.filter(consumer=consumer).update(
+        position=position,
+        gaps={str(pk): seen.isoformat() for pk, seen in gaps.items()},
+        updated_at=timezone.now(),
+    )
+
+
+def consume(consumer, batch_size=BATCH_SIZE):
+    # tail() from a named checkpoint. the checkpoint moves past a batch once the
+    # caller asks for the next one, so a crash mid-batch replays it
+    position, gaps = checkpoint(consumer)
+    for batch in tail(position, batch_size, gaps):
+        yield batch
+        position = max(position, batch[-1].pk)
+        advance(consumer, position, gaps)
+
+
+def follow(consumer=None, after=0, interval=1.0, batch_size=BATCH_SIZE):
+    # consume()/tail() forever, polling every `interval` seconds once caught up
+    gaps = {}
+    while True:
+        batches = consume(consumer, batch_size) if consumer else tail(after, batch_size, gaps)
+        for batch in batches:
+            after = max(after, batch[-1].pk)
+            yield batch
+        time.sleep(interval)
+
+
+# --- signal helpers ---
+
+def record_save(object_type, instance, created, **data):
+    record("create" if created else "update", object_type, instance.pk, **data)
+
+
+def record_links(object_type, instance, relation, action, pk_set):
+    # m2m_changed post_add/post_remove/post_clear, from the side that changed
+    record("m2m", object_type, instance.pk, relation=relation, change=action.removeprefix("post_"), ids=sorted(pk_set or ()))
+
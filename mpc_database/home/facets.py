@@ -0,0 +1,235 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q, Count, Case, When, Value, CharField
+
+# -----------------------
+# FACETED FILTERING
+# -----------------------
+
+# multi-select filters for the plugins sidebar. values inside one facet are OR'd,
+# separate facets are AND'd. every facet gets its counts from one grouped query
+# that applies all the *other* active filters, so the numbers next to an option
+# are what you'd get by ticking it.
+
+# (slug, label, low, high) - low is inclusive, high is exclusive, None means open
+PRICE_BANDS = [
+    ("free", "Free", None, 1),
+    ("under50", "Under $50", 1, 50),
+    ("50to150", "$50 - $150", 50, 150),
+    ("over150", "$150+", 150, None),
+]
+
+# sizes are stored in MB
+SIZE_BANDS = [
+    ("small", "Under 100 MB", None, 100),
+    ("medium", "100 MB - 1 GB", 100, 1000),
+    ("large", "1 GB+", 1000, None),
+]
+
+# ratings go from 0.5 to 5, anything below that has never been rated
+RATING_BANDS = [
+    ("4up", "4 stars & up", 4, None),
+    ("3to4", "3 - 4 stars", 3, 4),
+    ("under3", "Under 3 stars", 0.5, 3),
+    ("unrated", "Not rated yet", None, 0.5),
+]
+
+# free-form min/max inputs under the bands, both ends inclusive
+RANGE_FILTERS = [
+    ("min_price", "price__gte"),
+    ("max_price", "price__lte"),
+    ("min_size", "size__gte"),
+    ("max_size", "size__lte"),
+]
+
+
+def range_filters(params):
+    # {param: Decimal} for the range inputs that hold a usable number
+    cleaned = {}
+    for param, _ in RANGE_FILTERS:
+        try:
+            value = Decimal(params.get(param, ""))
+        except InvalidOperation:
+            continue
+        if value.is_finite():
+            cleaned[param] = value
+    return cleaned
+
+
+def range_q(cleaned):
+    lookups = dict(RANGE_FILTERS)
+    return Q(**{lookups[param]: value for param, value in cleaned.items()})
+
+
+def toggle_query(params, key, value):
+    # querystring for the current filters with one value switched on/off
+    query = params.copy()
+    values = query.getlist(key)
+    if value in values:
+        values.remove(value)
+    else:
+        values.append(value)
+    query.setlist(key, values)
+    return "?" + query.urlencode()
+
+
+class BandFacet:
+    def __init__(self, param, title, field, bands):
+        self.param = param
+        self.title = title
+        self.field = field
+        self.bands = bands
+
+    def band_q(self, low, high):
+        q = Q()
+        if low is not None:
+            q &= Q(**{f"{self.field}__gte": low})
+        if high is not None:
+            q &= Q(**{f"{self.field}__lt": high})
+        return q
+
+    def selected(self, params):
+        known = {slug for slug, *_ in self.bands}
+        return [slug for slug in params.getlist(self.param) if slug in known]
+
+    def q(self, selected):
+        q = Q()
+        for slug, _, low, high in self.bands:
+            if slug in selected:
+                q |= self.band_q(low, high)
+        return q
+
+    def count_queryset(self, qs):
+        # label every row with its band, then count per band in one go
+        band = Case(
+            *[When(self.band_q(low, high), then=Value(slug)) for slug, _, low, high in self.bands],
+            output_field=CharField(),
+        )
+        return qs.annotate(facet_band=band).values("facet_band").annotate(n=Count("pk")).order_by()
+
+    def options(self, params, selected, rows):
+        counts = {row["facet_band"]: row["n"] for row in rows}
+        return {
+            "param": self.param,
+            "title": self.title,
+            "options": [
+                {
+                    "slug": slug,
+                    "label": label,
+                    "count": counts.get(slug, 0),
+                    "active": slug in selected,
+                    "query": toggle_query(params, self.param, slug),
+                }
+                for slug, label, _, _ in self.bands
+            ],
+        }
+
+
+class CategoryFacet:
+    # parent categories and subcategories share the ?category= param, same as before
+    param = "category"
+
+    def __init__(self, categories):
+        # categories come in with their subcategories prefetched, so slugs resolve without queries
+        self.categories = categories
+        self.parent_slugs = {cat.slug for cat in categories}
+        self.sub_parents = {sub.slug: cat.slug for cat in categories for sub in cat.subcategories.all()}
+
+    def selected(self, params):
+        slugs = params.getlist(self.param)
+        return [s for s in slugs if s in self.parent_slugs or s in self.sub_parents]
+
+    def open_parents(self, selected):
+        # which <details> should start expanded
+        return {self.sub_parents.get(slug, slug) for slug in selected}
+
+    def q(self, model, selected):
+        parents = [s for s in selected if s in self.parent_slugs]
+        subs = [s for s in selected if s not in self.parent_slugs]
+        # matching through a subquery keeps the outer listing free of join duplicates (no .distinct())
+        matching = model.objects.filter(
+            Q(subcategories__parent__slug__in=parents) | Q(subcategories__slug__in=subs)
+        ).values("pk")
+        return Q(pk__in=matching)
+
+    def count_querysets(self, qs):
+        return (
+            qs.filter(subcategories__isnull=False)
+            .values("subcategories").annotate(n=Count("pk", distinct=True)).order_by(),
+            qs.filter(subcategories__isnull=False)
+            .values("subcategories__parent").annotate(n=Count("pk", distinct=True)).order_by(),
+        )
+
+    def options(self, params, selected, sub_rows, parent_rows):
+        sub_counts = {row["subcategories"]: row["n"] for row in sub_rows}
+        parent_counts = {row["subcategories__parent"]: row["n"] for row in parent_rows}
+        return [
+            {
+                "category": cat,
+                "count": parent_counts.get(cat.pk, 0),
+                "active": cat.slug in selected,
+                "query": toggle_query(params, self.param, cat.slug),
+                "subcategories": [
+                    {
+                        "sub": sub,
+                        "count": sub_counts.get(sub.pk, 0),
+                        "active": sub.slug in selected,
+                        "query": toggle_query(params, self.param, sub.slug),
+                    }
+                    for sub in cat.subcategories.all()
+                ],
+            }
+            for cat in self.categories
+        ]
+
+
+BAND_FACETS = [
+    BandFacet("price", "Price", "price", PRICE_BANDS),
+    BandFacet("size", "Size", "size", SIZE_BANDS),
+    BandFacet("rating_band", "Rating", "rating", RATING_BANDS),
+]
+
+
+class PluginFacets:
+    def __init__(self, params, categories, model):
+        self.model = model
+        self.params = params.copy()
+        # the detail pages link with ?subcategory=, fold it into ?category=
+        for slug in self.params.pop("subcategory", []):
+            self.params.appendlist("category", slug)
+
+        self.category = CategoryFacet(categories)
+        self.selected = {"category": self.category.selected(self.params)}
+        for facet in BAND_FACETS:
+            self.selected[facet.param] = facet.selected(self.params)
+
+    def facet_q(self, param):
+        selected = self.selected[param]
+        if not selected:
+            return Q()
+        if param == "category":
+            return self.category.q(self.model, selected)
+        return next(f for f in BAND_FACETS if f.param == param).q(selected)
+
+    def apply(self, qs, exclude=None):
+        for param in self.selected:
+            if param != exclude:
+                qs = qs.filter(self.facet_q(param))
+        return qs
+
+    def count_querysets(self, qs):
+        # everything here is lazy; the view decides how to run them
+        querysets = list(self.category.count_querysets(self.apply(qs, exclude="category")))
+        querysets += [facet.count_queryset(self.apply(qs, exclude=facet.param)) for facet in BAND_FACETS]
+        return querysets
+
+    def sidebar(self, rows):
+        sub_rows, parent_rows, *band_rows = rows
+        return {
+            "categories": self.category.options(self.params, self.selected["category"], sub_rows, parent_rows),
+            "bands": [
+                facet.options(self.params, self.selected[facet.param], facet_rows)
+                for facet, facet_rows in zip(BAND_FACETS, band_rows)
+            ],
+            "open_parents": self.category.open_parents(self.selected["category"]),
+        }
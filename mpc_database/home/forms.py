@@ -3,6 +3,7 @@ from django import forms
 from django.contrib.auth.forms import AdminUserCreationForm, UserChangeForm, AuthenticationForm, UserCreationForm
 from django.core.validators import FileExtensionValidator
 from .models import CustomUser, Category, ProPlugin, Subcategory, PluginSuggestion, validate_audio_size
+from .pickers import PickerField, PickerWidget
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -86,10 +87,8 @@ class StaffPluginSubmission(forms.Form):
         widget=forms.DateInput(attrs={"type": "date"})
     )
 
-    subcategory = forms.ModelMultipleChoiceField(
-        queryset=Subcategory.objects.select_related("parent").order_by("parent__name", "name"),
-        widget=forms.SelectMultiple()
-    )
+    # searchable pickers, see pickers.py. only the selected rows are ever rendered
+    subcategory = PickerField("subcategories")
 
     price = forms.IntegerField(label="Price (USD)")
     description = forms.CharField(label="Description", widget=forms.Textarea(attrs={"rows": "5"}))
@@ -98,17 +97,15 @@ class StaffPluginSubmission(forms.Form):
     image = forms.ImageField(label="Image of plugin", required=False)
 
     # only applies when plugin_type == ALT
-    link_to_pro_plugins = forms.ModelMultipleChoiceField(
+    link_to_pro_plugins = PickerField(
+        "pro_plugins",
         label="Link this alternative to Pro plugins",
-        queryset=ProPlugin.objects.none(),
         required=False,
-        widget=forms.CheckboxSelectMultiple,
         help_text="Search and check the Pro plugins this alternative belongs to."
     )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.fields["link_to_pro_plugins"].queryset = ProPlugin.objects.order_by("name")
 
         # tailwind for normal fields
         base = (
@@ -132,8 +129,8 @@ class StaffPluginSubmission(forms.Form):
                 })
                 continue
 
-            # not applying input styling to checkbox list container
-            if isinstance(widget, forms.CheckboxSelectMultiple):
+            # pickers style their own search box and list
+            if isinstance(widget, (forms.CheckboxSelectMultiple, PickerWidget)):
                 continue
 
             if isinstance(widget, forms.Select):
@@ -143,32 +140,6 @@ class StaffPluginSubmission(forms.Form):
             else:
                 widget.attrs.setdefault("class", base)
 
-        # subcategory 
-        subs = Subcategory.objects.select_related("parent").order_by("parent__name", "name")
-
-        # creating a new dictionary that is of the following structure
-        '''
-        {
-            "Effects": [
-                (3, "Chorus"),
-                (1, "Delay"),
-                (2, "Reverb"),
-            ],
-            "Dynamics": [
-                (4, "Compressor"),
-                (5, "Limiter"),
-            ]
-        }
-                
-        '''
-        grouped = {}
-        for sub in subs:
-            grouped.setdefault(sub.parent.name, []).append((sub.pk, sub.name))
-
-        self.fields["subcategory"].choices = [
-            (parent, choices) for parent, choices in grouped.items()
-        ]
-
         # file input styling stays the same
         self.fields["image"].widget.attrs.update({
             "class": (
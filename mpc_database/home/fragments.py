@@ -0,0 +1,77 @@
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+from . import metrics
+
+# -----------------------
+# CARD FRAGMENT CACHE
+# -----------------------
+
+# listing cards are rendered once per (plugin, version, tab) and stitched back
+# together from the cache. the key carries updated_at, rating and the category
+# label, so an edit, a new rating or a subcategory change simply misses and
+# re-renders; old fragments age out on their own. a page of cards is one get_many
+# and, for the misses, one set_many. hits, misses and bytes rendered are counted
+# in the process's metrics (metrics.py) rather than the cache, so a cache hit
+# costs nothing more; card_cache_stats reads them over every worker through
+# METRICS_DIR.
+
+CARD_TEMPLATE = "partials/plugin_card.html"
+# bump when plugin_card.html changes so deploys don't serve old markup
+CARD_VERSION = 1
+TIMEOUT = 60 * 60 * 24
+
+
+def fragment_cache():
+    return caches[getattr(settings, "FRAGMENT_CACHE", "default")]
+
+
+def card_key(card, tab):
+    updated = card.updated_at.timestamp() if card.updated_at else 0
+    # subcategory links and category renames don't touch updated_at, the label covers them
+    label = zlib.crc32((card.category_label or "").encode())
+    return f"card:v{CARD_VERSION}:{card.plugin_type}:{card.pk}:{updated}:{card.rating}:{label:08x}:{tab}"
+
+
+def render_cards(cards, tab):
+    cache = fragment_cache()
+    keys = [card_key(card, tab) for card in cards]
+    fragments = cache.get_many(keys)
+
+    missing = {}
+    template = loader.get_template(CARD_TEMPLATE)
+    for card, key in zip(cards, keys):
+        if key not in fragments:
+            missing[key] = fragments[key] = template.render({"plugin": card, "active_tab": tab})
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+
+    record(hits=len(keys) - len(missing), misses=len(missing), size=sum(len(f) for f in missing.values()))
+    return mark_safe("".join(fragments[key] for key in keys))
+
+
+# --- hit ratio ---
+
+def record(hits, misses, size):
+    metrics.cache_lookup("cards", hits=hits, misses=misses)
+    metrics.CARD_FRAGMENT_BYTES.inc(size)
+
+
+def stats():
+    # since each worker started, summed over every worker when METRICS_DIR is set
+    merged = metrics.collect()
+    lookups = merged.get(metrics.CACHE_LOOKUPS.name, {})
+    counts = {
+        "hits": lookups.get(("cards", "hit"), 0),
+        "misses": lookups.get(("cards", "miss"), 0),
+        "bytes": merged.get(metrics.CARD_FRAGMENT_BYTES.name, {}).get((), 0),
+    }
+    total = counts["hits"] + counts["misses"]
+    counts["hit_ratio"] = counts["hits"] / total if total else 0.0
+    # every miss stores one fragment, so this is the average fragment size
+    counts["avg_fragment_bytes"] = counts["bytes"] / counts["misses"] if counts["misses"] else 0
+    return counts
@@ -0,0 +1,198 @@
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ProPlugin
+from . import metrics
+
+# -----------------------
+# ALTERNATIVES GRAPH
+# -----------------------
+
+# ProPlugin.alternatives is a bipartite pro <-> alt graph. walking it with the ORM
+# costs a query per hop, so every process keeps the whole thing in memory as sorted
+# integer arrays per node and answers traversals without touching the db.
+#
+# m2m_changed/post_delete patch the local copy in place and bump a version number
+# in the shared cache once the transaction commits; other processes see the new
+# version on their next lookup and rebuild from the through table. the version
+# never expires, and when it's gone anyway (evicted, cache flushed) it starts
+# again from the clock rather than from 1, so it can't come back round to a
+# number some process still holds. as with the asset manifest, every copy is
+# rebuilt after MAX_AGE seconds regardless, in case a bump got lost.
+
+VERSION_KEY = "alternatives_graph:version"
+MAX_AGE = 300
+
+OTHER_SIDE = {"pro": "alt", "alt": "pro"}
+
+
+class AlternativesGraph:
+    def __init__(self, edges=(), version=0):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.adjacency = {"pro": {}, "alt": {}}
+        for pro_id, alt_id in edges:
+            self.adjacency["pro"].setdefault(pro_id, []).append(alt_id)
+            self.adjacency["alt"].setdefault(alt_id, []).append(pro_id)
+        # one compact sorted array per node instead of a list of boxed ints
+        for side in self.adjacency.values():
+            for pk, ids in side.items():
+                side[pk] = array("q", sorted(ids))
+
+    @classmethod
+    def from_db(cls, version=0):
+        through = ProPlugin.alternatives.through
+        edges = through.objects.values_list("proplugin_id", "alternativeplugin_id")
+        return cls(edges.iterator(chunk_size=5000), version)
+
+    def neighbors(self, plugin_type, pk):
+        return self.adjacency[plugin_type].get(pk, ())
+
+    # --- incremental updates ---
+
+    def add(self, pro_id, alt_id):
+        for side, pk, other in (("pro", pro_id, alt_id), ("alt", alt_id, pro_id)):
+            ids = self.adjacency[side].setdefault(pk, array("q"))
+            i = bisect_left(ids, other)
+            if i == len(ids) or ids[i] != other:
+                insort(ids, other)
+
+    def remove(self, pro_id, alt_id):
+        for side, pk, other in (("pro", pro_id, alt_id), ("alt", alt_id, pro_id)):
+            ids = self.adjacency[side].get(pk)
+            if ids is None:
+                continue
+            i = bisect_left(ids, other)
+            if i < len(ids) and ids[i] == other:
+                del ids[i]
+            if not ids:
+                del self.adjacency[side][pk]
+
+    def drop(self, plugin_type, pk):
+        # every edge touching one node, for .clear() and deleted plugins
+        for other in list(self.neighbors(plugin_type, pk)):
+            if plugin_type == "pro":
+                self.remove(pk, other)
+            else:
+                self.remove(other, pk)
+
+    # --- queries ---
+
+    def k_hop(self, plugin_type, pk, hops):
+        # {plugin_type: {pk: distance}} for everything within `hops` edges, start excluded
+        seen = {"pro": {}, "alt": {}}
+        seen[plugin_type][pk] = 0
+        frontier, side = [pk], plugin_type
+        for distance in range(1, hops + 1):
+            other = OTHER_SIDE[side]
+            next_frontier = []
+            for node in frontier:
+                for neighbor in self.neighbors(side, node):
+                    if neighbor not in seen[other]:
+                        seen[other][neighbor] = distance
+                        next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier, side = next_frontier, other
+        del seen[plugin_type][pk]
+        return seen
+
+    def shared_alternatives(self, pro_id):
+        # {other pro: how many alternatives it shares with pro_id}
+        counts = Counter()
+        for alt_id in self.neighbors("pro", pro_id):
+            counts.update(self.neighbors("alt", alt_id))
+        counts.pop(pro_id, None)
+        return counts
+
+    def replacements(self, plugin_type, pk, limit=None):
+        # alternatives ranked by how much of this plugin's "family" they replace.
+        # the family is the pro plugin(s) in question plus every pro that shares an
+        # alternative with them; an alt scores one point per family member it replaces
+        if plugin_type == "pro":
+            family = {pk, *self.shared_alternatives(pk)}
+        else:
+            family = set()
+            for pro_id in self.neighbors("alt", pk):
+                family.add(pro_id)
+                family.update(self.shared_alternatives(pro_id))
+        scores = Counter()
+        for pro_id in family:
+            scores.update(self.neighbors("pro", pro_id))
+        if plugin_type == "alt":
+            scores.pop(pk, None)
+        return scores.most_common(limit)
+
+
+_graph = None
+
+
+def current_version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def get_graph():
+    # one cache read per lookup, a full rebuild only when another process changed the graph
+    global _graph
+    version = current_version()
+    stale = _graph is None or _graph.version != version or time.monotonic() - _graph.built_at > MAX_AGE
+    metrics.cache_lookup("alternatives_graph", hits=not stale, misses=stale)
+    if stale:
+        _graph = AlternativesGraph.from_db(version)
+    return _graph
+
+
+def _bump_version(apply):
+    # patch this process's copy, then tell the others to rebuild theirs
+    global _graph
+    try:
+        version = cache.incr(VERSION_KEY)
+        # the database cache's incr is a set, which puts the default timeout back on
+        cache.touch(VERSION_KEY, None)
+    except ValueError:
+        # a fresh epoch, well past anything the lost counter could have reached
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = current_version()
+    if _graph is None:
+        return
+    if _graph.version == version - 1:
+        apply(_graph)
+        _graph.version = version
+    else:
+        # we were already behind, a rebuild on the next lookup covers this change too
+        _graph = None
+
+
+def _after_commit(apply):
+    # the link table change can still roll back, and until it commits other
+    # processes rebuilding from the db wouldn't see it anyway
+    transaction.on_commit(lambda: _bump_version(apply))
+
+
+def edges_added(pro_ids, alt_ids):
+    pro_ids, alt_ids = tuple(pro_ids), tuple(alt_ids)
+
+    def apply(graph):
+        for pro_id in pro_ids:
+            for alt_id in alt_ids:
+                graph.add(pro_id, alt_id)
+    _after_commit(apply)
+
+
+def edges_removed(pro_ids, alt_ids):
+    pro_ids, alt_ids = tuple(pro_ids), tuple(alt_ids)
+
+    def apply(graph):
+        for pro_id in pro_ids:
+            for alt_id in alt_ids:
+                graph.remove(pro_id, alt_id)
+    _after_commit(apply)
+
+
+def node_dropped(plugin_type, pk):
+    _after_commit(lambda graph: graph.drop(plugin_type, pk))
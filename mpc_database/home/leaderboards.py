@@ -0,0 +1,133 @@
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    PLUGIN_MODELS, PLUGIN_SORTS, LISTING_PAGE_SIZE, LEADERBOARD_METRICS, Category, Subcategory, Leaderboard,
+)
+
+# -----------------------
+# CATEGORY LEADERBOARDS
+# -----------------------
+
+# ?category=<slug>&sort=<metric> is a subquery over the subcategory join plus a
+# sort over everything it matches. the first page of every such listing is kept
+# here as a list of plugin ids instead, rebuilt in full by `manage.py
+# rebuild_leaderboards`. a change that can move a plugin on a board (its
+# subcategories, or a field that board sorts on) only marks that board dirty,
+# with one upsert once the transaction commits; the listing reads around dirty
+# boards with the live query until `manage.py rebuild_leaderboards --dirty`
+# (run from cron) recomputes them. a burst of votes costs one recompute per
+# board, not one per vote, and none of it on the request.
+
+# one more than a page, so the listing knows whether there's a page 2
+BOARD_SIZE = LISTING_PAGE_SIZE + 1
+
+
+def board_ids(model, slug, metric, is_parent):
+    # same matching as CategoryFacet.q, same ordering as the listing
+    lookup = "subcategories__parent__slug" if is_parent else "subcategories__slug"
+    matching = model.objects.filter(**{lookup: slug}).values("pk")
+    qs = model.objects.filter(pk__in=matching).order_by(*PLUGIN_SORTS[metric])
+    return list(qs.values_list("pk", flat=True)[:BOARD_SIZE])
+
+
+def slug_kinds(slugs=None):
+    # {slug: is_parent}; a parent slug wins over a subcategory with the same slug, like in the facets
+    subs = Subcategory.objects.all()
+    parents = Category.objects.all()
+    if slugs is not None:
+        subs, parents = subs.filter(slug__in=slugs), parents.filter(slug__in=slugs)
+    kinds = {slug: False for slug in subs.values_list("slug", flat=True)}
+    kinds.update({slug: True for slug in parents.values_list("slug", flat=True)})
+    return kinds
+
+
+def metrics_for(fields):
+    # the boards whose order reads any of these fields; None (a full save) is all of them
+    if fields is None:
+        return LEADERBOARD_METRICS
+    fields = set(fields)
+    return tuple(
+        metric for metric in LEADERBOARD_METRICS
+        if fields & {field.lstrip("-") for field in PLUGIN_SORTS[metric]}
+    )
+
+
+def refresh_dirty(log=None):
+    # recomputes every board marked dirty. a board marked again while this runs
+    # gets its new ids but stays dirty for the next run
+    dirty = list(Leaderboard.objects.filter(dirty_at__isnull=False).values_list(
+        "pk", "plugin_type", "slug", "metric", "dirty_at",
+    ))
+    kinds = slug_kinds({slug for _, _, slug, _, _ in dirty})
+    # slugs that no longer exist
+    gone = [pk for pk, _, slug, _, _ in dirty if slug not in kinds]
+    Leaderboard.objects.filter(pk__in=gone).delete()
+    for pk, plugin_type, slug, metric, dirty_at in dirty:
+        if slug in kinds:
+            ids = board_ids(PLUGIN_MODELS[plugin_type], slug, metric, kinds[slug])
+            Leaderboard.objects.filter(pk=pk).update(plugin_ids=ids, refreshed_at=timezone.now())
+            Leaderboard.objects.filter(pk=pk, dirty_at=dirty_at).update(dirty_at=None)
+    if log:
+        log(f"refreshed {len(dirty) - len(gone)} leaderboards, dropped {len(gone)}")
+    return len(dirty)
+
+
+def rebuild(log=None):
+    boards = [
+        Leaderboard(plugin_type=plugin_type, slug=slug, metric=metric, plugin_ids=board_ids(model, slug, metric, is_parent))
+        for slug, is_parent in slug_kinds().items()
+        for plugin_type, model in PLUGIN_MODELS.items()
+        for metric in LEADERBOARD_METRICS
+    ]
+    with transaction.atomic():
+        Leaderboard.objects.all().delete()
+        Leaderboard.objects.bulk_create(boards, batch_size=500)
+    if log:
+        log(f"built {len(boards)} leaderboards")
+    return len(boards)
+
+
+# --- incremental ---
+
+# (plugin_type, slug, metric) boards waiting for the current transaction to
+# commit. a rolled-back transaction leaves its boards behind for the next commit
+# to mark, which only costs a redundant (still correct) recompute
+_pending = threading.local()
+
+
+def mark_dirty(plugin_type, slugs, metrics=LEADERBOARD_METRICS):
+    if not slugs or not metrics:
+        return
+    dirty = getattr(_pending, "dirty", None)
+    if dirty is None:
+        dirty = _pending.dirty = set()
+    dirty.update((plugin_type, slug, metric) for slug in slugs for metric in metrics)
+    transaction.on_commit(_flush)
+
+
+def _flush():
+    # the first callback after a commit does everything, the rest find nothing to do.
+    # boards that don't exist yet (a new category) are created dirty
+    dirty, _pending.dirty = getattr(_pending, "dirty", None), None
+    if not dirty:
+        return
+    now = timezone.now()
+    Leaderboard.objects.bulk_create(
+        [Leaderboard(plugin_type=plugin_type, slug=slug, metric=metric, dirty_at=now) for plugin_type, slug, metric in dirty],
+        update_conflicts=True, unique_fields=["plugin_type", "slug", "metric"], update_fields=["dirty_at"],
+    )
+
+
+def subcategory_slugs(subcategory_ids):
+    # a subcategory's board and its parent category's board
+    slugs = set()
+    for slug, parent_slug in Subcategory.objects.filter(pk__in=subcategory_ids).values_list("slug", "parent__slug"):
+        slugs.update((slug, parent_slug))
+    return slugs
+
+
+def plugin_slugs(plugin):
+    return subcategory_slugs(plugin.subcategories.values("pk"))
@@ -0,0 +1,63 @@
+import datetime
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.models import ProPlugin, AlternativePlugin
+
+
+def row_bytes(rows):
+    # rough size of what came over the wire: text by its encoded length, numbers/dates at a fixed width
+    total = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, str):
+                total += len(value.encode())
+            elif isinstance(value, bytes):
+                total += len(value)
+            elif isinstance(value, (int, float, Decimal)):
+                total += 8
+            elif isinstance(value, (datetime.date, datetime.datetime)):
+                total += 8
+    return total
+
+
+class Command(BaseCommand):
+    help = "Measures DB payload and Python allocations for full-model vs card-only plugin listings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=None, help="Rows per listing (default: the whole table)")
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        self.stdout.write(f"{'listing':28} {'rows':>6} {'db bytes':>10} {'py objects':>11} {'py KiB':>9}")
+        for model in (ProPlugin, AlternativePlugin):
+            full = model.objects.sorted_by("newest")
+            cards = full.cards()
+            if limit:
+                full, cards = full[:limit], cards[:limit]
+            for label, qs in ((f"{model.plugin_type} full models", full), (f"{model.plugin_type} cards", cards)):
+                rows, payload = self.fetch_raw(qs)
+                blocks, size = self.allocations(qs)
+                self.stdout.write(f"{label:28} {rows:6} {payload:10} {blocks:11} {size / 1024:9.1f}")
+
+    def fetch_raw(self, qs):
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return len(rows), row_bytes(rows)
+
+    def allocations(self, qs):
+        # objects still alive once the page's rows are materialized
+        qs = qs.all()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        rows = list(qs)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        diff = after.compare_to(before, "filename")
+        del rows
+        return sum(stat.count_diff for stat in diff), sum(stat.size_diff for stat in diff)
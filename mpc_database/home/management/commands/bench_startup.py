@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from statistics import median
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# one cold worker: import the wsgi app (django.setup, urlconf, template warm-up),
+# then push a single request through it. printed as json on the last line
+WORKER = """
+import io, json, sys, time
+start = time.perf_counter()
+from mpc_database.wsgi import application
+loaded = time.perf_counter()
+statuses = []
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": sys.argv[1], "QUERY_STRING": "",
+    "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+    "SERVER_PROTOCOL": "HTTP/1.1", "wsgi.url_scheme": "http",
+    "wsgi.input": io.BytesIO(), "wsgi.errors": sys.stderr,
+}
+b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+done = time.perf_counter()
+print(json.dumps({"load": loaded - start, "request": done - loaded, "status": statuses[0]}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Times cold worker starts: interpreter, app import and the first request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Cold starts per variant")
+        parser.add_argument("--path", default="/robots.txt", help="First request to serve")
+        parser.add_argument(
+            "--env", action="append", default=[], metavar="KEY=VALUE",
+            help="Also time a variant with this environment variable set (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        variants = [("as configured", {})]
+        for pair in options["env"]:
+            key, _, value = pair.partition("=")
+            variants.append((pair, {key: value}))
+
+        self.stdout.write(f"{'variant':28} {'total ms':>9} {'app load ms':>12} {'1st request ms':>15}  status")
+        for label, extra in variants:
+            totals, loads, requests = [], [], []
+            for _ in range(options["runs"]):
+                total, result = self.cold_start(options["path"], extra)
+                totals.append(total)
+                loads.append(result["load"] * 1000)
+                requests.append(result["request"] * 1000)
+            self.stdout.write(
+                f"{label:28} {median(totals):9.1f} {median(loads):12.1f} {median(requests):15.1f}  {result['status']}"
+            )
+
+    def cold_start(self, path, extra):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "mpc_database.settings", **extra}
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", WORKER, path], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        total = (time.perf_counter() - start) * 1000
+        if proc.returncode:
+            raise CommandError(proc.stderr.strip().splitlines()[-1])
+        return total, json.loads(proc.stdout.strip().splitlines()[-1])
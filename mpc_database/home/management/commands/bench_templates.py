@@ -0,0 +1,55 @@
+import time
+from statistics import median
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template import Engine, engines
+from django.test import RequestFactory
+
+from home.warmup import template_names
+
+
+class Command(BaseCommand):
+    help = "Times each template under home/templates with and without the cached loader"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20, help="Loads/renders per template")
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+        backend = engines["django"]
+        cached = backend.engine
+        # same setup as the real engine, minus the cache: every get_template re-reads and re-parses
+        uncached = Engine(
+            dirs=cached.dirs,
+            context_processors=cached.context_processors,
+            debug=cached.debug,
+            loaders=["django.template.loaders.filesystem.Loader", "django.template.loaders.app_directories.Loader"],
+            libraries=cached.libraries,
+            builtins=cached.builtins,
+        )
+        request = RequestFactory().get("/")
+        request.user = AnonymousUser()
+
+        self.stdout.write(f"{'template':40} {'uncached ms':>12} {'cached ms':>10} {'render ms':>10}")
+        for name in template_names():
+            uncached_ms = self.time(lambda: uncached.get_template(name), repeat)
+            cached.get_template(name)
+            cached_ms = self.time(lambda: cached.get_template(name), repeat)
+
+            # empty context, so this is the template's own cost; pages that need
+            # objects in the context to render at all show n/a
+            template = backend.get_template(name)
+            try:
+                render_ms = f"{self.time(lambda: template.render({}, request), repeat):10.3f}"
+            except Exception:
+                render_ms = f"{'n/a':>10}"
+            self.stdout.write(f"{name:40} {uncached_ms:12.3f} {cached_ms:10.3f} {render_ms}")
+
+    def time(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return median(timings)
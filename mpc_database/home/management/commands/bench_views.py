@@ -0,0 +1,64 @@
+import asyncio
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.test import Client, AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from home.models import ProPlugin, AlternativePlugin
+
+
+class Command(BaseCommand):
+    help = "Compares the catalog read views through the WSGI and ASGI handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Requests per URL")
+        parser.add_argument("--concurrency", type=int, default=8, help="In-flight requests on the ASGI path")
+
+    def handle(self, *args, **options):
+        n = options["requests"]
+        concurrency = options["concurrency"]
+
+        pro = ProPlugin.objects.order_by("pk").first()
+        alt = AlternativePlugin.objects.order_by("pk").first()
+        urls = [reverse("home"), reverse("plugins"), reverse("ajax_search") + "?q=pl"]
+        if pro:
+            urls.append(reverse("plugin_detail", args=[pro.pk]))
+        if alt:
+            urls.append(reverse("alt_plugin_detail", args=[alt.pk]))
+
+        # the test clients talk straight to the handlers, so there is no socket in the way
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            # asgi latency includes time spent queued behind the other in-flight requests
+            self.stdout.write(f"{'url':40} {'wsgi p50 ms':>12} {'wsgi req/s':>11} {'asgi p50 ms':>12} {'asgi req/s':>11}")
+            for url in urls:
+                wsgi_ms, wsgi_rps = self.bench_wsgi(url, n)
+                asgi_ms, asgi_rps = asyncio.run(self.bench_asgi(url, n, concurrency))
+                self.stdout.write(f"{url:40} {wsgi_ms:12.2f} {wsgi_rps:11.1f} {asgi_ms:12.2f} {asgi_rps:11.1f}")
+
+    def bench_wsgi(self, url, n):
+        client = Client()
+        timings = []
+        for _ in range(n):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        return median(timings), n / (sum(timings) / 1000)
+
+    async def bench_asgi(self, url, n, concurrency):
+        client = AsyncClient()
+        timings = []
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with gate:
+                start = time.perf_counter()
+                await client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(n)))
+        elapsed = time.perf_counter() - start
+        return median(timings), n / elapsed
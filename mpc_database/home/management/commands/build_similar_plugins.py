@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from home.similarity import build_neighbors
+
+
+class Command(BaseCommand):
+    help = "Computes the top-k similar plugins for every plugin the catalog event log says changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every plugin, not just changed ones")
+        parser.add_argument("-k", "--top-k", type=int, default=8, help="Neighbours kept per plugin")
+        parser.add_argument("--chunk-size", type=int, default=64, help="Plugins scored per batch")
+
+    def handle(self, *args, **options):
+        count = build_neighbors(
+            k=options["top_k"],
+            chunk_size=options["chunk_size"],
+            full=options["full"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Updated neighbour lists for {count} plugins."))
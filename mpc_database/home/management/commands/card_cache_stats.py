@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from home.fragments import stats
+from home.metrics import metrics_dir
+from home.models import ProPlugin, AlternativePlugin
+
+
+class Command(BaseCommand):
+    help = "Shows the plugin card fragment cache hit ratio and what it takes to hold every card"
+
+    def handle(self, *args, **options):
+        if not metrics_dir():
+            # this process's own counters, which never saw a request
+            raise CommandError("the counters are per worker, set METRICS_DIR so this can add them up")
+        counts = stats()
+        self.stdout.write(f"hits       {counts['hits']}")
+        self.stdout.write(f"misses     {counts['misses']}")
+        self.stdout.write(f"hit ratio  {counts['hit_ratio']:.1%}")
+        if counts["avg_fragment_bytes"]:
+            # both tabs only ever show their own type, so one fragment per plugin
+            plugins = ProPlugin.objects.count() + AlternativePlugin.objects.count()
+            total = counts["avg_fragment_bytes"] * plugins
+            self.stdout.write(f"avg card   {counts['avg_fragment_bytes'] / 1024:.1f} KiB")
+            self.stdout.write(f"all cards  {total / 1024 / 1024:.1f} MiB for {plugins} plugins")
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# what a worker imports before it can serve: settings, every app, the urlconf
+# and the template warm-up (see wsgi.py)
+TARGETS = {
+    "wsgi": "import mpc_database.wsgi",
+    "setup": "import django; django.setup()",
+}
+
+
+def parse_importtime(stderr):
+    # [(module, self us, cumulative us)] from python -X importtime's report
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Runs a fresh interpreter under -X importtime and sums the import cost per package"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=TARGETS, default="wsgi", help="What to import (default: the wsgi app)")
+        parser.add_argument("--top", type=int, default=15, help="Rows in each table")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "mpc_database.settings")}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", TARGETS[options["target"]]],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr.strip().splitlines()[-1])
+        rows = parse_importtime(result.stderr)
+        total = sum(self_us for _, self_us, _ in rows)
+
+        packages = defaultdict(lambda: [0, 0])
+        for name, self_us, _ in rows:
+            package = packages[name.split(".")[0]]
+            package[0] += 1
+            package[1] += self_us
+
+        top = options["top"]
+        self.stdout.write(f"{len(rows)} modules, {total / 1000:.1f} ms of imports\n")
+        self.stdout.write(f"{'package':32} {'modules':>8} {'self ms':>9} {'share':>7}")
+        for package, (count, self_us) in sorted(packages.items(), key=lambda item: -item[1][1])[:top]:
+            self.stdout.write(f"{package:32} {count:8} {self_us / 1000:9.1f} {self_us / total:7.1%}")
+
+        # a module's cumulative time includes everything it pulled in first
+        self.stdout.write(f"\n{'module':48} {'self ms':>9} {'cumulative ms':>14}")
+        for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+            self.stdout.write(f"{name:48} {self_us / 1000:9.1f} {cumulative_us / 1000:14.1f}")
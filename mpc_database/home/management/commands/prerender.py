@@ -0,0 +1,54 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from home.models import ProPlugin, AlternativePlugin
+from home.snapshots import snapshot_root, snapshot_path, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Writes static HTML snapshots of plugin detail pages to PRERENDER_ROOT for logged-out visitors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Re-render every page, not just ones without a snapshot")
+        parser.add_argument("--host", default=settings.ALLOWED_HOSTS[0], help="Host baked into canonical links")
+        parser.add_argument("--insecure", action="store_true", help="http:// instead of https:// links")
+
+    def handle(self, *args, **options):
+        root = snapshot_root()
+        if not root:
+            raise CommandError("Set PRERENDER_ROOT to turn snapshots on.")
+
+        # an (empty) session cookie makes SnapshotMiddleware step aside, so this
+        # renders the live anonymous page instead of reading back the old snapshot
+        client = Client(HTTP_HOST=options["host"], secure=not options["insecure"])
+        client.cookies[settings.SESSION_COOKIE_NAME] = ""
+
+        written = skipped = 0
+        for model in (ProPlugin, AlternativePlugin):
+            kept = set()
+            for pk in model.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=2000):
+                url = reverse(model.detail_url_name, args=[pk])
+                kept.add(str(pk))
+                if not options["full"] and os.path.exists(snapshot_path(url)):
+                    skipped += 1
+                    continue
+                response = client.get(url)
+                if response.status_code != 200:
+                    self.stderr.write(f"{url}: {response.status_code}, skipped")
+                    continue
+                write_snapshot(url, response.content)
+                written += 1
+
+            if options["full"]:
+                # plugins that disappeared without their post_delete firing
+                type_dir = os.path.dirname(os.path.dirname(snapshot_path(reverse(model.detail_url_name, args=[0]))))
+                if os.path.isdir(type_dir):
+                    for name in set(os.listdir(type_dir)) - kept:
+                        shutil.rmtree(os.path.join(type_dir, name), ignore_errors=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} snapshots ({skipped} already up to date)."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from home.leaderboards import rebuild, refresh_dirty
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the first-page leaderboard of every category/subcategory, sort and plugin type"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dirty", action="store_true", help="Only recompute the boards changes have marked dirty (run from cron)",
+        )
+
+    def handle(self, *args, **options):
+        if options["dirty"]:
+            count = refresh_dirty(log=self.stdout.write)
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {count} dirty leaderboards."))
+            return
+        count = rebuild(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} leaderboards."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from home.leaderboards import rebuild
+from home.ranking import recompute
+
+
+class Command(BaseCommand):
+    help = "Rebuilds every plugin's average, vote count, bayesian and trending scores from the ratings table"
+
+    def handle(self, *args, **options):
+        updated = recompute(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Updated scores on {updated} plugins."))
+        # the batch update skips the signals that keep the rating/trending boards current
+        if updated:
+            rebuild(log=self.stdout.write)
@@ -0,0 +1,17 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from home.assets import reconcile
+
+
+class Command(BaseCommand):
+    help = "Syncs the media asset manifest with what's actually in the media storage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=500, help="Files per listing call (cloudinary allows up to 500)")
+
+    def handle(self, *args, **options):
+        if not hasattr(default_storage, "list_resources"):
+            raise CommandError(f"{type(default_storage).__name__} can't list its files")
+        seen, removed = reconcile(default_storage, options["page_size"], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Done, {seen} files in the store, {removed} stale rows removed."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from home.dedupe import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the duplicate-detection index and re-flags every pending suggestion"
+
+    def handle(self, *args, **options):
+        flagged, pending = rebuild_index(log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(f"Done, {flagged}/{pending} pending suggestions flagged."))
@@ -0,0 +1,90 @@
+import os
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+
+class AssetParser(HTMLParser):
+    # static urls a browser fetches for a page. inside <picture> only the first
+    # <source> counts, that's the one a modern browser picks over the <img>
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+        self.in_picture = False
+        self.picture_done = False
+
+    def add(self, url):
+        url = (url or "").split("?")[0]
+        if url.startswith(settings.STATIC_URL) or url.startswith("/" + settings.STATIC_URL):
+            if url not in self.urls:
+                self.urls.append(url)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "picture":
+            self.in_picture, self.picture_done = True, False
+        elif tag == "source" and self.in_picture and not self.picture_done:
+            self.add(attrs.get("srcset", "").split(" ")[0])
+            self.picture_done = True
+        elif tag == "img" and not (self.in_picture and self.picture_done):
+            self.add(attrs.get("src"))
+        elif tag == "script":
+            self.add(attrs.get("src"))
+        elif tag == "link" and attrs.get("rel") in ("stylesheet", "preload", "icon"):
+            self.add(attrs.get("href"))
+
+    def handle_endtag(self, tag):
+        if tag == "picture":
+            self.in_picture = False
+
+
+class Command(BaseCommand):
+    help = "Totals the static bytes a first visit to each page downloads, before and after compression/variants (run collectstatic first)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=["/", "/plugins", "/about/"])
+
+    def handle(self, *args, **options):
+        root = settings.STATIC_ROOT
+        prefix = "/" + settings.STATIC_URL.lstrip("/")
+        with override_settings(ALLOWED_HOSTS=["testserver"]):
+            client = Client()
+            for path in options["paths"]:
+                parser = AssetParser()
+                parser.feed(client.get(path).content.decode())
+
+                self.stdout.write(f"\n{path}")
+                original_total = delivered_total = 0
+                for url in parser.urls:
+                    name = url[len(prefix):] if url.startswith(prefix) else url.lstrip("/")
+                    file_path = os.path.join(root, name)
+                    if not os.path.exists(file_path):
+                        self.stdout.write(f"  {name:60} missing from STATIC_ROOT")
+                        continue
+                    delivered = os.path.getsize(file_path)
+                    # whitenoise serves the .br/.gz next to it to browsers that accept them
+                    for suffix in (".br", ".gz"):
+                        if os.path.exists(file_path + suffix):
+                            delivered = min(delivered, os.path.getsize(file_path + suffix))
+                    original = self.original_size(name, delivered)
+                    original_total += original
+                    delivered_total += delivered
+                    self.stdout.write(f"  {name:60} {original / 1024:9.1f} KiB -> {delivered / 1024:9.1f} KiB")
+                self.stdout.write(f"  {'total':60} {original_total / 1024:9.1f} KiB -> {delivered_total / 1024:9.1f} KiB")
+
+    def original_size(self, name, fallback):
+        # the un-hashed, un-converted source file this url came from
+        manifest = {hashed: source for source, hashed in getattr(staticfiles_storage, "hashed_files", {}).items()}
+        source = manifest.get(name, name)
+        base, ext = os.path.splitext(source)
+        if ext in (".avif", ".webp"):
+            for original_ext in (".jpg", ".jpeg", ".png"):
+                path = os.path.join(settings.STATIC_ROOT, base + original_ext)
+                if os.path.exists(path):
+                    return os.path.getsize(path)
+        path = os.path.join(settings.STATIC_ROOT, source)
+        return os.path.getsize(path) if os.path.exists(path) else fallback
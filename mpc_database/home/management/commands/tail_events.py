@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from home import events
+
+
+class Command(BaseCommand):
+    help = "Prints catalog events as JSON lines, from an id or a named consumer's checkpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", help="Read from (and advance) this consumer's checkpoint")
+        parser.add_argument("--after", type=int, default=0, help="Start after this event id (without --consumer)")
+        parser.add_argument("--follow", action="store_true", help="Keep polling for new events")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --follow")
+        parser.add_argument("--batch-size", type=int, default=events.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        consumer, batch_size = options["consumer"], options["batch_size"]
+        if options["follow"]:
+            batches = events.follow(consumer, options["after"], options["interval"], batch_size)
+        elif consumer:
+            batches = events.consume(consumer, batch_size)
+        else:
+            batches = events.tail(options["after"], batch_size)
+
+        for batch in batches:
+            for event in batch:
+                self.stdout.write(json.dumps({
+                    "id": event.pk,
+                    "at": event.created_at.isoformat(),
+                    "action": event.action,
+                    "object_type": event.object_type,
+                    "object_id": event.object_id,
+                    "data": event.data,
+                }))
+            self.stdout.flush()
@@ -0,0 +1,295 @@
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .db_utils import QueryStats, listen_queries
+
+# -----------------------
+# APP METRICS
+# -----------------------
+
+# counters and histograms kept in process memory and served in Prometheus' text
+# format at /metrics. under gunicorn every worker has its own numbers, so with
+# METRICS_DIR set each process also writes them to METRICS_DIR/<pid>.json about
+# once a second, and /metrics adds up every file in there: whichever worker
+# answers the scrape reports all of them. ratios (zero-result searches, cache
+# hits) are left to the query side, e.g.
+#
+#     sum(rate(cache_lookups_total{result="hit"}[5m])) by (cache)
+#       / sum(rate(cache_lookups_total[5m])) by (cache)
+
+FLUSH_INTERVAL = 1.0
+
+# seconds, from a cached page to a slow upload
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# every metric, by name
+METRICS = {}
+
+_lock = threading.Lock()
+# the flusher thread and collect() both write this process's file
+_flush_lock = threading.Lock()
+_dirty = threading.Event()
+_flusher = None
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        # label values -> count
+        self.values = {}
+        METRICS[name] = self
+
+    def inc(self, amount=1, **labels):
+        if not amount:
+            return
+        key = tuple(str(labels[label]) for label in self.labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        _changed()
+
+    def merge(self, key, value, into):
+        into[key] = into.get(key, 0) + value
+
+    def lines(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_number(value)}"
+
+
+class Histogram(Counter):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with _lock:
+            # a count per bucket (the last one is +Inf), then the sum
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[bisect_left(self.buckets, value)] += 1
+            row[-1] += value
+        _changed()
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, key, value, into):
+        row = into.get(key)
+        into[key] = list(value) if row is None else [a + b for a, b in zip(row, value)]
+
+    def lines(self, values):
+        for key, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), row):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                yield f"{self.name}_bucket{_labels((*self.labels, 'le'), (*key, le))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_number(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+@contextmanager
+def timed(histogram, failures, **labels):
+    # latency of a call plus a failure count when it raises
+    try:
+        with histogram.time(**labels):
+            yield
+    except Exception:
+        failures.inc(**labels)
+        raise
+
+
+# --- what gets measured ---
+
+REQUESTS = Counter("http_requests_total", "Requests by view, method and status.", ("view", "method", "status"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency by view.", ("view", "method"))
+DB_QUERIES = Counter("db_queries_total", "Database queries by view.", ("view",))
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent in database queries by view.", ("view",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Database queries per request by view.", ("view",), buckets=QUERY_COUNT_BUCKETS,
+)
+VOTES = Counter("rating_votes_total", "Rating votes cast.", ("plugin_type",))
+SEARCHES = Counter("search_queries_total", "Search queries by where they came from.", ("source",))
+ZERO_RESULT_SEARCHES = Counter("search_zero_results_total", "Search queries that found nothing.", ("source",))
+STORAGE_SECONDS = Histogram("storage_operation_duration_seconds", "Media storage call latency.", ("operation",))
+STORAGE_FAILURES = Counter("storage_operation_failures_total", "Media storage calls that failed.", ("operation",))
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and hit/miss.", ("cache", "result"))
+CARD_FRAGMENT_BYTES = Counter("card_fragment_bytes_total", "Bytes of plugin card fragments rendered into the cache.")
+RATE_LIMITED = Counter("ratelimit_rejected_total", "Requests turned away by a rate limit.", ("limit",))
+
+
+def cache_lookup(cache, hits=0, misses=0):
+    CACHE_LOOKUPS.inc(hits, cache=cache, result="hit")
+    CACHE_LOOKUPS.inc(misses, cache=cache, result="miss")
+
+
+# --- multi-process aggregation ---
+
+def metrics_dir():
+    return getattr(settings, "METRICS_DIR", None)
+
+
+def _changed():
+    global _flusher
+    if not metrics_dir():
+        return
+    _dirty.set()
+    if _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+                _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        _dirty.wait()
+        _dirty.clear()
+        flush()
+        time.sleep(FLUSH_INTERVAL)
+
+
+def snapshot():
+    # {name: [[label values, value], ...]} for this process
+    with _lock:
+        return {
+            name: [[list(key), value] for key, value in metric.values.items()]
+            for name, metric in METRICS.items() if metric.values
+        }
+
+
+def flush():
+    directory = metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with _flush_lock:
+        with open(tmp, "w") as f:
+            json.dump(snapshot(), f)
+        os.replace(tmp, path)
+
+
+def collect():
+    # {name: {label values: value}}, over every process when METRICS_DIR is set
+    directory = metrics_dir()
+    if not directory:
+        return {name: dict(metric.values) for name, metric in METRICS.items()}
+    flush()
+    merged = {name: {} for name in METRICS}
+    for file_name in os.listdir(directory):
+        if not file_name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, file_name)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        for name, rows in data.items():
+            metric = METRICS.get(name)
+            if metric is None:
+                # from an older deploy
+                continue
+            for key, value in rows:
+                metric.merge(tuple(key), value, merged[name])
+    return merged
+
+
+def exposition():
+    merged = collect()
+    lines = []
+    for name, metric in METRICS.items():
+        lines.append(f"# HELP {name} {metric.help_text}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lines.extend(metric.lines(merged.get(name, {})))
+    return "\n".join(lines) + "\n"
+
+
+def _after_fork():
+    # a forked worker starts from zero, not from whatever the master had counted
+    global _flusher
+    for metric in METRICS.values():
+        metric.values = {}
+    _dirty.clear()
+    _flusher = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(flush)
+
+
+# --- middleware ---
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryStats()
+        start = time.perf_counter()
+        with listen_queries(queries):
+            response = self.get_response(request)
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryStats()
+        start = time.perf_counter()
+        with listen_queries(queries):
+            response = await self.get_response(request)
+        self.record(request, response, queries, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, queries, duration):
+        # url names, not paths, so every plugin's detail page is one series.
+        # static files and prerendered pages never reach the resolver
+        match = request.resolver_match
+        view = match.view_name if match else "none"
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        REQUEST_SECONDS.observe(duration, view=view, method=request.method)
+        DB_QUERIES.inc(queries.count, view=view)
+        DB_QUERY_SECONDS.inc(queries.seconds, view=view)
+        DB_QUERIES_PER_REQUEST.observe(queries.count, view=view)
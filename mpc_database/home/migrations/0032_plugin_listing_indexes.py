@@ -0,0 +1,69 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0031_alter_audiodemo_alt_plugin'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-date_released'], name='alt_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['name'], name='alt_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-rating', 'name'], name='alt_rating_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(condition=models.Q(('rating__gt', 0)), fields=['-rating'], name='alt_rated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['submitter', '-date_released'], name='alt_submitter_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['price'], name='alt_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['size'], name='alt_size_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-date_released'], name='pro_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['name'], name='pro_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-rating', 'name'], name='pro_rating_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(condition=models.Q(('rating__gt', 0)), fields=['-rating'], name='pro_rated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['submitter', '-date_released'], name='pro_submitter_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['price'], name='pro_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['size'], name='pro_size_idx'),
+        ),
+    ]
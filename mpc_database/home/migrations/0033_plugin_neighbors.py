@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0032_plugin_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alternativeplugin',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='proplugin',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.CreateModel(
+            name='PluginNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_type', models.CharField(choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin')], max_length=3)),
+                ('source_id', models.PositiveIntegerField()),
+                ('neighbor_type', models.CharField(choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin')], max_length=3)),
+                ('neighbor_id', models.PositiveIntegerField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('source_type', 'source_id', 'rank')},
+            },
+        ),
+    ]
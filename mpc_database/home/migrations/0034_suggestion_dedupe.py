@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0033_plugin_neighbors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pluginsuggestion',
+            name='duplicate_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pluginsuggestion',
+            name='duplicate_kind',
+            field=models.CharField(blank=True, choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin'), ('sugg', 'Pending suggestion')], max_length=4),
+        ),
+        migrations.AddField(
+            model_name='pluginsuggestion',
+            name='duplicate_name',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='pluginsuggestion',
+            name='duplicate_reason',
+            field=models.CharField(blank=True, choices=[('link', 'Same link'), ('name', 'Same name'), ('similar', 'Similar name'), ('domain', 'Similar name, same site')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='pluginsuggestion',
+            name='duplicate_score',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DedupeEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin'), ('sugg', 'Pending suggestion')], max_length=4)),
+                ('object_id', models.PositiveIntegerField()),
+                ('label', models.CharField(max_length=50)),
+                ('normalized', models.CharField(max_length=50)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DedupeKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(db_index=True, max_length=120)),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='keys', to='home.dedupeentry')),
+            ],
+        ),
+    ]
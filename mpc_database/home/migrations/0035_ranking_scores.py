@@ -0,0 +1,119 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:19
+
+import django.utils.timezone
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+
+# same formulas as home/ranking.py, frozen here. every existing vote gets rated_at
+# = now, so the trending score starts out as a plain (log) sum of vote weights
+def backfill_scores(apps, schema_editor):
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    Rating = apps.get_model('home', 'Rating')
+    models_by_name = {name: apps.get_model('home', name) for name in ('ProPlugin', 'AlternativePlugin')}
+
+    epoch = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+    now_term = (timezone.now() - epoch).total_seconds() / (7 * 86400 / math.log(2))
+    totals = {}
+    for name, model in models_by_name.items():
+        content_type = ContentType.objects.filter(app_label='home', model=name.lower()).first()
+        if content_type is None:
+            continue
+        rows = Rating.objects.filter(content_type=content_type).values('object_id').annotate(count=Count('id'), total=Sum('score'))
+        for row in rows:
+            totals[(name, row['object_id'])] = (row['count'], row['total'])
+    if not totals:
+        return
+
+    votes = sum(count for count, _ in totals.values())
+    mean = sum(total for _, total in totals.values()) / votes
+    prior_votes = max(3, votes / len(totals))
+    for (name, object_id), (count, total) in totals.items():
+        models_by_name[name].objects.filter(pk=object_id).update(
+            rating_count=count,
+            bayes_score=(prior_votes * mean + total) / (prior_votes + count),
+            trending_score=now_term + math.log(total / 5),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('home', '0034_suggestion_dedupe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alternativeplugin',
+            name='bayes_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alternativeplugin',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alternativeplugin',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proplugin',
+            name='bayes_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proplugin',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='proplugin',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='rated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-bayes_score', 'name'], name='alt_bayes_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-trending_score', 'name'], name='alt_trending_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(condition=models.Q(('rating_count__gt', 0)), fields=['-bayes_score'], name='alt_top_rated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(condition=models.Q(('rating_count__gt', 0)), fields=['-trending_score'], name='alt_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-bayes_score', 'name'], name='pro_bayes_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-trending_score', 'name'], name='pro_trending_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(condition=models.Q(('rating_count__gt', 0)), fields=['-bayes_score'], name='pro_top_rated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(condition=models.Q(('rating_count__gt', 0)), fields=['-trending_score'], name='pro_trending_idx'),
+        ),
+        migrations.RunPython(backfill_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0035_ranking_scores'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Leaderboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('plugin_type', models.CharField(choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin')], max_length=3)),
+                ('slug', models.SlugField(max_length=20)),
+                ('metric', models.CharField(max_length=10)),
+                ('plugin_ids', models.JSONField(default=list)),
+                ('refreshed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('plugin_type', 'slug', 'metric')},
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:23
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0036_leaderboards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('consumer', models.CharField(max_length=50, unique=True)),
+                ('position', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CatalogEvent',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('create', 'Created'), ('update', 'Updated'), ('delete', 'Deleted'), ('m2m', 'Links changed'), ('rating', 'Rated')], max_length=10)),
+                ('object_type', models.CharField(choices=[('pro', 'Pro plugin'), ('alt', 'Alternative plugin'), ('demo', 'Audio demo'), ('category', 'Category'), ('subcategory', 'Subcategory'), ('suggestion', 'Plugin suggestion')], max_length=12)),
+                ('object_id', models.PositiveIntegerField()),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['object_type', 'object_id'], name='event_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0037_catalog_events'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pluginsuggestion',
+            index=models.Index(fields=['status', 'date_suggested', 'id'], name='suggestion_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pluginsuggestion',
+            index=models.Index(fields=['submitter', 'status'], name='suggestion_submitter_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pluginsuggestion',
+            index=models.Index(fields=['submitter', '-date_suggested', '-id'], name='suggestion_history_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0038_suggestion_queue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('resource_type', models.CharField(max_length=10)),
+                ('public_id', models.CharField(db_index=True, max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('checksum', models.CharField(blank=True, max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('verified_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0039_stored_assets'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_released_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_bayes_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_trending_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_released_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_bayes_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_trending_name_idx',
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-date_released', '-id'], name='alt_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['name', 'id'], name='alt_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-bayes_score', 'name', 'id'], name='alt_bayes_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alternativeplugin',
+            index=models.Index(fields=['-trending_score', 'name', 'id'], name='alt_trending_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-date_released', '-id'], name='pro_released_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['name', 'id'], name='pro_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-bayes_score', 'name', 'id'], name='pro_bayes_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proplugin',
+            index=models.Index(fields=['-trending_score', 'name', 'id'], name='pro_trending_name_idx'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:56
+
+from urllib.parse import urlsplit
+
+from django.db import migrations, models
+
+
+# same as home/dedupe.py's canonical_link domain, frozen here
+SHARED_HOSTS = {"github.com", "gitlab.com", "gumroad.com", "bandcamp.com", "kvraudio.com", "sourceforge.net"}
+
+
+def domain_of(link):
+    parts = urlsplit((link or "").strip().lower())
+    host = (parts.hostname or "").removeprefix("www.")
+    if not host:
+        return ""
+    segments = [s for s in parts.path.rstrip("/").split("/") if s]
+    return (f"{host}/{segments[0]}" if host in SHARED_HOSTS and segments else host)[:120]
+
+
+# the domain moves from a "d:" lookup key onto the entry itself
+def move_domains(apps, schema_editor):
+    DedupeEntry = apps.get_model('home', 'DedupeEntry')
+    DedupeKey = apps.get_model('home', 'DedupeKey')
+    sources = {
+        'pro': (apps.get_model('home', 'ProPlugin'), 'download_link'),
+        'alt': (apps.get_model('home', 'AlternativePlugin'), 'download_link'),
+        'sugg': (apps.get_model('home', 'PluginSuggestion'), 'link'),
+    }
+    for kind, (model, field) in sources.items():
+        links = dict(model.objects.values_list('pk', field))
+        entries = list(DedupeEntry.objects.filter(kind=kind))
+        for entry in entries:
+            entry.domain = domain_of(links.get(entry.object_id))
+        DedupeEntry.objects.bulk_update(entries, ['domain'], batch_size=1000)
+    DedupeKey.objects.filter(key__startswith='d:').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0041_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dedupeentry',
+            name='domain',
+            field=models.CharField(blank=True, max_length=120),
+        ),
+        migrations.RunPython(move_domains, migrations.RunPython.noop),
+    ]
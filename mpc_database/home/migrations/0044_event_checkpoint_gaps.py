@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0043_ratelimit_cache_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventcheckpoint',
+            name='gaps',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0044_event_checkpoint_gaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leaderboard',
+            name='dirty_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0045_leaderboard_dirty'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_rating_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='alternativeplugin',
+            name='alt_rated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_rating_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='proplugin',
+            name='pro_rated_idx',
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.core.files.storage import default_storage
+from django.db import migrations
+
+# (app label, model, file field) for everything that keeps media in the store
+MEDIA_FIELDS = [
+    ("home", "CustomUser", "avatar"),
+    ("home", "Category", "icon"),
+    ("home", "AlternativePlugin", "image"),
+    ("home", "ProPlugin", "image"),
+    ("home", "AudioDemo", "audio_file"),
+]
+
+
+def has_media(apps):
+    for app_label, model_name, field in MEDIA_FIELDS:
+        model = apps.get_model(app_label, model_name)
+        if model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True}).exists():
+            return True
+    return False
+
+
+def backfill(apps, schema_editor):
+    # without this, media uploaded before the manifest existed looks missing
+    # (placeholder icons and images) until someone runs reconcile_assets. a fresh
+    # database has nothing to list, and a filled manifest has been reconciled already
+    from home.assets import reconcile
+
+    StoredAsset = apps.get_model("home", "StoredAsset")
+    if StoredAsset.objects.exists() or not has_media(apps):
+        return
+    if not hasattr(default_storage, "list_resources"):
+        print(f"\n  {type(default_storage).__name__} can't list its files, run reconcile_assets against the real store")
+        return
+    seen, _ = reconcile(default_storage, model=StoredAsset)
+    print(f"\n  {seen} stored files added to the asset manifest")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0046_drop_raw_rating_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -6,7 +6,9 @@ from django.core.validators import FileExtensionValidator, MinValueValidator, Ma
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Avg
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum
+from django.db.models.query import ValuesListIterable
+from django.utils import timezone
 
 # -----------------------
 # USERS
@@ -40,6 +42,10 @@ class Rating(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
 
+    # when the vote was last cast or changed, for the trending score.
+    # votes from before this column existed all start out at the migration time
+    rated_at = models.DateTimeField(default=timezone.now)
+
     class Meta:
         unique_together = ('user', 'content_type', 'object_id')
 
@@ -60,7 +66,8 @@ class Category(models.Model):
     def __str__(self):
         return self.name
     
-    # fallback for no icon
+    # fallback for no icon. exists() is a manifest lookup cached per process
+    # (assets.py), not a round trip to the store
     @property
     def icon_url(self):
         if self.icon and default_storage.exists(self.icon.name):
@@ -95,21 +102,129 @@ CATEGORIES = [
 
 class RatingMixin:
     def calculate_average_rating(self):
+        from .ranking import SCORE_FIELDS, bayesian_score
+
         # get all ratings for this specific object
         ratings = Rating.objects.filter(
             content_type=ContentType.objects.get_for_model(self),
             object_id=self.id
         )
-        # calculate average
-        aggregate = ratings.aggregate(Avg('score'))
+        # calculate average, and the count/total the bayesian score needs
+        aggregate = ratings.aggregate(Avg('score'), Count('id'), Sum('score'))
         new_rating = aggregate['score__avg'] or 0.0
         
         # update the field on the model
         self.rating = new_rating
-        self.save()
+        self.rating_count = aggregate['id__count']
+        self.bayes_score = bayesian_score(aggregate['score__sum'] or 0.0, self.rating_count)
+        # only the score columns, so only the boards sorted by them are marked dirty
+        self.save(update_fields=SCORE_FIELDS)
+
+# image url for a stored image name, with the same fallback the plugin models use
+def plugin_image_url(image_name):
+    if image_name:
+        return default_storage.url(image_name)
+    # fallback to static default
+    return static("plugins/default-plugin.jpg")
+
+# ---------
+# plugin queries, shared by both plugin models
+# ---------
+
+# the columns a plugin card actually renders (plus category_label/plugin_type, see cards()).
+# updated_at is only there to key the cached card fragments
+CARD_FIELDS = ("id", "name", "price", "rating", "image", "date_released", "updated_at")
+
+class PluginCard:
+    # a listing row without the weight of a model instance, built by PluginQuerySet.cards()
+    __slots__ = CARD_FIELDS + ("category_label", "plugin_type")
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    @property
+    def pk(self):
+        return self.id
+
+    @property
+    def image_url(self):
+        return plugin_image_url(self.image)
+
+class PluginCardIterable(ValuesListIterable):
+    def __iter__(self):
+        for row in super().__iter__():
+            yield PluginCard(*row)
+
+# ?sort= values to order_by() arguments. every one ends on the id, so plugins
+# released the same day (or with the same score) always come out in the same
+# order and LIMIT/OFFSET pages neither repeat nor skip cards
+PLUGIN_SORTS = {
+    "newest": ("-date_released", "-id"),
+    "oldest": ("date_released", "id"),
+    "name": ("name", "id"),
+    # top rated by the bayesian score, so one 5-star vote doesn't beat 500 4.8s
+    "rating": ("-bayes_score", "name", "id"),
+    "trending": ("-trending_score", "name", "id"),
+}
+
+# cards per page on the plugins listing
+LISTING_PAGE_SIZE = 48
+
+class PluginQuerySet(models.QuerySet):
+    def cards(self):
+        # listings never need the description or download link, and don't need model instances either
+        through = self.model.subcategories.through
+        first_category = through.objects.filter(
+            **{self.model._meta.model_name: OuterRef("pk")}
+        ).order_by("subcategory__parent__name").values("subcategory__parent__name")[:1]
+
+        qs = self.annotate(
+            category_label=Subquery(first_category),
+            plugin_type=models.Value(self.model.plugin_type),
+        ).values_list(*CARD_FIELDS, "category_label", "plugin_type")
+        qs._iterable_class = PluginCardIterable
+        return qs
+
+    def for_detail(self):
+        # everything the detail templates walk over, fetched up front
+        return self.select_related("submitter").prefetch_related(
+            "subcategories__parent",
+            "audio_demos",
+            *self.model.detail_prefetch,
+        )
+
+    def search(self, query):
+        if not query:
+            return self
+        return self.filter(name__icontains=query)
+
+    def sorted_by(self, sort):
+        return self.order_by(*PLUGIN_SORTS.get(sort, PLUGIN_SORTS["newest"]))
+
+    def recent(self):
+        return self.order_by(*PLUGIN_SORTS["newest"])
+
+    def top_rated(self):
+        return self.filter(rating_count__gt=0).order_by("-bayes_score")
+
+    def trending(self):
+        return self.filter(rating_count__gt=0).order_by("-trending_score")
+
+    def submitted_by(self, user):
+        return self.filter(submitter=user).order_by("-date_released")
 
 # an alternative plugin can be an alternative to many pro plugins, and a pro plugin can have many alternatives
 class AlternativePlugin(models.Model, RatingMixin):
+    objects = PluginQuerySet.as_manager()
+
+    # bits the shared views use to tell the two plugin types apart
+    plugin_type = "alt"
+    detail_url_name = "alt_plugin_detail"
+    detail_template = "alt_plugin_detail.html"
+    demo_field = "alt_plugin"
+    detail_prefetch = ("pro_plugins",)
+
     submitter = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=30)
     # Always use DateField with a datetime.date instance.
@@ -126,14 +241,36 @@ class AlternativePlugin(models.Model, RatingMixin):
 
     # ratings system, to be modified by users
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    
+
+    # precomputed ranking columns, see home/ranking.py
+    rating_count = models.PositiveIntegerField(default=0)
+    bayes_score = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
+
+    # bumped on every save, used to find what changed since the last offline job
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # one index per query shape used by the listing, home page and staff dashboard
+    class Meta:
+        indexes = [
+            # newest/oldest sorts scan this one in either direction
+            models.Index(fields=["-date_released", "-id"], name="alt_released_idx"),
+            models.Index(fields=["name", "id"], name="alt_name_idx"),
+            # sort=rating/trending listings, and the home page blocks over rated plugins only
+            models.Index(fields=["-bayes_score", "name", "id"], name="alt_bayes_name_idx"),
+            models.Index(fields=["-trending_score", "name", "id"], name="alt_trending_name_idx"),
+            models.Index(fields=["-bayes_score"], condition=models.Q(rating_count__gt=0), name="alt_top_rated_idx"),
+            models.Index(fields=["-trending_score"], condition=models.Q(rating_count__gt=0), name="alt_trending_idx"),
+            models.Index(fields=["submitter", "-date_released"], name="alt_submitter_released_idx"),
+            # price/size range filters
+            models.Index(fields=["price"], name="alt_price_idx"),
+            models.Index(fields=["size"], name="alt_size_idx"),
+        ]
+
     # fallback for no image
     @property
     def image_url(self):
-        if self.image:
-            return self.image.url
-        # fallback to static default
-        return static("plugins/default-plugin.jpg")
+        return plugin_image_url(self.image.name)
     
     # helper so {{ plugon.category.name }} is still functional
     @property
@@ -142,6 +279,14 @@ class AlternativePlugin(models.Model, RatingMixin):
     
     
 class ProPlugin(models.Model, RatingMixin):
+    objects = PluginQuerySet.as_manager()
+
+    plugin_type = "pro"
+    detail_url_name = "plugin_detail"
+    detail_template = "plugin_detail.html"
+    demo_field = "pro_plugin"
+    detail_prefetch = ("alternatives__subcategories",)
+
     submitter = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=30)
     # Always use DateField with a datetime.date instance.
@@ -159,14 +304,31 @@ class ProPlugin(models.Model, RatingMixin):
     
     # ratings system, to be modified by users
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
-    
+
+    rating_count = models.PositiveIntegerField(default=0)
+    bayes_score = models.FloatField(default=0)
+    trending_score = models.FloatField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # same query shapes as AlternativePlugin
+    class Meta:
+        indexes = [
+            models.Index(fields=["-date_released", "-id"], name="pro_released_idx"),
+            models.Index(fields=["name", "id"], name="pro_name_idx"),
+            models.Index(fields=["-bayes_score", "name", "id"], name="pro_bayes_name_idx"),
+            models.Index(fields=["-trending_score", "name", "id"], name="pro_trending_name_idx"),
+            models.Index(fields=["-bayes_score"], condition=models.Q(rating_count__gt=0), name="pro_top_rated_idx"),
+            models.Index(fields=["-trending_score"], condition=models.Q(rating_count__gt=0), name="pro_trending_idx"),
+            models.Index(fields=["submitter", "-date_released"], name="pro_submitter_released_idx"),
+            models.Index(fields=["price"], name="pro_price_idx"),
+            models.Index(fields=["size"], name="pro_size_idx"),
+        ]
+
     # fallback for no image
     @property
     def image_url(self):
-        if self.image:
-            return self.image.url
-        # fallback to static default
-        return static("plugins/default-plugin.jpg")
+        return plugin_image_url(self.image.name)
     
     @property
     def categories(self):
@@ -178,6 +340,69 @@ class ProPlugin(models.Model, RatingMixin):
     def __str__(self):
         return self.name
 
+# url-style ("pro") or form-style ("PRO") plugin type to its model
+PLUGIN_MODELS = {"pro": ProPlugin, "alt": AlternativePlugin}
+
+def get_plugin_model(plugin_type):
+    return PLUGIN_MODELS.get((plugin_type or "").lower())
+
+# both plugin tables as one UNION ALL query of PluginCards.
+# filter the per-model querysets before passing them in; the union itself can still
+# be ordered and sliced, so mixed listings page through both types in one statement
+def catalog(pro_qs=None, alt_qs=None):
+    pro_qs = ProPlugin.objects.all() if pro_qs is None else pro_qs
+    alt_qs = AlternativePlugin.objects.all() if alt_qs is None else alt_qs
+    return pro_qs.order_by().cards().union(alt_qs.order_by().cards(), all=True)
+
+# -----------------------
+# SIMILAR PLUGINS
+# -----------------------
+
+PLUGIN_TYPE_CHOICES = [
+    ("pro", "Pro plugin"),
+    ("alt", "Alternative plugin"),
+]
+
+# top-k nearest neighbours per plugin, written by the build_similar_plugins command
+# and read by the detail pages with one indexed lookup
+class PluginNeighbor(models.Model):
+    source_type = models.CharField(max_length=3, choices=PLUGIN_TYPE_CHOICES)
+    source_id = models.PositiveIntegerField()
+    neighbor_type = models.CharField(max_length=3, choices=PLUGIN_TYPE_CHOICES)
+    neighbor_id = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('source_type', 'source_id', 'rank')
+
+    @classmethod
+    def for_plugin(cls, plugin):
+        return cls.objects.filter(source_type=plugin.plugin_type, source_id=plugin.pk).order_by("rank")
+
+# -----------------------
+# LEADERBOARDS
+# -----------------------
+
+# sorts that get a materialized board per category/subcategory slug
+LEADERBOARD_METRICS = ("newest", "rating", "trending")
+
+# the first page of a ?category=<slug>&sort=<metric> listing, as ordered plugin ids.
+# kept current by home/leaderboards.py, read by the plugins view in one indexed lookup
+class Leaderboard(models.Model):
+    plugin_type = models.CharField(max_length=3, choices=PLUGIN_TYPE_CHOICES)
+    # a category or subcategory slug, exactly as it appears in ?category=
+    slug = models.SlugField(max_length=20)
+    metric = models.CharField(max_length=10)
+    plugin_ids = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(auto_now=True)
+    # set when a change may have moved plugins on this board, cleared once it's recomputed
+    dirty_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ("plugin_type", "slug", "metric")
+
 # -----------------------
 # AUDIO DEMOS 
 # -----------------------
@@ -221,6 +446,42 @@ class AudioDemo(models.Model):
     def __str__(self):
         return self.title or self.audio_file.name
 
+# -----------------------
+# DUPLICATE DETECTION
+# -----------------------
+
+DEDUPE_KINDS = [
+    ("pro", "Pro plugin"),
+    ("alt", "Alternative plugin"),
+    ("sugg", "Pending suggestion"),
+]
+
+DUPLICATE_REASONS = [
+    ("link", "Same link"),
+    ("name", "Same name"),
+    ("similar", "Similar name"),
+    ("domain", "Similar name, same site"),
+]
+
+# one row per plugin/pending suggestion, written by home/dedupe.py
+class DedupeEntry(models.Model):
+    kind = models.CharField(max_length=4, choices=DEDUPE_KINDS)
+    object_id = models.PositiveIntegerField()
+    label = models.CharField(max_length=50)
+    # case-folded, vendor/format noise stripped, what similarity is measured on
+    normalized = models.CharField(max_length=50)
+    # the link's site (see dedupe.canonical_link), compared only once a name is a candidate
+    domain = models.CharField(max_length=120, blank=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+# lookup keys for an entry (normalized name, link, minhash bands).
+# anything sharing a key is a candidate, so a lookup is one indexed key__in query
+class DedupeKey(models.Model):
+    entry = models.ForeignKey(DedupeEntry, related_name="keys", on_delete=models.CASCADE)
+    key = models.CharField(max_length=120, db_index=True)
+
 # -----------
 # PLUGIN SUGGESTIONS
 # -----------
@@ -249,5 +510,84 @@ class PluginSuggestion(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="PENDING")
     date_suggested = models.DateTimeField(auto_now_add=True)
 
+    # closest existing plugin/suggestion, filled in by dedupe.flag_suggestion
+    duplicate_kind = models.CharField(max_length=4, choices=DEDUPE_KINDS, blank=True)
+    duplicate_id = models.PositiveIntegerField(null=True, blank=True)
+    duplicate_name = models.CharField(max_length=50, blank=True)
+    duplicate_reason = models.CharField(max_length=10, choices=DUPLICATE_REASONS, blank=True)
+    duplicate_score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the staff queue, keyset-paged oldest first
+            models.Index(fields=["status", "date_suggested", "id"], name="suggestion_queue_idx"),
+            # a user's pending count
+            models.Index(fields=["submitter", "status"], name="suggestion_submitter_idx"),
+            # a user's history, keyset-paged newest first
+            models.Index(fields=["submitter", "-date_suggested", "-id"], name="suggestion_history_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
+
+# -----------------------
+# CATALOG EVENTS
+# -----------------------
+
+EVENT_ACTIONS = [
+    ("create", "Created"),
+    ("update", "Updated"),
+    ("delete", "Deleted"),
+    ("m2m", "Links changed"),
+    ("rating", "Rated"),
+]
+
+EVENT_OBJECT_TYPES = [
+    ("pro", "Pro plugin"),
+    ("alt", "Alternative plugin"),
+    ("demo", "Audio demo"),
+    ("category", "Category"),
+    ("subcategory", "Subcategory"),
+    ("suggestion", "Plugin suggestion"),
+]
+
+# append-only change feed, written by home/events.py in the same transaction as
+# the change itself. the id is the sequence number consumers checkpoint on
+class CatalogEvent(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    action = models.CharField(max_length=10, choices=EVENT_ACTIONS)
+    object_type = models.CharField(max_length=12, choices=EVENT_OBJECT_TYPES)
+    object_id = models.PositiveIntegerField()
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["object_type", "object_id"], name="event_object_idx"),
+        ]
+
+# how far each named consumer has read the event log, and the ids below that it
+# is still waiting on ({id: first seen}, see events.tail)
+class EventCheckpoint(models.Model):
+    consumer = models.CharField(max_length=50, unique=True)
+    position = models.BigIntegerField(default=0)
+    gaps = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+
+# every file in the media storage, so exists()/size()/listdir() don't have to ask
+# cloudinary (see assets.py). name is the stored "<resource_type>:<public_id>"
+class StoredAsset(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    resource_type = models.CharField(max_length=10)
+    public_id = models.CharField(max_length=255, db_index=True)
+    size = models.BigIntegerField()
+    # md5 hex, same as cloudinary's etag. blank when the store didn't report one
+    checksum = models.CharField(max_length=32, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # last upload or reconcile that saw it
+    verified_at = models.DateTimeField(default=timezone.now, db_index=True)
+
     def __str__(self):
-        return f"{self.name} ({self.get_status_display()})"
\ No newline at end of file
+        return self.name
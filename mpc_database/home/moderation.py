@@ -0,0 +1,34 @@
+from django.db import transaction
+
+from .models import PluginSuggestion
+from .dedupe import unindex_suggestions
+from . import events
+
+# -----------------------
+# SUGGESTION MODERATION
+# -----------------------
+
+# staff pages walk the pending queue oldest first, users their history newest first
+QUEUE_PAGE_SIZE = 50
+HISTORY_PAGE_SIZE = 25
+
+# how many pending suggestions a user can have open at once
+PENDING_LIMIT = 3
+
+
+def set_status(suggestion_ids, status):
+    # one UPDATE for any number of suggestions, then the bookkeeping post_save
+    # would have done. returns the ids that actually changed
+    with transaction.atomic():
+        ids = list(
+            PluginSuggestion.objects.filter(pk__in=suggestion_ids).exclude(status=status).values_list("pk", flat=True)
+        )
+        PluginSuggestion.objects.filter(pk__in=ids).update(status=status)
+        events.record_many("update", "suggestion", ids, status=status)
+    unindex_suggestions(*ids)
+    return ids
+
+
+def at_pending_limit(user):
+    # stops reading the (submitter, status) index after PENDING_LIMIT rows
+    return PluginSuggestion.objects.filter(submitter=user, status="PENDING")[:PENDING_LIMIT].count() >= PENDING_LIMIT
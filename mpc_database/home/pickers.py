@@ -0,0 +1,88 @@
+from django import forms
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import ProPlugin, Subcategory
+
+# -----------------------
+# SEARCHABLE PICKERS
+# -----------------------
+
+# multi-selects over tables that are too big to render as a full <select>/checkbox list.
+# the widget only renders what's already selected and the browser pages through
+# everything else via the picker endpoint. validation stays Django's single pk__in query.
+
+PAGE_SIZE = 20
+
+
+class PickerSource:
+    def __init__(self, queryset, search_fields, label_fields):
+        self.queryset = queryset
+        self.search_fields = search_fields
+        self.label_fields = label_fields
+
+    def label(self, row):
+        return " - ".join(str(part) for part in row)
+
+    def rows(self, qs):
+        return [(pk, self.label(rest)) for pk, *rest in qs.values_list("pk", *self.label_fields)]
+
+    def search(self, query, page=1):
+        qs = self.queryset
+        if query:
+            match = Q()
+            for field in self.search_fields:
+                match |= Q(**{f"{field}__icontains": query})
+            qs = qs.filter(match)
+        start = (page - 1) * PAGE_SIZE
+        # one extra row tells us whether there's another page without a COUNT(*)
+        rows = self.rows(qs[start:start + PAGE_SIZE + 1])
+        return rows[:PAGE_SIZE], len(rows) > PAGE_SIZE
+
+    def labels(self, pks):
+        # (pk, label) for just the selected ids
+        pks = [pk for pk in pks if str(pk).isdigit()]
+        if not pks:
+            return []
+        return self.rows(self.queryset.filter(pk__in=pks))
+
+
+PICKERS = {
+    "pro_plugins": PickerSource(ProPlugin.objects.order_by("name"), ("name",), ("name",)),
+    # same "Effects - Reverb" labels as Subcategory.__str__
+    "subcategories": PickerSource(
+        Subcategory.objects.order_by("parent__name", "name"),
+        ("name", "parent__name"),
+        ("parent__name", "name"),
+    ),
+}
+
+
+class PickerWidget(forms.SelectMultiple):
+    template_name = "widgets/picker.html"
+
+    class Media:
+        js = ["js/picker.js"]
+
+    def __init__(self, source, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+
+    def optgroups(self, name, value, attrs=None):
+        # skip self.choices entirely, that would be the whole table
+        options = [
+            self.create_option(name, pk, label, True, index, attrs=attrs)
+            for index, (pk, label) in enumerate(PICKERS[self.source].labels(value))
+        ]
+        return [(None, options, 0)]
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context["widget"]["picker_url"] = reverse("picker", args=[self.source])
+        return context
+
+
+class PickerField(forms.ModelMultipleChoiceField):
+    def __init__(self, source, **kwargs):
+        kwargs.setdefault("widget", PickerWidget(source))
+        super().__init__(queryset=PICKERS[source].queryset, **kwargs)
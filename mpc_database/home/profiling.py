@@ -0,0 +1,209 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .db_utils import QueryStats, listen_queries
+
+# -----------------------
+# SAMPLING PROFILER
+# -----------------------
+
+# ProfilingMiddleware runs a PROFILE_SAMPLE_RATE fraction of requests, plus any
+# staff request sent with an "X-Profile: 1" header, under a sampling profiler: a
+# side thread wakes every PROFILE_INTERVAL seconds and records where every other
+# busy thread is. nothing hooks into the interpreter, so the request itself runs
+# at full speed. each profile lands in PROFILE_ROOT (never MEDIA_ROOT, that's
+# cloudinary) as <id>.json (url, duration, queries) plus <id>.folded, the stacks
+# in the collapsed "a;b;c count" format flamegraph.pl and speedscope read. only
+# the newest PROFILE_KEEP are kept, whichever worker wrote them.
+#
+# async views and threaded workers run other requests alongside, and those land
+# in the same profile. a sync gunicorn worker only ever has the one.
+
+HEADER = "X-Profile"
+
+# innermost frames of a thread that's only waiting for work
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("socketserver.py", "serve_forever"),
+}
+
+
+def profile_root():
+    return settings.PROFILE_ROOT
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    # paths relative to the project or site-packages, whichever is longest
+    for prefix in sorted((str(settings.BASE_DIR), *sys.path), key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+def collapse(frame):
+    # "outermost;...;innermost", or None for an idle thread
+    code = frame.f_code
+    if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{_short_path(code.co_filename)}:{code.co_qualname}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                thread = threading._active.get(ident)
+                # this sampler, and any other profiled request's
+                if thread is not None and thread.name == "profile-sampler":
+                    continue
+                stack = collapse(frame)
+                if stack:
+                    self.stacks[stack] += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# --- the ring buffer ---
+
+def save(meta, folded):
+    root = profile_root()
+    os.makedirs(root, exist_ok=True)
+    # time-ordered ids, so the newest sort last
+    profile_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    for suffix, content in ((".folded", folded), (".json", json.dumps(meta))):
+        path = os.path.join(root, profile_id + suffix)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    trim(root)
+    return profile_id
+
+
+def trim(root):
+    ids = sorted(name[:-5] for name in os.listdir(root) if name.endswith(".json"))
+    for profile_id in ids[:-settings.PROFILE_KEEP]:
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(root, profile_id + suffix))
+            except FileNotFoundError:
+                # another worker got there first
+                pass
+
+
+def recent(limit=None):
+    root = profile_root()
+    if not os.path.isdir(root):
+        return []
+    ids = sorted((name[:-5] for name in os.listdir(root) if name.endswith(".json")), reverse=True)
+    profiles = []
+    for profile_id in ids[:limit]:
+        try:
+            with open(os.path.join(root, profile_id + ".json")) as f:
+                profiles.append({"id": profile_id, **json.load(f)})
+        except FileNotFoundError:
+            continue
+    return profiles
+
+
+def folded_path(profile_id):
+    # ids come from the url, only ever our own file names
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = os.path.join(profile_root(), profile_id + ".folded")
+    return path if os.path.exists(path) else None
+
+
+# --- middleware ---
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def wanted(self, request, user):
+        if request.headers.get(HEADER):
+            return user.is_staff
+        return random.random() < settings.PROFILE_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.wanted(request, request.user):
+            return self.get_response(request)
+        queries = QueryStats()
+        start = time.perf_counter()
+        with Sampler(settings.PROFILE_INTERVAL) as sampler, listen_queries(queries):
+            response = self.get_response(request)
+        self.finish(request, response, sampler, queries, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        # the session/user is only loaded for the header check
+        user = await request.auser() if request.headers.get(HEADER) else None
+        if not self.wanted(request, user):
+            return await self.get_response(request)
+        queries = QueryStats()
+        start = time.perf_counter()
+        with Sampler(settings.PROFILE_INTERVAL) as sampler, listen_queries(queries):
+            response = await self.get_response(request)
+        await sync_to_async(self.finish, thread_sensitive=False)(
+            request, response, sampler, queries, time.perf_counter() - start,
+        )
+        return response
+
+    def finish(self, request, response, sampler, queries, duration):
+        match = request.resolver_match
+        response["X-Profile-Id"] = save({
+            "url": request.get_full_path(),
+            "method": request.method,
+            "view": match.view_name if match else "",
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "queries": queries.count,
+            "query_ms": round(queries.seconds * 1000, 1),
+            "samples": sum(sampler.stacks.values()),
+            "interval_ms": settings.PROFILE_INTERVAL * 1000,
+            "created": timezone.now().isoformat(),
+        }, sampler.folded())
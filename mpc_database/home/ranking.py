@@ -0,0 +1,223 @@
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Sum
+from django.utils import timezone
+
+from .models import PLUGIN_MODELS, Rating
+from . import metrics
+
+# -----------------------
+# RANKING SCORES
+# -----------------------
+
+# two precomputed columns per plugin, both indexed:
+#
+# bayes_score: the average rating pulled towards the catalog-wide mean, as if
+# every plugin started with as many votes at that mean as a typical rated plugin
+# has. a single 5.0 vote lands near the mean, 500 votes at 4.8 stay at ~4.8.
+#
+# trending_score: the sum of every vote's weight (score / 5) decayed by half
+# every HALF_LIFE, stored as a log relative to a fixed EPOCH. all plugins share
+# the same reference point, so sorting on the stored number is sorting on the
+# decayed sum *right now*, and it never has to be rewritten just because time
+# passed. a new vote is one logaddexp on the stored value.
+#
+# both are kept up to date on each vote (record_vote) and rebuilt from the
+# ratings table by `manage.py recompute_rankings`, which also refreshes the prior.
+
+HALF_LIFE = timedelta(days=7)
+TAU = HALF_LIFE.total_seconds() / math.log(2)
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+# the catalog mean and how many votes' worth of it every plugin starts with
+PRIOR_KEY = "ranking:prior"
+MIN_PRIOR_VOTES = 3
+
+# the plugin columns a vote or a rebuild writes
+SCORE_FIELDS = ["rating", "rating_count", "bayes_score", "trending_score", "updated_at"]
+
+
+def vote_term(score, rated_at):
+    # one vote's contribution in log space
+    return (rated_at - EPOCH).total_seconds() / TAU + math.log(score / 5)
+
+
+def log_add(total, term):
+    if total == -math.inf:
+        return term
+    high, low = max(total, term), min(total, term)
+    return high + math.log1p(math.exp(low - high))
+
+
+def log_sub(total, term):
+    # taking back a changed vote; anything left within rounding error of nothing is nothing
+    if term >= total:
+        return -math.inf
+    return total + math.log1p(-math.exp(term - total))
+
+
+def prior():
+    # (mean score, weight in votes), cached until the next batch run replaces it
+    cached = cache.get(PRIOR_KEY)
+    metrics.cache_lookup("ranking_prior", hits=cached is not None, misses=cached is None)
+    if cached is None:
+        mean = Rating.objects.aggregate(mean=Avg("score"))["mean"] or 0.0
+        rated = [
+            model.objects.filter(rating_count__gt=0).aggregate(plugins=Count("pk"), votes=Sum("rating_count"))
+            for model in PLUGIN_MODELS.values()
+        ]
+        plugins = sum(row["plugins"] for row in rated)
+        votes = sum(row["votes"] or 0 for row in rated)
+        cached = (mean, max(MIN_PRIOR_VOTES, votes / plugins if plugins else 0))
+        cache.set(PRIOR_KEY, cached, timeout=None)
+    return cached
+
+
+def bayesian_score(total, count, prior_value=None):
+    if not count:
+        # never rated sorts below everything that has been
+        return 0.0
+    mean, weight = prior_value or prior()
+    return (weight * mean + total) / (weight + count)
+
+
+def record_vote(user, plugin, score):
+    # create or change a user's vote and update the plugin's scores in one transaction
+    model = type(plugin)
+    content_type = ContentType.objects.get_for_model(model)
+    now = timezone.now()
+    with transaction.atomic():
+        # votes on one plugin queue up here, so no trending update is lost
+        plugin = model.objects.select_for_update().get(pk=plugin.pk)
+        previous = Rating.objects.filter(
+            user=user, content_type=content_type, object_id=plugin.pk,
+        ).values_list("score", "rated_at").first()
+        Rating.objects.update_or_create(
+            user=user,
+            content_type=content_type,
+            object_id=plugin.pk,
+            defaults={"score": score, "rated_at": now},
+        )
+
+        trending = plugin.trending_score if plugin.rating_count else -math.inf
+        if previous:
+            trending = log_sub(trending, vote_term(*previous))
+        plugin.trending_score = log_add(trending, vote_term(score, now))
+        plugin.calculate_average_rating()
+    metrics.VOTES.inc(plugin_type=model.plugin_type)
+    return plugin
+
+
+# --- batch ---
+
+def _plugin_arrays(model, only=None):
+    # numpy is only imported by the batch paths, workers that just take votes never load it
+    import numpy as np
+
+    # (plugin pks, per-vote row index into them, scores, vote terms) for one plugin type
+    plugins = model.objects.order_by("pk")
+    votes = Rating.objects.filter(content_type=ContentType.objects.get_for_model(model))
+    if only is not None:
+        plugins, votes = plugins.filter(pk__in=only), votes.filter(object_id__in=only)
+    pks = np.fromiter(plugins.values_list("pk", flat=True).iterator(), dtype=np.int64)
+    votes = votes.values_list("object_id", "score", "rated_at")
+    object_ids, scores, seconds = [], [], []
+    for object_id, score, rated_at in votes.iterator(chunk_size=5000):
+        object_ids.append(object_id)
+        scores.append(score)
+        seconds.append((rated_at - EPOCH).total_seconds())
+    object_ids = np.asarray(object_ids, dtype=np.int64)
+    scores = np.asarray(scores, dtype=np.float64)
+    terms = np.asarray(seconds, dtype=np.float64) / TAU + np.log(scores / 5)
+
+    # ratings left behind by deleted plugins don't count
+    rows = np.searchsorted(pks, object_ids)
+    known = rows < len(pks)
+    known[known] = pks[rows[known]] == object_ids[known]
+    return pks, rows[known], scores[known], terms[known]
+
+
+def recompute(log=None):
+    import numpy as np
+
+    arrays = {plugin_type: _plugin_arrays(model) for plugin_type, model in PLUGIN_MODELS.items()}
+
+    # the prior, from every vote and every rated plugin of both types
+    all_scores = np.concatenate([scores for _, _, scores, _ in arrays.values()])
+    counts = {
+        plugin_type: np.bincount(rows, minlength=len(pks))
+        for plugin_type, (pks, rows, _, _) in arrays.items()
+    }
+    rated = np.concatenate([c[c > 0] for c in counts.values()])
+    mean = float(all_scores.mean()) if len(all_scores) else 0.0
+    weight = max(MIN_PRIOR_VOTES, float(rated.mean()) if len(rated) else 0.0)
+    cache.set(PRIOR_KEY, (mean, weight), timeout=None)
+
+    now = timezone.now()
+    updated = 0
+    for plugin_type, plugin_arrays in arrays.items():
+        model = PLUGIN_MODELS[plugin_type]
+        rated_count, changed = _write_scores(model, plugin_arrays, (mean, weight), now)
+        updated += changed
+        if log:
+            log(f"{model.__name__}: {rated_count} rated, {changed} updated")
+
+    if log:
+        log(f"prior: mean {mean:.2f} over {len(all_scores)} votes, weight {weight:.1f} votes")
+    return updated
+
+
+def recompute_plugins(model, pks):
+    # the same rebuild for a handful of plugins, against the cached prior
+    return _write_scores(model, _plugin_arrays(model, only=pks), prior(), timezone.now(), only=pks)[1]
+
+
+def _write_scores(model, arrays, prior_value, now, only=None):
+    import numpy as np
+
+    # (plugins with votes, rows written) for one plugin type
+    pks, rows, scores, terms = arrays
+    mean, weight = prior_value
+    count = np.bincount(rows, minlength=len(pks))
+    total = np.bincount(rows, weights=scores, minlength=len(pks))
+    has_votes = count > 0
+    average = np.divide(total, count, out=np.zeros(len(pks)), where=has_votes)
+    bayes = np.where(has_votes, (weight * mean + total) / (weight + count), 0.0)
+
+    # per-plugin logsumexp: subtract each group's max before exponentiating
+    peak = np.full(len(pks), -np.inf)
+    np.maximum.at(peak, rows, terms)
+    summed = np.bincount(rows, weights=np.exp(terms - peak[rows]), minlength=len(pks))
+    trending = np.zeros(len(pks))
+    trending[has_votes] = peak[has_votes] + np.log(summed[has_votes])
+
+    # only rows whose numbers actually moved get written (and a new updated_at,
+    # which is what the card fragment cache keys on)
+    position = {pk: i for i, pk in enumerate(pks.tolist())}
+    current = model.objects.values_list("pk", "rating", "rating_count", "bayes_score", "trending_score")
+    if only is not None:
+        current = current.filter(pk__in=only)
+    changed = []
+    for pk, rating, rating_count, bayes_score, trending_score in current.iterator(chunk_size=5000):
+        i = position.get(pk)
+        if i is None:
+            # created after the votes were read, the next run picks it up
+            continue
+        new_rating = Decimal(f"{average[i]:.2f}")
+        if (
+            rating != new_rating or rating_count != count[i]
+            or not math.isclose(bayes_score, bayes[i], abs_tol=1e-9)
+            or not math.isclose(trending_score, trending[i], abs_tol=1e-9)
+        ):
+            changed.append(model(
+                pk=pk, rating=new_rating, rating_count=int(count[i]),
+                bayes_score=float(bayes[i]), trending_score=float(trending[i]), updated_at=now,
+            ))
+    model.objects.bulk_update(changed, SCORE_FIELDS, batch_size=1000)
+    return int(has_votes.sum()), len(changed)
+
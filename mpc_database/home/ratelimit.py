@@ -0,0 +1,161 @@
+import functools
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics
+
+# -----------------------
+# RATE LIMITING
+# -----------------------
+
+# sliding-window counters in a cache every worker shares (RATELIMIT_CACHE). every
+# (limit, client) pair gets one counter per fixed window; a request's count is
+# this window's hits plus the previous window's hits weighted by how much of it
+# still overlaps the last `period` seconds. a request costs one read of both
+# counters and, when it's let through, one incr. on redis incr is atomic, so
+# workers racing for the last slot can't all get it. the database cache used
+# without REDIS_URL reads and writes in two steps, so concurrent workers can lose
+# increments and let a burst a little past the limit: fine for runserver and a
+# single worker, production wants redis.
+
+# every limit declared with @ratelimit, by name
+RATE_LIMITS = {}
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    # "30/10s" -> (30, 10), "5/h" -> (5, 3600)
+    count, per = rate.split("/")
+    number = per.rstrip("smhd") or "1"
+    return int(count), int(number) * UNITS[per[-1]]
+
+
+def client_ip(request):
+    # behind n proxies the client is the entry the outermost one appended, n from
+    # the end of X-Forwarded-For. anything before that the client sent itself
+    proxies = int(getattr(settings, "RATELIMIT_TRUST_FORWARDED_FOR", 0))
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+# key functions, (request, user) -> the client a limit is counted against
+def ip_key(request, user):
+    return f"ip:{client_ip(request)}"
+
+
+def user_or_ip_key(request, user):
+    return f"user:{user.pk}" if user.is_authenticated else ip_key(request, user)
+
+
+KEYS = {"ip": ip_key, "user_or_ip": user_or_ip_key}
+
+
+class RateLimit:
+    def __init__(self, name, rate, key="user_or_ip", methods=None, cache=None):
+        self.name = name
+        self.limit, self.period = parse_rate(rate)
+        self.key_func = KEYS[key] if isinstance(key, str) else key
+        # ip-only limits never have to load the session/user
+        self.needs_user = self.key_func is not ip_key
+        self.methods = {m.upper() for m in methods} if methods else None
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or caches[getattr(settings, "RATELIMIT_CACHE", "default")]
+
+    def applies_to(self, request):
+        return self.methods is None or request.method in self.methods
+
+    def hit(self, client, now=None):
+        # records one request; returns 0 if it's allowed, else seconds until it would be
+        now = time.time() if now is None else now
+        window = int(now // self.period)
+        current = f"ratelimit:{self.name}:{client}:{window}"
+        previous = f"ratelimit:{self.name}:{client}:{window - 1}"
+
+        counts = self.cache.get_many([current, previous])
+        prev_count = counts.get(previous, 0)
+        elapsed = (now % self.period) / self.period
+        allowance = self.limit - prev_count * (1 - elapsed)
+        # already full: turned away without writing anything
+        if counts.get(current, 0) + 1 > allowance:
+            return self.reject(counts.get(current, 0), prev_count, elapsed)
+
+        count = self.increment(current, current in counts)
+        if count > allowance:
+            # another worker took the last slot first, hand this one back
+            self.cache.decr(current)
+            return self.reject(count - 1, prev_count, elapsed)
+        return 0
+
+    def increment(self, key, exists):
+        # a window's counter only needs to outlive the window after it
+        if not exists and self.cache.add(key, 1, timeout=self.period * 2):
+            return 1
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # expired between the read and now
+            self.cache.add(key, 0, timeout=self.period * 2)
+            return self.cache.incr(key)
+
+    def reject(self, count, prev_count, elapsed):
+        metrics.RATE_LIMITED.inc(limit=self.name)
+        return self.retry_after(count, prev_count, elapsed)
+
+    def retry_after(self, count, prev_count, elapsed):
+        if count >= self.limit or not prev_count:
+            # nothing left this window, wait for the next one
+            return max(1, math.ceil((1 - elapsed) * self.period))
+        # the previous window's share has to fade until one more request fits
+        fade_to = (self.limit - count - 1) / prev_count
+        return max(1, math.ceil((1 - fade_to - elapsed) * self.period))
+
+
+def throttled(request, retry_after):
+    if request.headers.get("x-requested-with") == "XMLHttpRequest" or request.content_type == "application/json":
+        response = JsonResponse({"error": "Too many requests", "retry_after": retry_after}, status=429)
+    else:
+        response = HttpResponse("Too many requests, please slow down.", status=429, content_type="text/plain")
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def ratelimit(name, rate, key="user_or_ip", methods=None):
+    # @ratelimit("search", "30/10s", key="ip") on a sync or async view.
+    # checked before the view body runs, so a throttled request never runs the view's queries
+    limit = RATE_LIMITS[name] = RateLimit(name, rate, key, methods)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            async def wrapper(request, *args, **kwargs):
+                if limit.applies_to(request):
+                    user = await request.auser() if limit.needs_user else None
+                    # the cache may be db-backed, so it's touched from the sync side
+                    wait = await sync_to_async(limit.hit)(limit.key_func(request, user))
+                    if wait:
+                        return throttled(request, wait)
+                return await view(request, *args, **kwargs)
+            markcoroutinefunction(wrapper)
+        else:
+            def wrapper(request, *args, **kwargs):
+                if limit.applies_to(request):
+                    user = request.user if limit.needs_user else None
+                    wait = limit.hit(limit.key_func(request, user))
+                    if wait:
+                        return throttled(request, wait)
+                return view(request, *args, **kwargs)
+        wrapper.ratelimit = limit
+        return functools.wraps(view)(wrapper)
+
+    return decorator
@@ -1,8 +1,11 @@
-import cloudinary.uploader
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, m2m_changed
+from django.db.backends.signals import connection_created
 from django.dispatch import receiver
-from .models import ProPlugin, AlternativePlugin, AudioDemo
+from django.contrib.contenttypes.models import ContentType
+from .models import ProPlugin, AlternativePlugin, AudioDemo, PluginSuggestion, Category, Subcategory, Rating
 from .cloudinary_utils import delete_cloudinary_file
+from .db_utils import install_query_reporting
+from . import graph, dedupe, snapshots, leaderboards, events
 
 @receiver(post_delete, sender=ProPlugin)
 @receiver(post_delete, sender=AlternativePlugin)
@@ -14,4 +17,172 @@ def delete_plugin_image(sender, instance, **kwargs):
 @receiver(post_delete, sender=AudioDemo)
 def delete_audio_demo(sender, instance, **kwargs):
     if instance.audio_file:
-        delete_cloudinary_file(instance.audio_file.name, default_resource_type="video")
\ No newline at end of file
+        delete_cloudinary_file(instance.audio_file.name, default_resource_type="video")
+
+
+# keep the in-memory alternatives graph in step with ProPlugin.alternatives
+@receiver(m2m_changed, sender=ProPlugin.alternatives.through)
+def alternatives_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse means the change came from the alt side (alt.pro_plugins.add(...))
+    plugin_type = "alt" if reverse else "pro"
+    if action == "post_clear":
+        graph.node_dropped(plugin_type, instance.pk)
+    elif action in ("post_add", "post_remove") and pk_set:
+        pro_ids, alt_ids = ([instance.pk], pk_set) if plugin_type == "pro" else (pk_set, [instance.pk])
+        if action == "post_add":
+            graph.edges_added(pro_ids, alt_ids)
+        else:
+            graph.edges_removed(pro_ids, alt_ids)
+
+
+# deleting a plugin cascades through the link table without an m2m_changed
+@receiver(post_delete, sender=ProPlugin)
+@receiver(post_delete, sender=AlternativePlugin)
+def drop_graph_node(sender, instance, **kwargs):
+    graph.node_dropped(sender.plugin_type, instance.pk)
+
+
+# keep the duplicate-detection index in step with the catalog and the suggestion queue
+@receiver(post_init, sender=ProPlugin)
+@receiver(post_init, sender=AlternativePlugin)
+@receiver(post_init, sender=PluginSuggestion)
+def remember_for_dedupe(sender, instance, **kwargs):
+    dedupe.remember(instance)
+
+
+@receiver(post_save, sender=ProPlugin)
+@receiver(post_save, sender=AlternativePlugin)
+@receiver(post_save, sender=PluginSuggestion)
+def index_for_dedupe(sender, instance, created, **kwargs):
+    dedupe.index_if_changed(instance, created)
+
+
+@receiver(post_delete, sender=ProPlugin)
+@receiver(post_delete, sender=AlternativePlugin)
+@receiver(post_delete, sender=PluginSuggestion)
+def unindex_for_dedupe(sender, instance, **kwargs):
+    dedupe.unindex_object(instance)
+
+
+# a prerendered detail page is stale as soon as its plugin changes
+@receiver(post_save, sender=ProPlugin)
+@receiver(post_save, sender=AlternativePlugin)
+@receiver(post_delete, sender=ProPlugin)
+@receiver(post_delete, sender=AlternativePlugin)
+def discard_snapshot(sender, instance, **kwargs):
+    snapshots.discard(sender.plugin_type, instance.pk)
+
+
+# category leaderboards: any plugin change may move it on the boards of its subcategories
+@receiver(post_save, sender=ProPlugin)
+@receiver(post_save, sender=AlternativePlugin)
+@receiver(pre_delete, sender=ProPlugin)
+@receiver(pre_delete, sender=AlternativePlugin)
+def plugin_leaderboards(sender, instance, update_fields=None, **kwargs):
+    # a save that touched no sort field leaves every board as it was
+    metrics = leaderboards.metrics_for(update_fields)
+    if metrics:
+        # pre_delete, while the subcategory links are still there to look at
+        leaderboards.mark_dirty(sender.plugin_type, leaderboards.plugin_slugs(instance), metrics)
+
+
+@receiver(m2m_changed, sender=ProPlugin.subcategories.through)
+@receiver(m2m_changed, sender=AlternativePlugin.subcategories.through)
+def subcategories_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        # subcategory.pro_plugins.add(...), only this subcategory's boards move
+        plugin_type = kwargs["model"].plugin_type
+        slugs = leaderboards.subcategory_slugs([instance.pk])
+    else:
+        plugin_type = type(instance).plugin_type
+        # pre_clear: the links that are about to go
+        slugs = leaderboards.plugin_slugs(instance) if action == "pre_clear" else leaderboards.subcategory_slugs(pk_set)
+    leaderboards.mark_dirty(plugin_type, slugs)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+def category_leaderboards(sender, instance, **kwargs):
+    slugs = [instance.slug]
+    if sender is Subcategory:
+        # a deleted subcategory takes its plugin links (and maybe some of the parent's board) with it
+        slugs += Category.objects.filter(pk=instance.parent_id).values_list("slug", flat=True)
+    for plugin_type in ("pro", "alt"):
+        leaderboards.mark_dirty(plugin_type, slugs)
+
+
+# catalog event log, one row per change, inside the change's own transaction
+EVENT_TYPES = {
+    ProPlugin: "pro",
+    AlternativePlugin: "alt",
+    AudioDemo: "demo",
+    Category: "category",
+    Subcategory: "subcategory",
+    PluginSuggestion: "suggestion",
+}
+
+
+def _event_data(instance):
+    # just enough for a consumer to skip events it doesn't care about without a lookup
+    if isinstance(instance, AudioDemo):
+        return {"pro_plugin": instance.pro_plugin_id, "alt_plugin": instance.alt_plugin_id}
+    if isinstance(instance, PluginSuggestion):
+        return {"status": instance.status}
+    return {"name": getattr(instance, "name", "")}
+
+
+@receiver(post_save, sender=ProPlugin)
+@receiver(post_save, sender=AlternativePlugin)
+@receiver(post_save, sender=AudioDemo)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Subcategory)
+@receiver(post_save, sender=PluginSuggestion)
+def log_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        events.record_save(EVENT_TYPES[sender], instance, created, **_event_data(instance))
+
+
+@receiver(post_delete, sender=ProPlugin)
+@receiver(post_delete, sender=AlternativePlugin)
+@receiver(post_delete, sender=AudioDemo)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Subcategory)
+@receiver(post_delete, sender=PluginSuggestion)
+def log_deleted(sender, instance, **kwargs):
+    events.record("delete", EVENT_TYPES[sender], instance.pk, **_event_data(instance))
+
+
+@receiver(m2m_changed, sender=ProPlugin.subcategories.through)
+@receiver(m2m_changed, sender=AlternativePlugin.subcategories.through)
+@receiver(m2m_changed, sender=ProPlugin.alternatives.through)
+def log_links(sender, instance, action, reverse, pk_set, model, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if action != "post_clear" and not pk_set:
+        # .add() of links that were already there
+        return
+    # the relation as seen from the object that changed, e.g. "subcategories" or "pro_plugins"
+    owner = model if reverse else type(instance)
+    field = next(f for f in owner._meta.many_to_many if f.remote_field.through is sender)
+    relation = field.related_query_name() if reverse else field.name
+    events.record_links(EVENT_TYPES[type(instance)], instance, relation, action, pk_set)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def log_rating(sender, instance, created=None, **kwargs):
+    plugin_type = ContentType.objects.get_for_id(instance.content_type_id).model_class().plugin_type
+    # a withdrawn vote has no score
+    score = instance.score if created is not None else None
+    events.record("rating", plugin_type, instance.object_id, user=instance.user_id, score=score)
+
+
+
+# per-request query counts for the profiler, see db_utils.listen_queries
+@receiver(connection_created)
+def report_queries(sender, connection, **kwargs):
+    install_query_reporting(connection)
@@ -0,0 +1,276 @@
+import math
+import re
+
+import numpy as np
+from scipy import sparse
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProPlugin, AlternativePlugin, Rating, PluginNeighbor, EventCheckpoint
+from . import events
+
+# -----------------------
+# SIMILAR PLUGINS
+# -----------------------
+
+# offline nearest-neighbour job behind the "similar plugins" blocks. every plugin
+# (pro and alt together) becomes one row in a handful of sparse feature matrices,
+# and similarities are computed a chunk of rows at a time so memory stays at
+# chunk_size x catalog_size no matter how big the catalog gets.
+
+# how much each signal counts towards the final score
+WEIGHTS = {
+    "subcategories": 0.4,
+    "description": 0.3,
+    "co_rating": 0.2,
+    "price_size": 0.1,
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]{3,}")
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "you", "your", "are", "from",
+    "its", "has", "have", "can", "all", "into", "any", "our", "was", "but",
+}
+
+
+class Catalog:
+    # every plugin as a row index, plus the feature matrices built over those rows
+    def __init__(self):
+        self.keys = []  # (plugin_type, pk) per row
+        prices, sizes, descriptions = [], [], []
+        for model in (ProPlugin, AlternativePlugin):
+            rows = model.objects.order_by("pk").values_list("pk", "price", "size", "description")
+            for pk, price, size, description in rows.iterator(chunk_size=2000):
+                self.keys.append((model.plugin_type, pk))
+                prices.append(max(price, 0))
+                sizes.append(max(float(size), 0))
+                descriptions.append(description)
+        self.index = {key: row for row, key in enumerate(self.keys)}
+
+        self.subcategories = self.build_subcategories()
+        self.subcategory_counts = np.asarray(self.subcategories.sum(axis=1)).ravel()
+        self.description = self.build_tfidf(descriptions)
+        self.co_rating = self.build_co_rating()
+        # log scale so $10 vs $20 matters as much as $200 vs $400
+        self.log_price = np.log1p(np.asarray(prices, dtype=np.float32))
+        self.log_size = np.log1p(np.asarray(sizes, dtype=np.float32))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def build_subcategories(self):
+        rows, cols = [], []
+        for model in (ProPlugin, AlternativePlugin):
+            through = model.subcategories.through
+            links = through.objects.values_list(f"{model._meta.model_name}_id", "subcategory_id")
+            for plugin_id, sub_id in links.iterator(chunk_size=5000):
+                # a plugin created after the rows above were read has no row yet,
+                # the next run picks it up from the event log
+                row = self.index.get((model.plugin_type, plugin_id))
+                if row is not None:
+                    rows.append(row)
+                    cols.append(sub_id)
+        width = (max(cols) + 1) if cols else 1
+        data = np.ones(len(rows), dtype=np.float32)
+        return sparse.csr_matrix((data, (rows, cols)), shape=(len(self), width))
+
+    def build_tfidf(self, descriptions):
+        vocabulary = {}
+        rows, cols, data = [], [], []
+        for row, text in enumerate(descriptions):
+            counts = {}
+            for token in TOKEN_RE.findall((text or "").lower()):
+                if token not in STOPWORDS:
+                    counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(token, len(vocabulary)))
+                # sublinear tf, a long description shouldn't drown everything else
+                data.append(1.0 + math.log(count))
+        tf = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)),
+            shape=(len(self), max(len(vocabulary), 1)),
+        )
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log((1 + len(self)) / (1 + df)).astype(np.float32) + 1
+        return normalize_rows(tf @ sparse.diags(idf))
+
+    def build_co_rating(self):
+        # item x user matrix, centred on each user's mean so "liked" and "disliked" point different ways
+        content_types = {
+            ContentType.objects.get_for_model(model).pk: model.plugin_type
+            for model in (ProPlugin, AlternativePlugin)
+        }
+        rows, cols, scores = [], [], []
+        ratings = Rating.objects.filter(content_type__in=list(content_types)).values_list(
+            "content_type_id", "object_id", "user_id", "score"
+        )
+        for content_type_id, object_id, user_id, score in ratings.iterator(chunk_size=5000):
+            row = self.index.get((content_types[content_type_id], object_id))
+            if row is not None:
+                rows.append(row)
+                cols.append(user_id)
+                scores.append(score)
+        if not rows:
+            return sparse.csr_matrix((len(self), 1), dtype=np.float32)
+        cols = np.asarray(cols)
+        scores = np.asarray(scores, dtype=np.float32)
+        user_totals = np.bincount(cols, weights=scores)
+        user_counts = np.bincount(cols)
+        centred = scores - (user_totals / np.maximum(user_counts, 1))[cols]
+        matrix = sparse.csr_matrix((centred, (rows, cols)), shape=(len(self), cols.max() + 1))
+        return normalize_rows(matrix)
+
+    def similarities(self, rows):
+        # dense (len(rows) x catalog) scores for a chunk of rows
+        chunk_subs = self.subcategories[rows]
+        overlap = (chunk_subs @ self.subcategories.T).toarray()
+        counts = self.subcategory_counts
+        union = counts[rows][:, None] + counts[None, :] - overlap
+        jaccard = np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+        scores = WEIGHTS["subcategories"] * jaccard
+        scores += WEIGHTS["description"] * (self.description[rows] @ self.description.T).toarray()
+        scores += WEIGHTS["co_rating"] * (self.co_rating[rows] @ self.co_rating.T).toarray()
+
+        price_gap = np.abs(self.log_price[rows][:, None] - self.log_price[None, :])
+        size_gap = np.abs(self.log_size[rows][:, None] - self.log_size[None, :])
+        scores += WEIGHTS["price_size"] * 0.5 * (np.exp(-price_gap) + np.exp(-size_gap))
+
+        # never recommend a plugin to itself
+        scores[np.arange(len(rows)), rows] = -np.inf
+        return scores
+
+
+def normalize_rows(matrix):
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).astype(np.float32) @ matrix
+
+
+def top_k(scores, k):
+    k = min(k, scores.shape[1] - 1)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=int)
+    best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1)
+    return np.take_along_axis(best, order, axis=1)
+
+
+# --- incremental runs ---
+
+# build_similar_plugins tails the catalog event log from this checkpoint
+CONSUMER = "similar-plugins"
+
+# subcategory-side link events, by the relation they came through
+LINKED_TYPES = {"pro_plugins": "pro", "alt_plugins": "alt"}
+
+
+def changed_plugins(events):
+    # (plugin_type, pk) for every plugin whose features these events touch: a
+    # save or delete (price, size, description), a vote (co-rating) or a
+    # subcategory link from either side. alternatives links aren't a feature.
+    # a subcategory-side clear() or a deleted subcategory doesn't say which
+    # plugins it unlinked, --full catches those
+    changed = set()
+    for event in events:
+        relation = event.data.get("relation")
+        if event.object_type in ("pro", "alt"):
+            if event.action != "m2m" or relation == "subcategories":
+                changed.add((event.object_type, event.object_id))
+        elif event.object_type == "subcategory" and relation in LINKED_TYPES:
+            changed.update((LINKED_TYPES[relation], pk) for pk in event.data.get("ids", ()))
+    return changed
+
+
+def listed_by(keys):
+    # plugins whose current neighbour list includes one of these
+    sources = set()
+    for plugin_type in ("pro", "alt"):
+        ids = [pk for key_type, pk in keys if key_type == plugin_type]
+        if ids:
+            sources.update(PluginNeighbor.objects.filter(neighbor_type=plugin_type, neighbor_id__in=ids).values_list(
+                "source_type", "source_id"
+            ))
+    return sources
+
+
+def write_lists(catalog, rows, k, chunk_size, now, log=None):
+    # computes and stores the neighbour lists for `rows`, returns {row: neighbour rows}
+    lists = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk = np.asarray(rows[start:start + chunk_size])
+        scores = catalog.similarities(chunk)
+        best = top_k(scores, k)
+
+        neighbors = []
+        for i, neighbor_rows in enumerate(best):
+            source_type, source_id = catalog.keys[chunk[i]]
+            kept = lists[int(chunk[i])] = []
+            for rank, neighbor_row in enumerate(neighbor_rows, start=1):
+                score = float(scores[i, neighbor_row])
+                if score <= 0:
+                    break
+                kept.append(int(neighbor_row))
+                neighbor_type, neighbor_id = catalog.keys[neighbor_row]
+                neighbors.append(PluginNeighbor(
+                    source_type=source_type, source_id=source_id,
+                    neighbor_type=neighbor_type, neighbor_id=neighbor_id,
+                    rank=rank, score=score, computed_at=now,
+                ))
+
+        with transaction.atomic():
+            for source_type in ("pro", "alt"):
+                ids = [catalog.keys[row][1] for row in chunk if catalog.keys[row][0] == source_type]
+                PluginNeighbor.objects.filter(source_type=source_type, source_id__in=ids).delete()
+            PluginNeighbor.objects.bulk_create(neighbors)
+
+        if log:
+            log(f"  {min(start + chunk_size, len(rows))}/{len(rows)}")
+    return lists
+
+
+def build_neighbors(k=8, chunk_size=64, full=False, log=None):
+    # the first run, and any --full run, does every plugin. after that only the
+    # plugins the event log says changed, every list that points at one of them,
+    # and (similarity being symmetric) the new closest matches of each changed
+    # plugin, which are the lists it may have just entered
+    first_run = not EventCheckpoint.objects.filter(consumer=CONSUMER).exists()
+    position, gaps = events.checkpoint(CONSUMER)
+    changed = set()
+    for batch in events.tail(position, gaps=gaps):
+        changed |= changed_plugins(batch)
+        position = max(position, batch[-1].pk)
+
+    catalog = Catalog()
+    full = full or first_run
+    if full:
+        rows = list(range(len(catalog)))
+    else:
+        gone = changed - catalog.index.keys()
+        for plugin_type in ("pro", "alt"):
+            ids = [pk for key_type, pk in gone if key_type == plugin_type]
+            PluginNeighbor.objects.filter(source_type=plugin_type, source_id__in=ids).delete()
+        rows = sorted(catalog.index[key] for key in changed | listed_by(changed) if key in catalog.index)
+    if log:
+        log(f"{len(catalog)} plugins loaded, {len(rows)} neighbour lists to compute")
+
+    now = timezone.now()
+    lists = write_lists(catalog, rows, k, chunk_size, now, log)
+    if not full:
+        changed_rows = [catalog.index[key] for key in changed if key in catalog.index]
+        followups = sorted({row for changed_row in changed_rows for row in lists[changed_row]} - set(rows))
+        if log and followups:
+            log(f"{len(followups)} more that the changed plugins may have joined")
+        write_lists(catalog, followups, k, chunk_size, now, log)
+        rows += followups
+    else:
+        # anything this run didn't rewrite belongs to a plugin that no longer exists
+        PluginNeighbor.objects.filter(computed_at__lt=now).delete()
+
+    # only once every list is written, a failed run replays the same events
+    events.advance(CONSUMER, position, gaps)
+    return len(rows)
@@ -0,0 +1,68 @@
+import os
+import shutil
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import reverse
+from whitenoise.base import WhiteNoise
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .models import get_plugin_model
+
+# -----------------------
+# PRERENDERED DETAIL PAGES
+# -----------------------
+
+# `manage.py prerender` writes anonymous detail pages to PRERENDER_ROOT as
+# <url>/index.html. SnapshotMiddleware hands those to visitors without a session
+# straight off disk, so crawlers and logged-out traffic never reach a view or the
+# db. anyone with a session cookie still gets the live page (their own rating, a
+# working rating form). a saved or deleted plugin drops its snapshot, so edits
+# fall through to the live view until the next prerender run.
+
+
+def snapshot_root():
+    return getattr(settings, "PRERENDER_ROOT", None)
+
+
+def snapshot_path(url):
+    return os.path.join(snapshot_root(), url.strip("/"), "index.html")
+
+
+def write_snapshot(url, content):
+    path = snapshot_path(url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # readers never see a half-written page
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def discard(plugin_type, pk):
+    if not snapshot_root():
+        return
+    url = reverse(get_plugin_model(plugin_type).detail_url_name, args=[pk])
+    shutil.rmtree(os.path.dirname(snapshot_path(url)), ignore_errors=True)
+
+
+class SnapshotMiddleware(WhiteNoise):
+    def __init__(self, get_response):
+        root = snapshot_root()
+        if not root:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        # autorefresh: snapshots are rewritten and deleted while workers run, so
+        # every lookup is a fresh stat instead of WhiteNoise's startup file list
+        super().__init__(None, autorefresh=True, max_age=0, index_file=True)
+        os.makedirs(root, exist_ok=True)
+        self.add_files(root)
+
+    def __call__(self, request):
+        if request.method in ("GET", "HEAD") and settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            static_file = self.find_file(request.path_info)
+            if static_file is not None:
+                response = WhiteNoiseMiddleware.serve(static_file, request)
+                response["Vary"] = "Cookie"
+                return response
+        return self.get_response(request)
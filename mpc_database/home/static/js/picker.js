@@ -0,0 +1,70 @@
+// searchable multi-select pickers (home/pickers.py). the server only renders the
+// checked rows, everything else is fetched a page at a time as you search/scroll.
+(function () {
+    function setUp(picker) {
+        const url = picker.dataset.pickerUrl;
+        const name = picker.dataset.name;
+        const search = picker.querySelector(".picker-search");
+        const options = picker.querySelector(".picker-options");
+        const more = picker.querySelector(".picker-more");
+        let page = 1;
+        let pending = null;
+
+        function checkedIds() {
+            return new Set(Array.from(options.querySelectorAll("input:checked")).map(input => input.value));
+        }
+
+        function addRow(id, label, checked) {
+            const row = document.createElement("label");
+            row.className = "flex items-center gap-3 rounded-xl bg-white border border-slate-200 px-3 py-2 font-medium cursor-pointer";
+            const input = document.createElement("input");
+            input.type = "checkbox";
+            input.name = name;
+            input.value = id;
+            input.checked = checked;
+            input.className = "m-0";
+            row.append(input, " " + label);
+            options.appendChild(row);
+        }
+
+        function load(reset) {
+            if (pending) pending.abort();
+            pending = new AbortController();
+            if (reset) page = 1;
+            const params = new URLSearchParams({ q: search.value.trim(), page: page });
+
+            fetch(url + "?" + params, { signal: pending.signal, headers: { "X-Requested-With": "XMLHttpRequest" } })
+                .then(response => response.json())
+                .then(data => {
+                    const checked = checkedIds();
+                    if (reset) {
+                        // keep what's ticked, swap out the rest
+                        options.querySelectorAll("input:not(:checked)").forEach(input => input.closest("label").remove());
+                    }
+                    data.results.forEach(result => {
+                        if (!checked.has(String(result.id))) addRow(result.id, result.label, false);
+                    });
+                    more.classList.toggle("hidden", !data.has_more);
+                })
+                .catch(error => {
+                    if (error.name !== "AbortError") console.error(error);
+                });
+        }
+
+        let timer = null;
+        search.addEventListener("input", () => {
+            clearTimeout(timer);
+            timer = setTimeout(() => load(true), 200);
+        });
+        more.addEventListener("click", () => {
+            page += 1;
+            load(false);
+        });
+
+        load(true);
+    }
+
+    document.addEventListener("DOMContentLoaded", () => {
+        document.querySelectorAll(".picker[data-picker-url]").forEach(setUp);
+    });
+})();
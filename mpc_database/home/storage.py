@@ -1,48 +1,355 @@
-import cloudinary.uploader
-import cloudinary.api
+from io import BytesIO
+from urllib.parse import urljoin
+from django.core.files.base import ContentFile
 from django.core.files.storage import Storage
 from django.conf import settings
-import cloudinary
-import cloudinary.utils
+from django.utils._os import safe_join
+from django.utils.encoding import filepath_to_uri
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+import hashlib
 import logging
 import os
+import random
+import time
+
+from . import assets, metrics
 
 logger = logging.getLogger(__name__)
 
 AUDIO_EXTENSIONS = {"mp3", "wav", "ogg", "flac", "aac", "m4a"}
 
+# the cloudinary SDK (and the urllib3/ssl stack under it) and Pillow are imported
+# on first use, not when a worker boots: templates reach this module through
+# {% picture %}, but only uploads, media urls and collectstatic need them
+
+# stored names are "<resource_type>:<public_id>", e.g. "video:audio_demos/kick".
+# older rows may have a bare name, which is an image
+def split_name(name, default_resource_type="image"):
+    if ":" in name:
+        resource_type, public_id = name.split(":", 1)
+        return resource_type, public_id
+    return default_resource_type, name
+
+
+def resource_type_for(name):
+    # cloudinary uses video for audio
+    ext = os.path.splitext(name)[1].lstrip(".").lower()
+    return "video" if ext in AUDIO_EXTENSIONS else "image"
+
+
+def file_digest(content):
+    # (size, md5 hex) of an upload, the md5 being what cloudinary reports as its etag
+    digest = hashlib.md5(usedforsecurity=False)
+    size = 0
+    for chunk in content.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    content.seek(0)
+    return size, digest.hexdigest()
+
+
+# the admin api deletes at most this many public ids per call
+DELETE_BATCH = 100
+
+
 class CloudinaryStorage(Storage):
+    # the storage api on top, the cloudinary calls it needs at the bottom.
+    # LocalCloudinaryStorage swaps out just those. exists(), size() and listdir()
+    # never reach cloudinary, they read the asset manifest (assets.py)
+
     def _save(self, name, content):
+        resource_type = resource_type_for(name)
+        public_id = os.path.splitext(name)[0]
+        size, checksum = file_digest(content)
+        with metrics.timed(metrics.STORAGE_SECONDS, metrics.STORAGE_FAILURES, operation="upload"):
+            public_id = self.upload(content, public_id, resource_type, name)
+
+        # store resource_type in the public_id so url() can recover it
+        stored = f"{resource_type}:{public_id}"
+        assets.record(stored, resource_type, public_id, size, checksum)
+        return stored
+
+    def url(self, name, **transformation):
+        # url(name, width=300, height=200, crop="fill") for a resized image, same
+        # options as cloudinary_url
+        resource_type, public_id = split_name(name)
+        if ":" not in name:
+            public_id = os.path.splitext(public_id)[0]
+        return self.resource_url(public_id, resource_type, **transformation)
+
+    def exists(self, name):
+        # also what get_available_name asks about upload names, so a second
+        # "plugin_images/serum.png" gets a suffix instead of replacing the first
+        return assets.lookup(name) is not None
+
+    def get_available_name(self, name, max_length=None):
+        # uploads overwrite, so a name another worker took a moment ago must count
+        # as taken even if this process's manifest cache hasn't caught up yet
+        with assets.uncached():
+            return super().get_available_name(name, max_length)
+
+    def size(self, name):
+        asset = assets.lookup(name)
+        if asset is None:
+            raise FileNotFoundError(name)
+        return asset[0]
+
+    def listdir(self, path):
+        # by public id, across resource types
+        return assets.listing(path)
+
+    def delete(self, name, default_resource_type="image"):
+        resource_type, public_id = split_name(name, default_resource_type)
+        with metrics.timed(metrics.STORAGE_SECONDS, metrics.STORAGE_FAILURES, operation="delete"):
+            self.destroy(public_id, resource_type)
+        assets.forget([name])
+
+    def delete_many(self, names, default_resource_type="image"):
+        # {name: "deleted" | "not_found"}, one api call per resource type and batch
+        by_type = {}
+        for name in names:
+            resource_type, public_id = split_name(name, default_resource_type)
+            by_type.setdefault(resource_type, {})[public_id] = name
+        results = {}
+        for resource_type, names_by_id in by_type.items():
+            public_ids = list(names_by_id)
+            for i in range(0, len(public_ids), DELETE_BATCH):
+                with metrics.timed(metrics.STORAGE_SECONDS, metrics.STORAGE_FAILURES, operation="delete_many"):
+                    deleted = self.destroy_many(public_ids[i:i + DELETE_BATCH], resource_type)
+                results.update({names_by_id[public_id]: status for public_id, status in deleted.items()})
+                assets.forget([f"{resource_type}:{public_id}" for public_id in deleted])
+        return results
+
+    # --- cloudinary ---
+
+    def configure(self):
+        import cloudinary
+
         cloudinary.config(
             cloud_name=settings.CLOUDINARY_STORAGE['CLOUD_NAME'],
             api_key=settings.CLOUDINARY_STORAGE['API_KEY'],
             api_secret=settings.CLOUDINARY_STORAGE['API_SECRET'],
         )
-        ext = os.path.splitext(name)[1].lstrip(".").lower()
 
-        # cloudinary uses video for audio
-        resource_type = "video" if ext in AUDIO_EXTENSIONS else "image" 
+    def upload(self, content, public_id, resource_type, name):
+        import cloudinary.uploader
 
-        public_id = os.path.splitext(name)[0]
+        self.configure()
         result = cloudinary.uploader.upload(
             content,
             public_id=public_id,
             overwrite=True,
             resource_type=resource_type,
         )
+        return result["public_id"]
 
-        # store resource_type in the public_id so url() can recover it
-        return f"{resource_type}:{result['public_id']}"
+    def destroy(self, public_id, resource_type):
+        import cloudinary.uploader
 
-    def url(self, name):
-        # recover resource_type if stored as a prefix
-        if ":" in name:
-            resource_type, public_id = name.split(":", 1)
-        else:
-            public_id = os.path.splitext(name)[0]
-            resource_type = "image"
+        return cloudinary.uploader.destroy(public_id, resource_type=resource_type)
 
-        return cloudinary.utils.cloudinary_url(public_id, resource_type=resource_type)[0]
+    def destroy_many(self, public_ids, resource_type):
+        import cloudinary.api
 
-    def exists(self, name):
-        return False
\ No newline at end of file
+        return cloudinary.api.delete_resources(public_ids, resource_type=resource_type)["deleted"]
+
+    def list_resources(self, resource_type, cursor, page_size):
+        # ([(public_id, bytes, etag)], next cursor or None), one admin api page
+        import cloudinary.api
+
+        self.configure()
+        kwargs = {"next_cursor": cursor} if cursor else {}
+        result = cloudinary.api.resources(type="upload", resource_type=resource_type, max_results=page_size, **kwargs)
+        items = [(r["public_id"], r.get("bytes", 0), r.get("etag", "")) for r in result["resources"]]
+        return items, result.get("next_cursor")
+
+    def resource_url(self, public_id, resource_type, **transformation):
+        import cloudinary.utils
+
+        return cloudinary.utils.cloudinary_url(public_id, resource_type=resource_type, **transformation)[0]
+
+
+class InjectedFailure(OSError):
+    pass
+
+
+class LocalCloudinaryStorage(CloudinaryStorage):
+    # CloudinaryStorage on local disk, for working offline and for load-testing the
+    # upload/delete paths: same "<resource_type>:<public_id>" names, same
+    # /<resource_type>/upload/<transformation>/<public_id> urls (under MEDIA_URL,
+    # served by views.local_media), same bulk delete. every call can be slowed by
+    # `latency` (+ up to `jitter`) seconds and fail with probability `failure_rate`,
+    # all set through STORAGES' OPTIONS.
+    #
+    # files live at <location>/<resource_type>/<public_id>.<ext>. bare names from
+    # before this backend are plain paths under <location>, like FileSystemStorage
+
+    def __init__(self, location=None, base_url=None, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.location = str(location or settings.MEDIA_ROOT)
+        self.base_url = base_url or settings.MEDIA_URL
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+
+    def remote_call(self, operation):
+        # what the network would have done to this call
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and self._random.random() < self.failure_rate:
+            raise InjectedFailure(f"injected {operation} failure")
+
+    def locate(self, public_id, resource_type):
+        # the file behind a public id, or None
+        base = safe_join(self.location, resource_type, public_id)
+        directory, stem = os.path.split(base)
+        try:
+            file_names = os.listdir(directory)
+        except FileNotFoundError:
+            file_names = []
+        # exactly <public_id>.<ext>: "serum" must not pick up "serum.v2.png"
+        for file_name in sorted(file_names):
+            if os.path.splitext(file_name)[0] == stem and os.path.isfile(os.path.join(directory, file_name)):
+                return os.path.join(directory, file_name)
+        for path in (base, safe_join(self.location, public_id)):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def upload(self, content, public_id, resource_type, name):
+        self.remote_call("upload")
+        # overwrite=True, whatever the old file's extension was
+        old = self.locate(public_id, resource_type)
+        path = safe_join(self.location, resource_type, public_id) + os.path.splitext(name)[1].lower()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        os.replace(tmp, path)
+        if old and old != path:
+            os.remove(old)
+        return public_id
+
+    def destroy(self, public_id, resource_type):
+        self.remote_call("delete")
+        path = self.locate(public_id, resource_type)
+        if path is None:
+            return {"result": "not found"}
+        os.remove(path)
+        return {"result": "ok"}
+
+    def destroy_many(self, public_ids, resource_type):
+        # one call for the whole batch, like the admin api
+        self.remote_call("delete_many")
+        deleted = {}
+        for public_id in public_ids:
+            path = self.locate(public_id, resource_type)
+            if path:
+                os.remove(path)
+            deleted[public_id] = "deleted" if path else "not_found"
+        return deleted
+
+    def list_resources(self, resource_type, cursor, page_size):
+        # pages of the sorted file list, the cursor being the last public id handed out
+        self.remote_call("list")
+        root = os.path.join(self.location, resource_type)
+        public_ids = []
+        for directory, _, file_names in os.walk(root):
+            for file_name in file_names:
+                if file_name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, file_name)
+                public_ids.append((os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "/"), path))
+        public_ids.sort()
+        if cursor:
+            public_ids = [entry for entry in public_ids if entry[0] > cursor]
+        page = public_ids[:page_size]
+        items = []
+        for public_id, path in page:
+            with open(path, "rb") as f:
+                items.append((public_id, os.path.getsize(path), hashlib.file_digest(f, "md5").hexdigest()))
+        next_cursor = page[-1][0] if len(public_ids) > page_size else None
+        return items, next_cursor
+
+    def url(self, name, **transformation):
+        if ":" not in name:
+            return urljoin(self.base_url, filepath_to_uri(name))
+        return super().url(name, **transformation)
+
+    def resource_url(self, public_id, resource_type, **transformation):
+        # the sdk's own transformation string, so "w_300,h_200,c_fill" comes out
+        # exactly as it would on cloudinary. it's pure string building, no network
+        from cloudinary.utils import generate_transformation_string
+
+        segment = generate_transformation_string(**transformation)[0] if transformation else ""
+        parts = [resource_type, "upload", segment, filepath_to_uri(public_id)]
+        return urljoin(self.base_url, "/".join(part for part in parts if part))
+
+
+# ---------
+# static files
+# ---------
+
+RASTER_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+# nothing on the site is shown wider than this, so the modern variants are capped at it
+MAX_IMAGE_WIDTH = 1920
+
+def image_variant_formats():
+    from PIL import features
+
+    # avif needs a Pillow built with libavif, webp is everywhere
+    formats = [("webp", "WEBP", {"quality": 80, "method": 6})]
+    if features.check("avif"):
+        formats.insert(0, ("avif", "AVIF", {"quality": 55}))
+    return formats
+
+
+def variant_name(name, ext):
+    return f"{os.path.splitext(name)[0]}.{ext}"
+
+
+class OptimizedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    # collectstatic pipeline: every png/jpg gets resized avif/webp siblings, then the
+    # usual manifest hashing (the siblings get hashed too) and whitenoise's gzip/brotli pass.
+    # templates pick the variants up through {% picture %} (templatetags/static_images.py)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = dict(paths)
+            for name in list(paths):
+                if os.path.splitext(name)[1].lower() in RASTER_EXTENSIONS:
+                    for variant in self.make_variants(name):
+                        paths[variant] = (self, variant)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    def make_variants(self, name):
+        from PIL import Image
+
+        with self.open(name) as f:
+            image = Image.open(f)
+            image.load()
+        if image.width > MAX_IMAGE_WIDTH:
+            image = image.resize((MAX_IMAGE_WIDTH, round(image.height * MAX_IMAGE_WIDTH / image.width)), Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        original_size = self.size(name)
+        for ext, pil_format, params in image_variant_formats():
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **params)
+            # not worth a <source> if it isn't actually smaller
+            if buffer.tell() >= original_size:
+                continue
+            variant = variant_name(name, ext)
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(buffer.getvalue()))
+            yield variant
+
+    def has_file(self, name):
+        # is this file part of the collected build (manifest first, disk otherwise)
+        if name in self.hashed_files:
+            return True
+        return self.exists(name)
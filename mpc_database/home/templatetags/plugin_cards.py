@@ -0,0 +1,10 @@
+from django import template
+
+from home.fragments import render_cards as render_cached_cards
+
+register = template.Library()
+
+# {% render_cards plugins active_tab %}, every card comes from the fragment cache when it can
+@register.simple_tag
+def render_cards(cards, tab):
+    return render_cached_cards(cards, tab)
@@ -0,0 +1,34 @@
+from django import template
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from home.storage import variant_name
+
+register = template.Library()
+
+# {% picture 'about/campus.jpg' alt="Campus" class="w-full" %}
+# an <img> of the original, wrapped in <picture> with the avif/webp siblings
+# collectstatic made for it. in dev (no collected variants) it's just the <img>
+@register.simple_tag
+def picture(name, **attrs):
+    has_file = getattr(staticfiles_storage, "has_file", None)
+    sources = []
+    if has_file:
+        for ext in ("avif", "webp"):
+            variant = variant_name(name, ext)
+            if has_file(variant):
+                sources.append((f"image/{ext}", static(variant)))
+
+    img = format_html(
+        '<img src="{}"{}>',
+        static(name),
+        format_html_join("", ' {}="{}"', ((key.replace("_", "-"), value) for key, value in attrs.items())),
+    )
+    if not sources:
+        return img
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join("", '<source type="{}" srcset="{}">', sources),
+        img,
+    )
@@ -0,0 +1,20 @@
+import time
+
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+register = template.Library()
+
+# the tailwind build's <link>s, same markup as django-tailwind's tailwind_css and
+# tailwind_preload_css, but without needing that app installed to serve a page
+@register.simple_tag
+def stylesheet(preload=False):
+    href = static(settings.TAILWIND_CSS_PATH)
+    if preload:
+        return format_html('<link rel="preload" href="{}" as="style">', href)
+    if settings.DEBUG:
+        # a new url per page load in dev, so the browser never keeps stale css
+        href = f"{href}?v={int(time.time())}"
+    return format_html('<link rel="stylesheet" type="text/css" href="{}">', href)
@@ -1,3 +1,1066 @@
-from django.test import TestCase
+import json
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from importlib.util import module_from_spec, spec_from_file_location
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django import forms
+from django.apps import apps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.http import QueryDict
+from django.template import engines
+from django.template.loaders.filesystem import Loader as FilesystemLoader
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    ProPlugin, AlternativePlugin, CustomUser, Category, Subcategory, Leaderboard, CatalogEvent, PluginSuggestion,
+    StoredAsset, PluginNeighbor, DedupeKey, PluginCard, AudioDemo, LEADERBOARD_METRICS, catalog,
+)
+from .db_utils import keyset_page, sync_m2m
+from .facets import PluginFacets, range_filters
+from .pickers import PAGE_SIZE, PICKERS, PickerField
+from .ratelimit import RateLimit, RATE_LIMITS, client_ip
+from .storage import LocalCloudinaryStorage, InjectedFailure
+from . import dedupe, fragments, graph, similarity, ranking, leaderboards, events, moderation, profiling, metrics, assets, snapshots, warmup
+
+# templates without a collectstatic manifest
+PLAIN_STATIC = {**settings.STORAGES, "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+
+
+class ListingIndexTests(TestCase):
+    # every listing/home/dashboard query shape should be answered from an index, not a full sort
+    def assertUsesIndex(self, qs):
+        plan = qs.explain()
+        # sqlite says "USING INDEX", postgres says "Index Scan"
+        self.assertRegex(plan, r"(?i)using (covering )?index|index (only )?scan", plan)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+
+    def test_listing_queries_use_indexes(self):
+        user = CustomUser.objects.create_user(username="staff")
+        for model in (ProPlugin, AlternativePlugin):
+            with self.subTest(model=model.__name__):
+                qs = model.objects.all()
+                self.assertUsesIndex(qs.sorted_by("newest"))
+                self.assertUsesIndex(qs.sorted_by("oldest"))
+                self.assertUsesIndex(qs.sorted_by("name"))
+                self.assertUsesIndex(qs.sorted_by("rating"))
+                self.assertUsesIndex(qs.sorted_by("trending"))
+                self.assertUsesIndex(qs.top_rated()[:6])
+                self.assertUsesIndex(qs.trending()[:6])
+                self.assertUsesIndex(qs.filter(submitter=user).order_by("-date_released"))
+                self.assertUsesIndex(qs.filter(price__gte=10, price__lte=50))
+                self.assertUsesIndex(qs.filter(size__gte=100, size__lte=500))
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        fx = Category.objects.create(name="FX", slug="fx")
+        verb = Subcategory.objects.create(parent=fx, name="Verb", slug="verb")
+        delay = Subcategory.objects.create(parent=fx, name="Delay", slug="delay")
+        fields = {"date_released": "2024-01-01", "description": "", "download_link": ""}
+        self.free_verb = AlternativePlugin.objects.create(name="Free Verb", price=0, size=50, rating=4.5, **fields)
+        self.paid_delay = AlternativePlugin.objects.create(name="Paid Delay", price=100, size=2000, rating=3.5, **fields)
+        self.free_other = AlternativePlugin.objects.create(name="Free Other", price=0, size=50, **fields)
+        self.free_verb.subcategories.add(verb)
+        self.paid_delay.subcategories.add(delay)
+        self.categories = list(Category.objects.prefetch_related("subcategories"))
+
+    def facets(self, query):
+        return PluginFacets(QueryDict(query), self.categories, AlternativePlugin)
+
+    def listed(self, query):
+        return set(self.facets(query).apply(AlternativePlugin.objects.all()))
+
+    def test_or_inside_a_facet_and_between_facets(self):
+        self.assertEqual(self.listed("price=free"), {self.free_verb, self.free_other})
+        self.assertEqual(self.listed("price=free&price=50to150"), {self.free_verb, self.paid_delay, self.free_other})
+        self.assertEqual(self.listed("price=free&category=fx"), {self.free_verb})
+        # the detail pages link with ?subcategory=
+        self.assertEqual(self.listed("subcategory=delay"), {self.paid_delay})
+        self.assertEqual(self.listed("rating_band=unrated"), {self.free_other})
+        # unknown values are ignored rather than matching nothing
+        self.assertEqual(self.listed("price=bogus"), {self.free_verb, self.paid_delay, self.free_other})
+
+    def test_counts_apply_every_other_facet(self):
+        facets = self.facets("price=free&category=verb")
+        sidebar = facets.sidebar([list(qs) for qs in facets.count_querysets(AlternativePlugin.objects.all())])
+        fx = next(option for option in sidebar["categories"] if option["category"].slug == "fx")
+        self.assertEqual(fx["count"], 1)
+        self.assertEqual({sub["sub"].slug: sub["count"] for sub in fx["subcategories"]}, {"verb": 1, "delay": 0})
+        price = {option["slug"]: option for option in sidebar["bands"][0]["options"]}
+        # the price counts keep the verb filter: paid_delay is 50to150 but not a verb
+        self.assertEqual((price["free"]["count"], price["50to150"]["count"]), (1, 0))
+        self.assertTrue(price["free"]["active"])
+        self.assertEqual(price["free"]["query"], "?category=verb")
+        self.assertEqual(sidebar["open_parents"], {"fx"})
+
+
+class RangeFilterTests(TestCase):
+    def test_only_usable_numbers_are_kept(self):
+        params = QueryDict("min_price=10&max_price=abc&min_size=1e3&max_size=NaN")
+        self.assertEqual(range_filters(params), {"min_price": Decimal("10"), "min_size": Decimal("1000")})
+        self.assertEqual(range_filters(QueryDict("max_price=inf&min_size=")), {})
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_bounds_are_inclusive_and_narrow_the_counts(self):
+        fields = {"date_released": "2024-01-01", "description": "", "download_link": ""}
+        for name, price, size in [("Cheap", 0, 10), ("Mid", 50, 200), ("Dear", 200, 5000)]:
+            ProPlugin.objects.create(name=name, price=price, size=size, **fields)
+        response = self.client.get("/plugins?min_price=50&max_price=200&max_size=200")
+        self.assertEqual([plugin.name for plugin in response.context["plugins"]], ["Mid"])
+        price = {option["slug"]: option["count"] for option in response.context["bands"][0]["options"]}
+        self.assertEqual(price, {"free": 0, "under50": 0, "50to150": 1, "over150": 0})
+        # the range form keeps the other filters, but not its own inputs
+        response = self.client.get("/plugins?min_price=50&price=free")
+        self.assertEqual(response.context["range_hidden"], [("price", "free")])
+        self.assertEqual(list(response.context["plugins"]), [])
+        # and the search form keeps the ranges
+        html = self.client.get("/plugins?min_price=50&max_size=0.5").content.decode()
+        search_form = html[html.index('id="plugin-search-form"'):]
+        search_form = search_form[:search_form.index("</form>")]
+        self.assertIn('<input type="hidden" name="min_price" value="50">', search_form)
+        self.assertIn('<input type="hidden" name="max_size" value="0.5">', search_form)
+
+
+class PluginCardTests(TestCase):
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_cards_are_light_rows_from_one_query(self):
+        synths = Category.objects.create(name="Test Synths", slug="test-synths")
+        effects = Category.objects.create(name="Test Effects", slug="test-effects")
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        plugins = [ProPlugin.objects.create(name=f"Card {i}", **fields) for i in range(3)]
+        for plugin in plugins[:2]:
+            plugin.subcategories.add(
+                Subcategory.objects.create(parent=synths, name=f"Pad {plugin.pk}", slug=f"pad-{plugin.pk}"),
+                Subcategory.objects.create(parent=effects, name=f"Verb {plugin.pk}", slug=f"verb-{plugin.pk}"),
+            )
+        with self.assertNumQueries(1):
+            cards = list(ProPlugin.objects.sorted_by("name").cards())
+        self.assertTrue(all(isinstance(card, PluginCard) for card in cards))
+        self.assertEqual([card.pk for card in cards], [p.pk for p in plugins])
+        # the first parent category by name, or nothing for an uncategorised plugin
+        self.assertEqual([card.category_label for card in cards], ["Test Effects", "Test Effects", None])
+        self.assertEqual({card.plugin_type for card in cards}, {"pro"})
+        self.assertEqual(cards[0].image_url, plugins[0].image_url)
+        with self.assertRaises(AttributeError):
+            cards[0].description
+
+
+class PickerTests(TestCase):
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.plugins = [ProPlugin.objects.create(name=f"Picker Synth {i:02}", **fields) for i in range(PAGE_SIZE + 1)]
+
+    def test_search_pages_without_counting(self):
+        source = PICKERS["pro_plugins"]
+        first, more = source.search("picker synth")
+        self.assertEqual((len(first), more), (PAGE_SIZE, True))
+        self.assertEqual(first[0], (self.plugins[0].pk, "Picker Synth 00"))
+        last, more = source.search("picker synth", page=2)
+        self.assertEqual((last, more), ([(self.plugins[-1].pk, self.plugins[-1].name)], False))
+        self.assertEqual(source.labels([str(self.plugins[1].pk), "x", ""]), [(self.plugins[1].pk, "Picker Synth 01")])
+
+    def test_field_validates_with_one_query_and_renders_only_the_selection(self):
+        class LinkForm(forms.Form):
+            link_to_pro_plugins = PickerField("pro_plugins", required=False)
+
+        chosen = [str(self.plugins[0].pk), str(self.plugins[2].pk)]
+        form = LinkForm({"link_to_pro_plugins": chosen})
+        with self.assertNumQueries(1):
+            self.assertTrue(form.is_valid())
+        self.assertEqual(set(form.cleaned_data["link_to_pro_plugins"]), {self.plugins[0], self.plugins[2]})
+        for bad in (["999999"], ["x"]):
+            with self.subTest(bad=bad):
+                self.assertFalse(LinkForm({"link_to_pro_plugins": bad}).is_valid())
+        html = str(form["link_to_pro_plugins"])
+        self.assertIn("Picker Synth 02", html)
+        self.assertNotIn("Picker Synth 01", html)
+
+    def test_endpoint_is_staff_only(self):
+        url = reverse("picker", args=["pro_plugins"])
+        self.client.force_login(CustomUser.objects.create_user(username="member"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(CustomUser.objects.create_user(username="staff", is_staff=True))
+        body = self.client.get(url, {"q": "synth 2", "page": "x"}).json()
+        self.assertEqual(body, {"results": [{"id": self.plugins[20].pk, "label": "Picker Synth 20"}], "has_more": False})
+        self.assertEqual(self.client.get(reverse("picker", args=["users"])).status_code, 404)
+
+
+class SyncM2MTests(TestCase):
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.alt = AlternativePlugin.objects.create(name="Sync Alt", **fields)
+        self.pros = [ProPlugin.objects.create(name=f"Sync Pro {i}", **fields) for i in range(8)]
+        self.events = []
+        m2m_changed.connect(self.on_change, sender=ProPlugin.alternatives.through)
+        self.addCleanup(m2m_changed.disconnect, self.on_change, sender=ProPlugin.alternatives.through)
+
+    def on_change(self, action, pk_set, reverse, **kwargs):
+        self.events.append((action, set(pk_set), reverse))
+
+    def test_only_the_difference_is_written(self):
+        pks = [pro.pk for pro in self.pros]
+        self.alt.pro_plugins.set(pks[:5])
+        self.events.clear()
+        table = ProPlugin.alternatives.through._meta.db_table
+        with CaptureQueriesContext(connection) as queries:
+            added, removed = sync_m2m(self.alt.pro_plugins, [self.pros[0], *pks[3:]])
+        self.assertEqual((added, removed), (set(pks[5:]), {pks[1], pks[2]}))
+        self.assertEqual(set(self.alt.pro_plugins.values_list("pk", flat=True)), {pks[0], *pks[3:]})
+        # one read, one DELETE and one INSERT however many links move
+        self.assertEqual(len([q for q in queries if table in q["sql"]]), 3)
+        self.assertEqual(self.events, [
+            ("pre_remove", {pks[1], pks[2]}, True), ("post_remove", {pks[1], pks[2]}, True),
+            ("pre_add", set(pks[5:]), True), ("post_add", set(pks[5:]), True),
+        ])
+
+    def test_unchanged_links_cost_one_read(self):
+        self.pros[0].alternatives.add(self.alt)
+        self.events.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(sync_m2m(self.pros[0].alternatives, [self.alt.pk]), (set(), set()))
+        self.assertEqual(self.events, [])
+        sync_m2m(self.pros[0].alternatives, [])
+        self.assertEqual(self.events, [("pre_remove", {self.alt.pk}, False), ("post_remove", {self.alt.pk}, False)])
+        self.assertFalse(self.pros[0].alternatives.exists())
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        # a private in-memory cache so nothing leaks between tests
+        self.cache = LocMemCache("ratelimit-tests", {})
+        self.limit = RateLimit("test", "3/m", cache=self.cache)
+
+    def test_allows_up_to_the_limit_then_rejects(self):
+        now = 600.0  # start of a window
+        self.assertEqual([self.limit.hit("a", now) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(self.limit.hit("a", now), 60)
+        # other clients have their own allowance
+        rejected = metrics.RATE_LIMITED.values.get(("test",), 0)
+        self.assertEqual(self.limit.hit("b", now), 0)
+        self.assertEqual(self.limit.hit("a", now), 60)
+        self.assertEqual(metrics.RATE_LIMITED.values.get(("test",), 0), rejected + 1)
+
+    def test_one_read_and_at_most_one_write_per_request(self):
+        calls, depth = [], [0]
+
+        def counted(method, real):
+            # LocMemCache's get_many calls get; only the calls hit() makes count
+            def call(*args, **kwargs):
+                if not depth[0]:
+                    calls.append(method)
+                depth[0] += 1
+                try:
+                    return real(*args, **kwargs)
+                finally:
+                    depth[0] -= 1
+            return call
+
+        for method in ("get", "get_many", "add", "incr", "decr", "set"):
+            setattr(self.cache, method, counted(method, getattr(self.cache, method)))
+        for _ in range(3):
+            calls.clear()
+            self.limit.hit("a", 600.0)
+            self.assertLessEqual(len(calls), 2, calls)
+        calls.clear()
+        self.limit.hit("a", 600.0)
+        # a full window turns the request away on the read alone
+        self.assertEqual(calls, ["get_many"])
+
+    def test_previous_window_fades_out(self):
+        for _ in range(3):
+            self.limit.hit("a", 600.0)
+        # halfway into the next window half of the old hits still count
+        self.assertEqual(self.limit.hit("a", 690.0), 0)
+        self.assertGreater(self.limit.hit("a", 690.0), 0)
+        self.assertEqual(self.limit.hit("a", 719.0), 0)
+
+    def test_views_return_429_with_retry_after(self):
+        view_limit = RATE_LIMITS["search"]
+        view_limit._cache = self.cache
+        self.addCleanup(setattr, view_limit, "_cache", None)
+        for _ in range(view_limit.limit):
+            self.assertEqual(self.client.get("/ajax/search/?q=x").status_code, 200)
+        response = self.client.get("/ajax/search/?q=x")
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(int(response["Retry-After"]) >= 1)
+
+
+    def test_client_ip_behind_trusted_proxies(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.1", HTTP_X_FORWARDED_FOR="6.6.6.6, 1.2.3.4")
+        with override_settings(RATELIMIT_TRUST_FORWARDED_FOR=0):
+            self.assertEqual(client_ip(request), "10.0.0.1")
+        # one proxy: whatever the client put in front of its own address is ignored
+        with override_settings(RATELIMIT_TRUST_FORWARDED_FOR=1):
+            self.assertEqual(client_ip(request), "1.2.3.4")
+        with override_settings(RATELIMIT_TRUST_FORWARDED_FOR=3):
+            self.assertEqual(client_ip(request), "10.0.0.1")
+
+    def test_default_cache_is_shared_between_processes(self):
+        self.assertNotIn("LocMemCache", settings.CACHES["default"]["BACKEND"])
+
+    def test_counters_have_a_cache_of_their_own(self):
+        # limiter keys can't cull the cards and version keys out of the default cache
+        self.assertNotEqual(settings.RATELIMIT_CACHE, "default")
+        counters = caches[settings.RATELIMIT_CACHE]
+        self.assertIsNone(counters.default_timeout)
+        self.assertGreaterEqual(counters._max_entries, 100000)
+
+
+class RankingTests(TestCase):
+    def setUp(self):
+        ranking.cache.delete(ranking.PRIOR_KEY)
+        self.users = [CustomUser.objects.create_user(username=f"user{i}") for i in range(6)]
+        self.fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.one_vote = AlternativePlugin.objects.create(name="one vote", **self.fields)
+        self.many_votes = AlternativePlugin.objects.create(name="many votes", **self.fields)
+
+    def test_many_good_votes_outrank_one_perfect_vote(self):
+        poor = AlternativePlugin.objects.create(name="poor", **self.fields)
+        ranking.record_vote(self.users[0], self.one_vote, 5.0)
+        for user in self.users:
+            ranking.record_vote(user, self.many_votes, 4.5)
+            ranking.record_vote(user, poor, 2.0)
+        ranking.recompute()
+        self.assertEqual(list(AlternativePlugin.objects.top_rated()), [self.many_votes, self.one_vote, poor])
+
+    def test_incremental_scores_match_the_batch_job(self):
+        for user, score in zip(self.users, [5.0, 3.0, 4.0]):
+            ranking.record_vote(user, self.one_vote, score)
+        # changing a vote takes the old one back out
+        ranking.record_vote(self.users[1], self.one_vote, 1.0)
+        incremental = AlternativePlugin.objects.get(pk=self.one_vote.pk)
+        ranking.recompute()
+        batch = AlternativePlugin.objects.get(pk=self.one_vote.pk)
+        self.assertEqual(batch.rating_count, 3)
+        self.assertEqual(incremental.rating_count, 3)
+        self.assertAlmostEqual(incremental.trending_score, batch.trending_score, places=6)
+        self.assertAlmostEqual(float(incremental.rating), float(batch.rating), places=2)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        effects = Category.objects.create(name="FX", slug="fx")
+        self.reverb = Subcategory.objects.create(parent=effects, name="Verb", slug="verb")
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.first, self.second = (AlternativePlugin.objects.create(name=name, **fields) for name in ("first", "second"))
+
+    def board(self, slug):
+        return Leaderboard.objects.get(plugin_type="alt", slug=slug, metric="rating").plugin_ids
+
+    def dirty(self):
+        return set(Leaderboard.objects.filter(dirty_at__isnull=False).values_list("slug", "metric"))
+
+    def test_boards_follow_subcategory_and_rating_changes(self):
+        first, second = self.first, self.second
+        leaderboards.rebuild()
+
+        # captureOnCommitCallbacks runs the marking that would run after a real commit
+        with self.captureOnCommitCallbacks(execute=True):
+            first.subcategories.add(self.reverb)
+            second.subcategories.add(self.reverb)
+        leaderboards.refresh_dirty()
+        self.assertCountEqual(self.board("verb"), [first.pk, second.pk])
+        self.assertCountEqual(self.board("fx"), [first.pk, second.pk])
+
+        user = CustomUser.objects.create_user(username="voter")
+        with self.captureOnCommitCallbacks(execute=True):
+            ranking.record_vote(user, second, 5.0)
+        leaderboards.refresh_dirty()
+        self.assertEqual(self.board("verb"), [second.pk, first.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        leaderboards.refresh_dirty()
+        self.assertEqual(self.board("fx"), [first.pk])
+        self.assertEqual(self.dirty(), set())
+
+    def test_writes_only_mark_the_boards_they_can_move(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.subcategories.add(self.reverb)
+        leaderboards.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            ranking.record_vote(CustomUser.objects.create_user(username="voter"), self.first, 5.0)
+        # a vote moves the rating and trending boards, never the newest one, and nothing is recomputed yet
+        self.assertEqual(self.dirty(), {(slug, metric) for slug in ("fx", "verb") for metric in ("rating", "trending")})
+        self.assertEqual(self.board("verb"), [self.first.pk])
+
+        leaderboards.refresh_dirty()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.description = "no board sorts on this"
+            self.first.save(update_fields=["description"])
+        self.assertEqual(self.dirty(), set())
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_the_listing_reads_around_a_dirty_board(self):
+        self.first.subcategories.add(self.reverb)
+        self.second.subcategories.add(self.reverb)
+        leaderboards.rebuild()
+        # a stale board, marked dirty and not recomputed yet
+        Leaderboard.objects.filter(slug="verb", metric="rating").update(plugin_ids=[self.second.pk], dirty_at=timezone.now())
+        response = self.client.get("/plugins?tab=alt&category=verb&sort=rating")
+        self.assertEqual([card.pk for card in response.context["plugins"]], [self.first.pk, self.second.pk])
+
+
+class ListingPageTests(TestCase):
+    def test_same_day_plugins_page_in_a_stable_order(self):
+        effects = Category.objects.create(name="FX", slug="fx")
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        plugins = [AlternativePlugin.objects.create(name=f"same day {i}", **fields) for i in range(4)]
+        for plugin in plugins:
+            plugin.subcategories.add(Subcategory.objects.get_or_create(parent=effects, name="Verb", slug="verb")[0])
+        newest = list(AlternativePlugin.objects.sorted_by("newest").values_list("pk", flat=True))
+        self.assertEqual(newest, sorted((p.pk for p in plugins), reverse=True))
+        # the leaderboard's page 1 and the OFFSET pages after it agree
+        for metric in LEADERBOARD_METRICS:
+            with self.subTest(metric=metric):
+                self.assertEqual(
+                    leaderboards.board_ids(AlternativePlugin, "fx", metric, True),
+                    list(AlternativePlugin.objects.sorted_by(metric).values_list("pk", flat=True)),
+                )
+
+    def test_page_past_the_limit_is_a_404(self):
+        self.assertEqual(self.client.get("/plugins?page=99999999999999999999").status_code, 404)
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class AsyncViewTests(TestCase):
+    # the async views go through the async ORM end to end, a lazy queryset reaching
+    # a template would raise SynchronousOnlyOperation here
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.pro = ProPlugin.objects.create(name="Serum", rating_count=2, bayes_score=4.5, **fields)
+        self.alt = AlternativePlugin.objects.create(name="Vital", rating_count=1, bayes_score=4, **fields)
+        self.alt.pro_plugins.add(self.pro)
+
+    async def test_home(self):
+        response = await self.async_client.get(reverse("home"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.pk for p in response.context["top_rated_pro"]], [self.pro.pk])
+        self.assertEqual([p.pk for p in response.context["recent_alt"]], [self.alt.pk])
+
+    async def test_plugins(self):
+        response = await self.async_client.get(reverse("plugins"), {"tab": "alt", "sort": "rating"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p.pk for p in response.context["plugins"]], [self.alt.pk])
+        self.assertEqual((response.context["active_tab"], response.context["has_more"]), ("alt", False))
+
+        ajax = {"x-requested-with": "XMLHttpRequest"}
+        cards = await self.async_client.get(reverse("plugins"), {"q": "serum"}, headers=ajax)
+        self.assertTemplateUsed(cards, "partials/plugin_cards.html")
+        self.assertEqual([p.pk for p in cards.context["plugins"]], [self.pro.pk])
+
+    async def test_plugin_detail(self):
+        response = await self.async_client.get(reverse("plugin_detail", args=[self.pro.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["plugin"], self.pro)
+        self.assertEqual(response.context["rating_count"], 2)
+
+        response = await self.async_client.get(reverse("alt_plugin_detail", args=[self.alt.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["plugin"], self.alt)
+        self.assertEqual(response.context["family_alternatives"], [])
+        self.assertEqual((await self.async_client.get(reverse("plugin_detail", args=[0]))).status_code, 404)
+
+    async def test_search_plugins(self):
+        response = await self.async_client.get(reverse("ajax_search"), {"q": "vi"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["name"] for result in response.json()["results"]], ["Vital"])
+
+
+class SitemapTests(TestCase):
+    def test_index_sections_and_out_of_range_pages(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        plugin = AlternativePlugin.objects.create(name="Vital", **fields)
+        index = self.client.get("/sitemap.xml").content.decode()
+        self.assertIn("/sitemap-alt-1.xml", index)
+        # no pro plugins, no pro section
+        self.assertNotIn("/sitemap-pro-1.xml", index)
+
+        section = self.client.get("/sitemap-alt-1.xml").content.decode()
+        self.assertIn(f"/plugins/alt/{plugin.pk}/</loc><lastmod>{plugin.updated_at.date().isoformat()}", section)
+        for path in ("/sitemap-alt-2.xml", "/sitemap-pro-1.xml", "/sitemap-alt-99999999999999999999.xml"):
+            self.assertEqual(self.client.get(path).status_code, 404, path)
+
+    @override_settings(STORAGES=PLAIN_STATIC)
+    def test_snapshots_go_to_anonymous_visitors_until_the_plugin_changes(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        plugin = AlternativePlugin.objects.create(name="Vital", **fields)
+        url = f"/plugins/alt/{plugin.pk}/"
+        with tempfile.TemporaryDirectory() as root, override_settings(PRERENDER_ROOT=root):
+            snapshots.write_snapshot(url, b"prerendered")
+            client = self.client_class()
+            self.assertEqual(b"".join(client.get(url).streaming_content), b"prerendered")
+            # a session means the live page
+            client.cookies[settings.SESSION_COOKIE_NAME] = "x"
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.streaming)
+            plugin.save()
+            self.assertFalse(os.path.exists(snapshots.snapshot_path(url)))
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class CatalogTests(TestCase):
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        self.pros = [ProPlugin.objects.create(name=f"Verb Pro {i}", **fields) for i in range(4)]
+        self.alts = [AlternativePlugin.objects.create(name=f"Verb Free {i}", **fields) for i in range(4)]
+
+    def test_union_covers_both_tables_in_one_query(self):
+        with self.assertNumQueries(1):
+            cards = list(catalog().order_by("plugin_type", "name"))
+        self.assertEqual([(card.plugin_type, card.pk) for card in cards], [
+            *(("alt", plugin.pk) for plugin in self.alts), *(("pro", plugin.pk) for plugin in self.pros),
+        ])
+
+    def test_navbar_search_shows_three_of_each_type(self):
+        results = self.client.get("/ajax/search/?q=Verb").json()["results"]
+        self.assertEqual([result["type"] for result in results], ["Free"] * 3 + ["Pro/Paid"] * 3)
+        self.assertEqual(results[3]["name"], "Verb Pro 0")
+
+
+class AlternativesGraphTests(TestCase):
+    def setUp(self):
+        # a cache outside the test transaction, the way redis would be
+        patcher = mock.patch.object(graph, "cache", LocMemCache("graph-tests", {}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, graph, "_graph", None)
+
+    def test_graph_follows_committed_links_only(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        pro = ProPlugin.objects.create(name="Serum", **fields)
+        alt = AlternativePlugin.objects.create(name="Vital", **fields)
+        graph.get_graph()
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            pro.alternatives.add(alt)
+            raise RuntimeError
+        self.assertEqual(list(graph.get_graph().neighbors("pro", pro.pk)), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pro.alternatives.add(alt)
+        self.assertEqual(list(graph.get_graph().neighbors("pro", pro.pk)), [alt.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alt.delete()
+        self.assertEqual(list(graph.get_graph().neighbors("pro", pro.pk)), [])
+
+    def test_a_lost_version_never_comes_back_round(self):
+        # a cache whose default timeout expires keys straight away
+        with mock.patch.object(graph, "cache", LocMemCache("graph-expiring", {"TIMEOUT": 0})):
+            graph._bump_version(lambda g: None)
+            held = graph.current_version()
+            graph._bump_version(lambda g: None)
+            self.assertEqual(graph.current_version(), held + 1)
+            graph.cache.clear()
+            graph._bump_version(lambda g: None)
+            self.assertGreater(graph.current_version(), held + 1)
+
+    def test_copies_are_rebuilt_after_max_age(self):
+        built = graph.get_graph()
+        self.assertIs(graph.get_graph(), built)
+        built.built_at -= graph.MAX_AGE + 1
+        self.assertIsNot(graph.get_graph(), built)
+
+
+@override_settings(STORAGES=PLAIN_STATIC)
+class FragmentCacheTests(TestCase):
+    def test_cards_are_reused_until_they_change(self):
+        before = fragments.stats()
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        plugin = AlternativePlugin.objects.create(name="Vital", **fields)
+        card = AlternativePlugin.objects.cards().get(pk=plugin.pk)
+        first = fragments.render_cards([card], "alt")
+        # a hit is the one cache read, the counting stays in process memory
+        with self.assertNumQueries(1):
+            self.assertEqual(fragments.render_cards([card], "alt"), first)
+        after = fragments.stats()
+        self.assertEqual((after["hits"] - before["hits"], after["misses"] - before["misses"]), (1, 1))
+        self.assertEqual(after["bytes"] - before["bytes"], len(first))
+
+        # a new subcategory doesn't touch updated_at, but the label on the card changes
+        synths = Category.objects.create(name="Synths", slug="synths")
+        plugin.subcategories.add(Subcategory.objects.create(parent=synths, name="Wavetable", slug="wavetable"))
+        relabeled = AlternativePlugin.objects.cards().get(pk=plugin.pk)
+        self.assertNotEqual(fragments.card_key(relabeled, "alt"), fragments.card_key(card, "alt"))
+        self.assertIn("Synths", fragments.render_cards([relabeled], "alt"))
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            out = StringIO()
+            call_command("card_cache_stats", stdout=out)
+        self.assertIn("hit ratio", out.getvalue())
+
+    def test_stats_need_every_workers_counters(self):
+        with override_settings(METRICS_DIR=None), self.assertRaises(CommandError):
+            call_command("card_cache_stats", stdout=StringIO())
+
+
+class SimilarPluginsTests(TestCase):
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 10, "size": 1, "download_link": ""}
+        self.saw, self.square, self.wavetable = (
+            AlternativePlugin.objects.create(name=name, description=description, **fields)
+            for name, description in (
+                ("Saw", "bright analog saw oscillator"), ("Square", "warm analog square oscillator"),
+                ("Wavetable", "wavetable engine"),
+            )
+        )
+        self.pro = ProPlugin.objects.create(name="Serum", description="", date_released="2024-01-01", price=0, size=0, download_link="")
+
+    def neighbors(self, plugin):
+        return list(PluginNeighbor.for_plugin(plugin).values_list("neighbor_id", flat=True))
+
+    def test_incremental_runs_follow_the_event_log(self):
+        # the first run has no checkpoint, so it does everything
+        self.assertEqual(similarity.build_neighbors(k=2), 4)
+        self.assertEqual(self.neighbors(self.saw)[0], self.square.pk)
+        # nothing changed, nothing to do
+        self.assertEqual(similarity.build_neighbors(k=2), 0)
+        computed_at = PluginNeighbor.for_plugin(self.square).first().computed_at
+
+        # a subcategory link never touches updated_at
+        synths = Category.objects.create(name="Synths", slug="synths")
+        wavetables = Subcategory.objects.create(parent=synths, name="Wavetable", slug="wavetable")
+        wavetables.alt_plugins.add(self.wavetable, self.saw)
+        similarity.build_neighbors(k=2)
+        self.assertEqual(self.neighbors(self.saw)[0], self.wavetable.pk)
+        # square listed saw, so its list was recomputed too
+        self.assertGreater(PluginNeighbor.for_plugin(self.square).first().computed_at, computed_at)
+
+        self.square.delete()
+        similarity.build_neighbors(k=2)
+        self.assertNotIn(self.square.pk, self.neighbors(self.saw) + self.neighbors(self.wavetable))
+
+
+    def test_links_to_plugins_created_mid_build_are_skipped(self):
+        synths = Category.objects.create(name="Synths", slug="synths")
+        wavetables = Subcategory.objects.create(parent=synths, name="Wavetable", slug="wavetable")
+        wavetables.alt_plugins.add(self.wavetable, self.saw)
+        fields = {"date_released": "2024-01-01", "price": 10, "size": 1, "download_link": "", "description": ""}
+        real_build = similarity.Catalog.build_subcategories
+
+        def build_subcategories(catalog):
+            # saved between reading the plugins and reading their subcategory links
+            wavetables.alt_plugins.add(AlternativePlugin.objects.create(name="Vital", **fields))
+            return real_build(catalog)
+
+        with mock.patch.object(similarity.Catalog, "build_subcategories", build_subcategories):
+            catalog = similarity.Catalog()
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual(catalog.subcategories.nnz, 2)
+
+class DedupeTests(TestCase):
+    def setUp(self):
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1}
+        self.serum = ProPlugin.objects.create(name="Serum", download_link="https://xferrecords.com/products/serum", **fields)
+        self.vital = AlternativePlugin.objects.create(name="Vital", download_link="https://github.com/mtytel/vital", **fields)
+
+    def test_matches_by_name_link_and_similarity(self):
+        match = dedupe.find_duplicate("Serum VST3 (x64) by Xfer Records", "")
+        self.assertEqual((match.kind, match.object_id, match.reason), ("pro", self.serum.pk, "name"))
+        match = dedupe.find_duplicate("Something else", "http://www.github.com/mtytel/vital/")
+        self.assertEqual((match.object_id, match.reason), (self.vital.pk, "link"))
+        self.assertEqual(dedupe.find_duplicate("Vitall", "").reason, "similar")
+        # sharing a popular host alone doesn't make two plugins candidates
+        self.assertIsNone(dedupe.find_duplicate("Surge XT", "https://github.com/surge-synthesizer/surge"))
+        self.assertFalse(DedupeKey.objects.filter(key__startswith="d:").exists())
+
+    def test_only_name_or_link_changes_reindex(self):
+        plugin = ProPlugin.objects.get(pk=self.serum.pk)
+        with mock.patch.object(dedupe, "index_object") as index_object:
+            plugin.rating = 4
+            plugin.save()
+            index_object.assert_not_called()
+            plugin.name = "Serum 2"
+            plugin.save()
+            index_object.assert_called_once_with(plugin)
+
+    def test_suggestions_leave_the_index_with_the_queue(self):
+        user = CustomUser.objects.create_user(username="suggester")
+        suggestion = PluginSuggestion.objects.create(submitter=user, name="Vital", suggested_type="ALT", link="")
+        self.assertEqual(dedupe.find_duplicate("Vital", "", exclude=("alt", self.vital.pk)).kind, "sugg")
+        suggestion.status = "REJECTED"
+        suggestion.save()
+        self.assertIsNone(dedupe.find_duplicate("Vital", "", exclude=("alt", self.vital.pk)))
+
+
+class CatalogEventTests(TestCase):
+    def test_consumer_reads_each_change_once_in_order(self):
+        category = Category.objects.create(name="FX", slug="fx")
+        sub = Subcategory.objects.create(parent=category, name="Verb", slug="verb")
+        self.assertEqual(list(events.consume("test"))[0][-1].object_type, "subcategory")
+
+        plugin = ProPlugin.objects.create(
+            name="Verb", date_released="2024-01-01", price=0, description="", size=1, download_link="",
+        )
+        plugin.subcategories.add(sub)
+        plugin.delete()
+        seen = [(e.action, e.object_type) for batch in events.consume("test") for e in batch]
+        self.assertEqual(seen, [("create", "pro"), ("m2m", "pro"), ("delete", "pro")])
+        self.assertEqual(list(events.consume("test")), [])
+
+    def test_ids_that_commit_late_are_still_delivered(self):
+        first = events.record("update", "category", 1)
+        # first.pk + 1 went to a transaction that hasn't committed yet
+        CatalogEvent.objects.create(pk=first.pk + 2, action="update", object_type="category", object_id=2)
+        self.assertEqual([e.pk for batch in events.consume("test") for e in batch], [first.pk, first.pk + 2])
+        self.assertEqual(list(events.checkpoint("test")[1]), [first.pk + 1])
+
+        CatalogEvent.objects.create(pk=first.pk + 1, action="update", object_type="category", object_id=3)
+        self.assertEqual([e.pk for batch in events.consume("test") for e in batch], [first.pk + 1])
+        self.assertEqual(events.checkpoint("test"), (first.pk + 2, {}))
+
+    def test_gaps_are_given_up_after_the_timeout(self):
+        first = events.record("update", "category", 1)
+        CatalogEvent.objects.create(pk=first.pk + 3, action="update", object_type="category", object_id=2)
+        gaps = {}
+        read = [e.pk for batch in events.tail(first.pk - 1, gaps=gaps) for e in batch]
+        self.assertEqual(read, [first.pk, first.pk + 3])
+        self.assertEqual(set(gaps), {first.pk + 1, first.pk + 2})
+        list(events.tail(first.pk + 3, gaps=gaps))
+        self.assertEqual(len(gaps), 2)
+        list(events.tail(first.pk + 3, gaps=gaps, gap_timeout=timedelta(0)))
+        self.assertEqual(gaps, {})
+
+
+class EditPluginTests(TestCase):
+    def test_storage_calls_happen_outside_the_transaction(self):
+        staff = CustomUser.objects.create_user(username="editor", is_staff=True)
+        self.client.force_login(staff)
+        sub = Subcategory.objects.create(parent=Category.objects.create(name="FX", slug="fx"), name="Verb", slug="verb")
+        with tempfile.TemporaryDirectory() as root, override_settings(STORAGES={
+            **PLAIN_STATIC, "default": {"BACKEND": "home.storage.LocalCloudinaryStorage", "OPTIONS": {"location": root}},
+        }):
+            plugin = ProPlugin.objects.create(
+                name="Verb", date_released="2024-01-01", price=0, description="", size=1, download_link="",
+            )
+            old = AudioDemo.objects.create(pro_plugin=plugin, title="old", audio_file=ContentFile(b"old", name="old.wav"))
+            old_name = old.audio_file.name
+
+            depths, calls = [], []
+            outer = len(connection.atomic_blocks)
+            original_save, original_delete = LocalCloudinaryStorage._save, LocalCloudinaryStorage.delete
+
+            def save(storage, name, content):
+                depths.append(len(connection.atomic_blocks))
+                calls.append("save")
+                return original_save(storage, name, content)
+
+            def delete(storage, name, **kwargs):
+                depths.append(len(connection.atomic_blocks))
+                calls.append("delete")
+                return original_delete(storage, name, **kwargs)
+
+            with mock.patch.object(LocalCloudinaryStorage, "_save", save), \
+                    mock.patch.object(LocalCloudinaryStorage, "delete", delete):
+                response = self.client.post(reverse("edit_plugin", args=["pro", plugin.pk]), {
+                    "plugin_type": "PRO", "plugin_name": "Verb 2", "date_released": "2024-01-01", "price": 0,
+                    "description": "d", "size": 1, "download_link": "https://example.com", "subcategory": [sub.pk],
+                    "audio_demo_1": ContentFile(b"new", name="new.wav"), "demo_title_1": "new",
+                })
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(calls, ["save", "delete"])
+            self.assertEqual(depths, [outer, outer])
+            demo = AudioDemo.objects.get(pk=old.pk)
+            self.assertEqual((demo.title, demo.audio_file.name), ("new", "video:audio_demos/new"))
+            self.assertFalse(default_storage.exists(old_name))
+            self.assertTrue(default_storage.exists(demo.audio_file.name))
+
+class ModerationQueueTests(TestCase):
+    def test_queue_pages_and_batch_updates(self):
+        user = CustomUser.objects.create_user(username="u", email="u@example.com", password="x")
+        suggestions = [
+            PluginSuggestion.objects.create(submitter=user, name=f"S{i}", link="https://example.com") for i in range(5)
+        ]
+        # several share a timestamp, the pk breaks the tie
+        PluginSuggestion.objects.filter(pk__in=[s.pk for s in suggestions[1:4]]).update(
+            date_suggested=suggestions[1].date_suggested,
+        )
+        pending = PluginSuggestion.objects.filter(status="PENDING")
+        seen, cursor = [], None
+        while True:
+            rows, cursor = keyset_page(pending, "date_suggested", after=cursor, size=2)
+            seen += [s.pk for s in rows]
+            if not cursor:
+                break
+        self.assertEqual(seen, list(pending.order_by("date_suggested", "pk").values_list("pk", flat=True)))
+
+        self.assertTrue(moderation.at_pending_limit(user))
+        changed = moderation.set_status([s.pk for s in suggestions[:3]], "REJECTED")
+        self.assertEqual(len(changed), 3)
+        self.assertEqual(moderation.set_status([suggestions[0].pk], "REJECTED"), [])
+        self.assertFalse(moderation.at_pending_limit(user))
+        self.assertEqual(CatalogEvent.objects.filter(object_type="suggestion", data__status="REJECTED").count(), 3)
+
+
+    def test_single_reject_needs_a_suggestion_id(self):
+        staff = CustomUser.objects.create_user(username="staff", password="x", is_staff=True)
+        suggestion = PluginSuggestion.objects.create(submitter=staff, name="S", link="https://example.com")
+        self.client.force_login(staff)
+        url = reverse("staff_dashboard")
+        for bad in ({}, {"suggestion_id": ""}, {"suggestion_id": "1 OR 1=1"}):
+            with self.subTest(data=bad):
+                self.assertEqual(self.client.post(url, {"reject_suggestion": "1", **bad}).status_code, 404)
+        response = self.client.post(url, {"reject_suggestion": "1", "suggestion_id": suggestion.pk})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        suggestion.refresh_from_db()
+        self.assertEqual(suggestion.status, "REJECTED")
+
+class AdminActionTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username="admin", email="admin@example.com", password="x")
+        self.client.force_login(self.admin)
+
+    def run_action(self, model, action, objects):
+        url = reverse(f"admin:home_{model._meta.model_name}_changelist")
+        response = self.client.post(url, {"action": action, "_selected_action": [obj.pk for obj in objects]})
+        self.assertEqual(response.status_code, 302)
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_suggestions_change_status_in_bulk(self):
+        vital = AlternativePlugin.objects.create(
+            name="Vital", date_released="2024-01-01", price=0, description="", size=1, download_link="",
+        )
+        suggestions = [
+            PluginSuggestion.objects.create(submitter=self.admin, name=name, suggested_type="ALT", link="")
+            for name in ("Vital", "Surge", "Dexed")
+        ]
+        PluginSuggestion.objects.filter(pk=suggestions[2].pk).update(status="APPROVED")
+        messages = self.run_action(PluginSuggestion, "approve_suggestions", suggestions)
+        self.assertEqual(messages, ["Marked 2 suggestions as approved."])
+        self.assertEqual(set(PluginSuggestion.objects.values_list("status", flat=True)), {"APPROVED"})
+        self.assertEqual(CatalogEvent.objects.filter(object_type="suggestion", data__status="APPROVED").count(), 2)
+        # approved suggestions stop turning up as duplicates
+        self.assertIsNone(dedupe.find_duplicate("Vital", "", exclude=("alt", vital.pk)))
+
+    def test_recompute_ratings_repairs_scores_and_boards(self):
+        effects = Category.objects.create(name="FX", slug="fx")
+        reverb = Subcategory.objects.create(parent=effects, name="Verb", slug="verb")
+        fields = {"date_released": "2024-01-01", "price": 0, "description": "", "size": 1, "download_link": ""}
+        first, second = (AlternativePlugin.objects.create(name=name, **fields) for name in ("first", "second"))
+        first.subcategories.add(reverb)
+        second.subcategories.add(reverb)
+        ranking.record_vote(self.admin, second, 5.0)
+        expected = AlternativePlugin.objects.values_list("rating", "rating_count", "bayes_score").get(pk=second.pk)
+        # scores written behind the ranking code's back, and boards built from them
+        AlternativePlugin.objects.update(rating=0, rating_count=0, bayes_score=0, trending_score=0)
+        leaderboards.rebuild()
+        board = Leaderboard.objects.filter(plugin_type="alt", slug="verb", metric="rating")
+        self.assertEqual(board.get().plugin_ids, [first.pk, second.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            messages = self.run_action(AlternativePlugin, "recompute_ratings", [first, second])
+        leaderboards.refresh_dirty()
+        self.assertEqual(messages, ["Recomputed 2 plugins, 1 changed."])
+        self.assertEqual(
+            AlternativePlugin.objects.values_list("rating", "rating_count", "bayes_score").get(pk=second.pk), expected,
+        )
+        self.assertEqual(board.get().plugin_ids, [second.pk, first.pk])
+
+
+class WarmupTests(TestCase):
+    def test_worker_boot_parses_every_template(self):
+        cached = engines["django"].engine.template_loaders[0]
+        cached.reset()
+        self.assertEqual(warmup.warm_templates(), len(warmup.template_names()))
+        self.assertIn("plugins.html", warmup.template_names())
+        self.assertIn("partials/plugin_cards.html", warmup.template_names())
+        # every name is in the cached loader, so a request never reads a template file
+        self.assertTrue(set(warmup.template_names()) <= set(cached.get_template_cache))
+        with mock.patch.object(FilesystemLoader, "get_contents", side_effect=AssertionError("template read")):
+            for name in warmup.template_names():
+                engines["django"].get_template(name)
+
+
+class BuildAppsTests(SimpleTestCase):
+    # settings.py is run again for each case, so argv and the environment are read fresh
+    def load_settings(self, argv, **env):
+        spec = spec_from_file_location("build_apps_settings", settings.BASE_DIR / "mpc_database" / "settings.py")
+        module = module_from_spec(spec)
+        env = {"DEBUG": "False", "DJANGO_BUILD_APPS": "", **env}
+        with mock.patch.object(sys, "argv", argv), mock.patch.dict(os.environ, env):
+            spec.loader.exec_module(module)
+        return module
+
+    def test_build_apps_only_where_something_builds(self):
+        cases = [
+            (["gunicorn", "mpc_database.wsgi"], {}, False),
+            (["uvicorn", "mpc_database.asgi:application"], {}, False),
+            (["/srv/app/manage.py", "collectstatic"], {}, True),
+            (["gunicorn", "mpc_database.wsgi"], {"DJANGO_BUILD_APPS": "1"}, True),
+            (["gunicorn", "mpc_database.wsgi"], {"DEBUG": "True"}, True),
+        ]
+        for argv, env, build in cases:
+            with self.subTest(argv=argv[0], **env):
+                loaded = self.load_settings(argv, **env)
+                self.assertEqual(loaded.BUILD_APPS, build)
+                self.assertEqual({"tailwind", "theme"} <= set(loaded.INSTALLED_APPS), build)
+                self.assertEqual(hasattr(loaded, "NPM_BIN_PATH"), build)
+
+    def test_browser_reload_only_with_debug(self):
+        for debug in (False, True):
+            with self.subTest(debug=debug):
+                loaded = self.load_settings(["manage.py", "runserver"], DEBUG=str(debug))
+                self.assertEqual("django_browser_reload" in loaded.INSTALLED_APPS, debug)
+                self.assertEqual(
+                    "django_browser_reload.middleware.BrowserReloadMiddleware" in loaded.MIDDLEWARE, debug,
+                )
+
+
+class ProfilingTests(TestCase):
+    def test_staff_header_saves_a_profile_and_keeps_a_ring(self):
+        staff = CustomUser.objects.create_user(username="s", email="s@example.com", password="x", is_staff=True)
+        with tempfile.TemporaryDirectory() as root, override_settings(PROFILE_ROOT=root, PROFILE_KEEP=2):
+            self.client.force_login(staff)
+            for _ in range(3):
+                response = self.client.get(reverse("robots_txt"), HTTP_X_PROFILE="1")
+            self.assertIn("X-Profile-Id", response)
+            profiles = profiling.recent()
+            self.assertEqual(len(profiles), 2)
+            self.assertEqual(profiles[0]["id"], response["X-Profile-Id"])
+            self.assertEqual(profiles[0]["view"], "robots_txt")
+
+            stacks = self.client.get(reverse("profile_stacks", args=[profiles[0]["id"]]))
+            self.assertEqual(stacks.status_code, 200)
+            self.assertEqual(self.client.get(reverse("profile_stacks", args=[".."])).status_code, 404)
+
+
+class MetricsTests(TestCase):
+    def test_requests_are_counted_and_worker_files_add_up(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(METRICS_DIR=root, METRICS_TOKEN="secret"):
+            self.client.get(reverse("robots_txt"))
+            # another worker's numbers
+            with open(os.path.join(root, "1.json"), "w") as f:
+                json.dump({"http_requests_total": [[["robots_txt", "GET", "200"], 41]]}, f)
+
+            self.assertEqual(self.client.get(reverse("metrics")).status_code, 401)
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+            # the local count depends on what ran before, the merge doesn't
+            local = metrics.REQUESTS.values[("robots_txt", "GET", "200")]
+            self.assertContains(response, f'http_requests_total{{view="robots_txt",method="GET",status="200"}} {local + 41}')
+            self.assertContains(response, 'http_request_duration_seconds_bucket{view="robots_txt",method="GET",le="+Inf"}')
+
+
+class LocalMediaStorageTests(TestCase):
+    def test_cloudinary_names_urls_and_bulk_delete(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalCloudinaryStorage(location=root, base_url="/media/")
+            image = storage.save("plugin_images/serum.png", ContentFile(b"png"))
+            audio = storage.save("audio_demos/pad.wav", ContentFile(b"wav"))
+            self.assertEqual((image, audio), ("image:plugin_images/serum", "video:audio_demos/pad"))
+            self.assertEqual(
+                storage.url(image, width=300, height=200, crop="fill"),
+                "/media/image/upload/c_fill,h_200,w_300/plugin_images/serum",
+            )
+            self.assertTrue(storage.exists(audio))
+            self.assertEqual(
+                storage.delete_many([image, audio, "image:missing"]),
+                {image: "deleted", audio: "deleted", "image:missing": "not_found"},
+            )
+            self.assertFalse(storage.exists(image))
+
+            flaky = LocalCloudinaryStorage(location=root, failure_rate=1.0)
+            with self.assertRaises(InjectedFailure):
+                flaky.save("plugin_images/vital.png", ContentFile(b"png"))
+
+    def test_public_ids_match_exactly(self):
+        # "serum" and "serum.v2" are different public ids
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalCloudinaryStorage(location=root)
+            v2 = storage.save("plugin_images/serum.v2.png", ContentFile(b"v2"))
+            storage.save("plugin_images/serum.png", ContentFile(b"v1"))
+            self.assertIsNotNone(storage.locate("plugin_images/serum.v2", "image"))
+            storage.destroy("plugin_images/serum", "image")
+            self.assertIsNone(storage.locate("plugin_images/serum", "image"))
+            self.assertTrue(storage.locate("plugin_images/serum.v2", "image").endswith("serum.v2.png"))
+            self.assertEqual(v2, "image:plugin_images/serum.v2")
+
+
+class AssetManifestTests(TestCase):
+    def test_manifest_answers_and_reconcile(self):
+        with tempfile.TemporaryDirectory() as root:
+            storage = LocalCloudinaryStorage(location=root, base_url="/media/")
+            image = storage.save("plugin_images/serum.png", ContentFile(b"png"))
+            self.assertTrue(storage.exists(image))
+            with self.assertNumQueries(0):
+                self.assertTrue(storage.exists(image))
+                self.assertEqual(storage.size(image), 3)
+            # the upload name is taken, so the next upload doesn't replace it
+            self.assertTrue(storage.exists("plugin_images/serum.png"))
+            self.assertNotEqual(storage.save("plugin_images/serum.png", ContentFile(b"png2")), image)
+            self.assertEqual(storage.listdir("plugin_images")[1][0], "serum")
+            self.assertEqual(StoredAsset.objects.get(name=image).checksum, "bff139fa05ac583f685a523ab3d110a0")
+
+            # a file the manifest never saw, and one that went missing behind its back
+            os.makedirs(os.path.join(root, "video", "audio_demos"))
+            with open(os.path.join(root, "video", "audio_demos", "pad.wav"), "wb") as f:
+                f.write(b"wav")
+            os.remove(storage.locate("plugin_images/serum", "image"))
+            seen, removed = assets.reconcile(storage, page_size=1)
+            self.assertEqual((seen, removed), (2, 1))
+            self.assertTrue(storage.exists("video:audio_demos/pad"))
+            self.assertFalse(storage.exists(image))
+
+    def test_a_lost_version_never_comes_back_round(self):
+        with mock.patch.object(assets, "cache", LocMemCache("assets-expiring", {"TIMEOUT": 0})):
+            assets._bump_version()
+            held = assets.cache.get(assets.VERSION_KEY)
+            assets._bump_version()
+            self.assertEqual(assets.cache.get(assets.VERSION_KEY), held + 1)
+            assets.cache.clear()
+            assets._bump_version()
+            self.assertGreater(assets.cache.get(assets.VERSION_KEY), held + 1)
+
+    def test_media_from_before_the_manifest_is_backfilled(self):
+        backfill = import_module("home.migrations.0047_backfill_stored_assets").backfill
+        with tempfile.TemporaryDirectory() as root:
+            local = {**settings.STORAGES, "default": {"BACKEND": "home.storage.LocalCloudinaryStorage",
+                                                       "OPTIONS": {"location": root, "base_url": "/media/"}}}
+            with override_settings(STORAGES=local):
+                # uploaded by an old deploy: on disk and on the category, but not in the manifest
+                icon = default_storage.save("category_icons/keys.svg", ContentFile(b"<svg/>"))
+                StoredAsset.objects.all().delete()
+                category = Category.objects.create(name="Keys", slug="backfill-keys", icon=icon)
+                with assets.uncached():
+                    self.assertFalse(default_storage.exists(icon))
+
+                with redirect_stdout(StringIO()):
+                    backfill(apps, None)
+                self.assertTrue(default_storage.exists(category.icon.name))
+
+    def test_other_workers_writes_show_up(self):
+        storage = LocalCloudinaryStorage(location=tempfile.gettempdir())
+        self.assertFalse(storage.exists("image:plugin_images/taken"))
+
+        # another worker uploads: a row plus a version bump in the shared cache
+        StoredAsset.objects.create(
+            name="image:plugin_images/taken", resource_type="image", public_id="plugin_images/taken", size=1,
+        )
+        # the cached miss stands until this process re-checks the version...
+        self.assertFalse(storage.exists("image:plugin_images/taken"))
+        # ...but picking an upload name never trusts it
+        self.assertNotEqual(storage.get_available_name("plugin_images/taken.png"), "plugin_images/taken.png")
+
+        assets.cache.set(assets.VERSION_KEY, assets.cache.get(assets.VERSION_KEY, 0) + 1)
+        # and the re-check interval passes
+        assets._checked_at = 0.0
+        self.assertTrue(storage.exists("image:plugin_images/taken"))
@@ -12,10 +12,18 @@ urlpatterns = [
     path("logout/", auth_views.LogoutView.as_view(next_page="home"), name="logout"),
     path("staff/dashboard/", views.staff_dashboard, name="staff_dashboard"),
     path("staff/delete-plugin", views.delete_plugin, name="delete_plugin"),
+    path("staff/picker/<str:source>/", views.picker, name="picker"),
+    path("staff/profiles/", views.profile_list, name="profile_list"),
+    path("staff/profiles/<str:profile_id>.folded", views.profile_stacks, name="profile_stacks"),
     path("profile/", views.profile_view, name="profile"), 
     path("about/", views.about, name="about"),
     path('ajax/search/', views.search_plugins, name='ajax_search'),
+    path('api/alternatives/<str:plugin_type>/<int:pk>/', views.alternatives_graph, name='alternatives_graph'),
     path("register/", views.register, name="register"),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:section>-<int:page>.xml', views.sitemap_section, name='sitemap_section'),
+    path('robots.txt', views.robots_txt, name='robots_txt'),
+    path('metrics', views.metrics_view, name='metrics'),
     path('rate/<str:plugin_type>/<int:plugin_id>/', views.rate_plugin, name='rate_plugin'),
     path('submissions/edit/<str:plugin_type>/<int:plugin_id>/', views.edit_plugin, name='edit_plugin'),
 ]
@@ -1,5 +1,8 @@
-from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
+from django.http import HttpResponse, JsonResponse, FileResponse, Http404
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.template import loader
 from django.db.models import Q, Avg
 from django.urls import reverse
@@ -7,23 +10,55 @@ from django.contrib import messages
 from django.contrib.auth import authenticate
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth import login
+from django.db import transaction
+from asgiref.sync import sync_to_async
 from .cloudinary_utils import delete_cloudinary_file
 
-from .models import ProPlugin, AlternativePlugin, CATEGORIES, Rating, Category, Subcategory, PluginSuggestion, AudioDemo
+from .models import (
+    ProPlugin, AlternativePlugin, CATEGORIES, Rating, Category, Subcategory, PluginSuggestion, AudioDemo,
+    PluginNeighbor, Leaderboard, PLUGIN_SORTS, LISTING_PAGE_SIZE, LEADERBOARD_METRICS, get_plugin_model, catalog,
+)
 from .forms import StaffPluginSubmission, SuggestionForm, CustomUserCreationForm
-
+from .facets import PluginFacets, RANGE_FILTERS, range_filters, range_q
+from .graph import get_graph
+from .pickers import PICKERS
+from .db_utils import sync_m2m, log_query_count, keyset_page
+from .dedupe import find_duplicate, flag_suggestion
+from .ratelimit import ratelimit
+from .ranking import record_vote
+from . import moderation, profiling, metrics
+
+import asyncio
+import hmac
 import json
+import math
+import re
+from xml.sax.saxutils import escape
+
+# materializing a queryset with the async ORM so templates never touch the db
+async def _alist(queryset):
+    return [obj async for obj in queryset]
+
+# templates still resolve request.user lazily, so rendering stays on the sync side
+_arender = sync_to_async(render)
+
+# the alternatives graph may need a rebuild from the db, so it's fetched on the sync side too
+_aget_graph = sync_to_async(get_graph)
 
 # making the home page feel more alive 
-def home(request):
-    recent_pro = ProPlugin.objects.order_by('-date_released')[:6]
-    recent_alt = AlternativePlugin.objects.order_by('-date_released')[:6]
-    top_rated_pro = ProPlugin.objects.filter(rating__gt=0).order_by('-rating')[:6]
-    top_rated_alt = AlternativePlugin.objects.filter(rating__gt=0).order_by('-rating')[:6]
+async def home(request):
+    # these four are independent, so we fire them off together
+    recent_pro, recent_alt, top_rated_pro, top_rated_alt = await asyncio.gather(
+        _alist(ProPlugin.objects.recent().cards()[:6]),
+        _alist(AlternativePlugin.objects.recent().cards()[:6]),
+        _alist(ProPlugin.objects.top_rated().cards()[:6]),
+        _alist(AlternativePlugin.objects.top_rated().cards()[:6]),
+    )
 
-    return render(request, 'home.html', {
+    return await _arender(request, 'home.html', {
         'recent_pro': recent_pro,
         'recent_alt': recent_alt,
         'top_rated_pro': top_rated_pro,
@@ -33,134 +68,198 @@ def home(request):
 # plugins routers
 # ---------
 
-def plugins(request):
+MAX_LISTING_PAGE = 1000
+
+# one page of cards plus whether there's a next one. a listing that's just one
+# category and a materialized sort reads its first page off the leaderboard
+async def _listing_page(model, plugins_qs, page, only_category, sort_by):
+    if page == 1 and only_category and sort_by in LEADERBOARD_METRICS:
+        # a dirty board is waiting for rebuild_leaderboards --dirty, the live query is current
+        ids = await Leaderboard.objects.filter(
+            plugin_type=model.plugin_type, slug=only_category, metric=sort_by, dirty_at__isnull=True,
+        ).values_list("plugin_ids", flat=True).afirst()
+        if ids is not None:
+            cards = await _alist(model.objects.filter(pk__in=ids).cards())
+            by_pk = {card.pk: card for card in cards}
+            return [by_pk[pk] for pk in ids[:LISTING_PAGE_SIZE] if pk in by_pk], len(ids) > LISTING_PAGE_SIZE
+
+    start = (page - 1) * LISTING_PAGE_SIZE
+    # one extra row says whether there's another page, no COUNT(*)
+    rows = await _alist(plugins_qs[start:start + LISTING_PAGE_SIZE + 1])
+    return rows[:LISTING_PAGE_SIZE], len(rows) > LISTING_PAGE_SIZE
+
+
+def _page_query(params, page):
+    query = params.copy()
+    query["page"] = page
+    return "?" + query.urlencode()
+
+
+async def plugins(request):
     tab = request.GET.get("tab", "pro")
     search_query = (request.GET.get("q") or "").strip()
 
     # defaulting to newest here
     sort_by = request.GET.get("sort", "newest")
+    if sort_by not in PLUGIN_SORTS:
+        sort_by = "newest"
 
-    # filter by slug field
-    active_category = request.GET.get('category')
-    categories = Category.objects.prefetch_related('subcategories').all()
-
-    # parent slug for highlighting, purely visual
-    active_parent_slug = None
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    # nobody pages 48k cards deep, and a huge page number overflows the OFFSET
+    if page > MAX_LISTING_PAGE:
+        raise Http404("No such page")
+    # every other link on the page (filters, tabs) starts back at page 1
+    params = request.GET.copy()
+    params.pop("page", None)
+
+    categories = await _alist(Category.objects.prefetch_related('subcategories'))
 
     # figure out which list we're showing
-    if tab == "alt":
-        plugins_qs = AlternativePlugin.objects.all()
-        active_tab = "alt"
-    else:
-        plugins_qs = ProPlugin.objects.all()
-        active_tab = "pro"
-
-    # validate & apply category filter
-    if active_category:
-        # is the active_category a parent category slug?
-        if Category.objects.filter(slug=active_category).exists():
-            active_parent_slug = active_category
-            plugins_qs = plugins_qs.filter(
-                subcategories__parent__slug=active_category
-            ).distinct()
-
-        # otherwise it's a subcategory slug
-        else:
-            sub = Subcategory.objects.filter(slug=active_category).first()
-            if sub:
-                active_parent_slug = sub.parent.slug
-                plugins_qs = plugins_qs.filter(
-                    subcategories__slug=active_category
-                ).distinct()
-
-    # applying search filter
-    if sort_by == "rating":
-        # sort by rating descending, then name
-        plugins_qs = plugins_qs.order_by("-rating", "name")
-    elif sort_by == "oldest":
-        plugins_qs = plugins_qs.order_by("date_released")
-    elif sort_by == "name":
-        plugins_qs = plugins_qs.order_by("name")
-    else:
-        plugins_qs = plugins_qs.order_by("-date_released")
-
+    model = AlternativePlugin if tab == "alt" else ProPlugin
+    active_tab = model.plugin_type
 
     # apply search filter if there's a query
-    if search_query:
-        plugins_qs = plugins_qs.filter(
-            Q(name__icontains=search_query)
-            # other filters can be requested too
-            # | Q(description__icontains=search_query)
-            # | Q(company__icontains=search_query)
-        )
+    plugins_qs = model.objects.search(search_query)
+
+    # min/max price and size, these apply to the facet counts as well
+    ranges = range_filters(request.GET)
+    plugins_qs = plugins_qs.filter(range_q(ranges))
+
+    # multi-select category/price/size/rating filters
+    facets = PluginFacets(params, categories, model)
+    facet_base_qs = plugins_qs
+    plugins_qs = facets.apply(plugins_qs).sorted_by(sort_by).cards()
+
+    # just one category ticked and nothing else narrowing it down
+    only_category = None
+    if not search_query and not ranges and len(facets.selected["category"]) == 1:
+        if not any(selected for param, selected in facets.selected.items() if param != "category"):
+            only_category = facets.selected["category"][0]
+    page_cards, has_more = await _listing_page(model, plugins_qs, page, only_category, sort_by)
+    if search_query and page == 1:
+        metrics.SEARCHES.inc(source="listing")
+        if not page_cards:
+            metrics.ZERO_RESULT_SEARCHES.inc(source="listing")
 
     context = {
-        "active_parent_slug": active_parent_slug,
-        "plugins": plugins_qs,
-        "categories": categories,
+        "plugins": page_cards,
+        "page": page,
+        "has_more": has_more,
+        "prev_query": _page_query(params, page - 1),
+        "next_query": _page_query(params, page + 1),
         "active_tab": active_tab,
-        "active_category": active_category,
+        "active_categories": facets.selected["category"],
+        "current_sort": sort_by,
         "search_query": search_query,
     }
 
     # ajax request, only return the list HTML
     if request.headers.get("x-requested-with") == "XMLHttpRequest":
-        return render(request, "partials/plugin_cards.html", context)
+        return await _arender(request, "partials/plugin_cards.html", context)
+
+    # sidebar counts, one grouped query per facet
+    facet_rows = await asyncio.gather(*(_alist(qs) for qs in facets.count_querysets(facet_base_qs)))
+    context.update(facets.sidebar(facet_rows))
+
+    # current filters minus the tab, for the pro/alt pills
+    filter_params = facets.params.copy()
+    filter_params.pop("tab", None)
+    context["filter_query"] = filter_params.urlencode()
+
+    # the range form resubmits every other filter as hidden inputs
+    range_params = {param for param, _ in RANGE_FILTERS}
+    context["ranges"] = ranges
+    context["range_hidden"] = [
+        (key, value) for key, values in facets.params.lists() if key not in range_params for value in values
+    ]
+
+    # every filter/sort/search combination is the same catalog again, only the
+    # bare pro and alt tabs are worth indexing
+    canonical = reverse("plugins") + ("?tab=alt" if active_tab == "alt" else "")
+    context["canonical_url"] = request.build_absolute_uri(canonical)
+    context["noindex"] = any(key != "tab" for key in request.GET)
 
     # otherwise full page render
-    return render(request, "plugins.html", context)
-
+    return await _arender(request, "plugins.html", context)
 
-def plugin_detail(request, pk):
-    plugin = get_object_or_404(ProPlugin, pk=pk)
 
-    content_type = ContentType.objects.get_for_model(plugin)
+# shared rating lookups for both detail pages
+async def _rating_context(request, plugin):
+    content_type = await sync_to_async(ContentType.objects.get_for_model)(plugin)
     ratings = Rating.objects.filter(content_type=content_type, object_id=plugin.id)
-    
+
     # check if user has already rated this
     user_rating = 0
-    if request.user.is_authenticated:
-        rating_obj = Rating.objects.filter(
-            user=request.user,
-            content_type=ContentType.objects.get_for_model(plugin),
-            object_id=plugin.id
-        ).first()
+    user = await request.auser()
+    if user.is_authenticated:
+        rating_obj = await ratings.filter(user=user).afirst()
         if rating_obj:
             user_rating = rating_obj.score
 
-    context = {
-        "plugin": plugin,
+    return {
         "user_rating": user_rating,
-        "rating_count": ratings.count(),
-        "plugin_type": "pro" # helper for the JS fetch URL
+        # kept on the plugin row by ranking.record_vote
+        "rating_count": plugin.rating_count,
     }
-    return render(request, "plugin_detail.html", context)
-
 
-def alt_plugin_detail(request, pk):
-    plugin = get_object_or_404(AlternativePlugin, pk=pk)
 
-    content_type = ContentType.objects.get_for_model(plugin)
-    ratings = Rating.objects.filter(content_type=content_type, object_id=plugin.id)
-
-    # check if user has already rated this
-    user_rating = 0
-    if request.user.is_authenticated:
-        rating_obj = Rating.objects.filter(
-            user=request.user,
-            content_type=ContentType.objects.get_for_model(plugin),
-            object_id=plugin.id
-        ).first()
-        if rating_obj:
-            user_rating = rating_obj.score
+# precomputed "similar plugins" for a detail page: the neighbour list, then all the cards in one union query
+async def _similar_plugins(plugin):
+    neighbors = await _alist(PluginNeighbor.for_plugin(plugin).values_list("neighbor_type", "neighbor_id"))
+    if not neighbors:
+        return []
+    ids = {"pro": [], "alt": []}
+    for neighbor_type, neighbor_id in neighbors:
+        ids[neighbor_type].append(neighbor_id)
+    cards = await _alist(catalog(
+        ProPlugin.objects.filter(pk__in=ids["pro"]),
+        AlternativePlugin.objects.filter(pk__in=ids["alt"]),
+    ))
+    # back into rank order; anything deleted since the last build just drops out
+    by_key = {(card.plugin_type, card.pk): card for card in cards}
+    return [by_key[key] for key in neighbors if key in by_key]
+
+
+# alternatives ranked by the alternatives graph, as (card, score) pairs in rank order
+async def _ranked_alternatives(plugin_type, pk, limit):
+    graph = await _aget_graph()
+    ranked = graph.replacements(plugin_type, pk, limit)
+    if not ranked:
+        return []
+    cards = await _alist(AlternativePlugin.objects.filter(pk__in=[alt_id for alt_id, _ in ranked]).cards())
+    by_pk = {card.pk: card for card in cards}
+    return [(by_pk[alt_id], score) for alt_id, score in ranked if alt_id in by_pk]
+
+
+async def _plugin_detail(request, model, pk):
+    plugin = await aget_object_or_404(model.objects.for_detail(), pk=pk)
+
+    lookups = [_rating_context(request, plugin), _similar_plugins(plugin)]
+    # "alternatives of alternatives" for alt pages, the pro page already lists its own
+    if model is AlternativePlugin:
+        lookups.append(_ranked_alternatives(model.plugin_type, plugin.pk, 6))
+    rating_context, similar_plugins, *family = await asyncio.gather(*lookups)
 
     context = {
         "plugin": plugin,
-        "user_rating": user_rating,
-        "rating_count": ratings.count(),
-        "plugin_type": "alt" 
+        "plugin_type": model.plugin_type, # helper for the JS fetch URL
+        "similar_plugins": similar_plugins,
+        "family_alternatives": family[0] if family else [],
+        "canonical_url": request.build_absolute_uri(request.path),
+        **rating_context,
     }
-    return render(request, 'alt_plugin_detail.html', context)
+    return await _arender(request, model.detail_template, context)
+
+
+async def plugin_detail(request, pk):
+    return await _plugin_detail(request, ProPlugin, pk)
+
+
+async def alt_plugin_detail(request, pk):
+    return await _plugin_detail(request, AlternativePlugin, pk)
 
 # ---------
 # rating logic
@@ -168,6 +267,7 @@ def alt_plugin_detail(request, pk):
 
 @login_required
 @require_POST
+@ratelimit("rate", "10/m")
 def rate_plugin(request, plugin_type, plugin_id):
     # parsing the json
     try:
@@ -180,103 +280,117 @@ def rate_plugin(request, plugin_type, plugin_id):
         return JsonResponse({'error': 'Score must be between 1 and 5'}, status=400)
 
     # resolving model
-    if plugin_type == 'pro':
-        model_class = ProPlugin
-    elif plugin_type == 'alt':
-        model_class = AlternativePlugin
-    else:
+    model_class = get_plugin_model(plugin_type)
+    if model_class is None:
         return JsonResponse({'error': 'Invalid plugin type'}, status=400)
 
     plugin = get_object_or_404(model_class, pk=plugin_id)
 
-    # create or update rating
-    Rating.objects.update_or_create(
-        user=request.user,
-        content_type=ContentType.objects.get_for_model(plugin),
-        object_id=plugin.id,
-        defaults={'score': score}
-    )
+    # create or update rating, then the average and ranking scores on the model
+    plugin = record_vote(request.user, plugin, score)
 
-    # recalculate average on the model 
-    if hasattr(plugin, 'calculate_average_rating'):
-        plugin.calculate_average_rating()
-    
     return JsonResponse({'success': True, 'new_average': plugin.rating})
 
 def staff_check(user):
     return user.is_authenticated and user.is_staff
 
+# stores an uploaded file under its field's upload_to and returns the stored name.
+# edit_plugin calls this before its transaction opens, cloudinary can take seconds
+def _upload(field, instance, upload):
+    name = field.generate_filename(instance, upload.name)
+    return field.storage.save(name, upload, max_length=field.max_length)
+
+# the edit's new files, uploaded up front: {form field: (stored name, resource type)}
+def _upload_edit_files(plugin, model, data):
+    uploads = {}
+    if data.get("image"):
+        uploads["image"] = (_upload(model._meta.get_field("image"), plugin, data["image"]), "image")
+    audio_field = AudioDemo._meta.get_field("audio_file")
+    for i in range(1, 4):
+        if data.get(f"audio_demo_{i}"):
+            uploads[f"audio_demo_{i}"] = (_upload(audio_field, AudioDemo(), data[f"audio_demo_{i}"]), "video")
+    return uploads
+
+# everything a valid edit form changes, run inside one transaction by edit_plugin.
+# the files are already uploaded; returns the (name, resource type) of the files
+# they replace, for deleting once the transaction has committed
+def _apply_plugin_edit(plugin, model, data, existing_demos, uploads):
+    replaced = []
+
+    # update scalar fields
+    plugin.name = data["plugin_name"]
+    plugin.date_released = data["date_released"]
+    plugin.price = data["price"]
+    plugin.description = data["description"]
+    plugin.size = data["size"]
+    plugin.download_link = data["download_link"]
+
+    # only replace if a new plugin was uploaded
+    if "image" in uploads:
+        if plugin.image:
+            replaced.append((plugin.image.name, "image"))
+        plugin.image = uploads["image"][0]
+
+    plugin.save()
+
+    # only the rows that actually changed get deleted/inserted
+    sync_m2m(plugin.subcategories, data["subcategory"])
+
+    # have to update which PRO plugins point to this one
+    if model is AlternativePlugin:
+        sync_m2m(plugin.pro_plugins, data.get("link_to_pro_plugins", []))
+
+    # handle audio demos
+    # we have to 1.) delete old ones and 2.) save new ones
+    # read once, and only if there's something to replace
+    demo_list = list(existing_demos) if any(f"audio_demo_{i}" in uploads for i in range(1, 4)) else []
+    for i in range(1, 4):
+        audio_file = data.get(f"audio_demo_{i}")
+        title = data.get(f"demo_title_{i}", "")
+
+        if f"audio_demo_{i}" in uploads:
+            # replace the i-th existing demo if it exists, else create
+            if i - 1 < len(demo_list):
+                demo = demo_list[i - 1]
+                replaced.append((demo.audio_file.name, "video"))
+            else:
+                demo = AudioDemo()
+                setattr(demo, model.demo_field, plugin)
+            demo.audio_file = uploads[f"audio_demo_{i}"][0]
+            demo.title = title or audio_file.name
+            demo.save()
+    return replaced
+
 # this is industrial...
 @user_passes_test(staff_check, login_url="login")
 def edit_plugin(request, plugin_type, plugin_id):
-    if plugin_type == "PRO":
-        plugin = get_object_or_404(ProPlugin, pk=plugin_id)
-    elif plugin_type == "ALT":
-        plugin = get_object_or_404(AlternativePlugin, pk=plugin_id)
-    else:
+    model = get_plugin_model(plugin_type)
+    if model is None:
         messages.error(request, "Invalid plugin type")
         return redirect("staff_dashboard")
-    
+    plugin = get_object_or_404(model, pk=plugin_id)
+
     existing_demos = plugin.audio_demos.all()
     # update if we send a POST. we prepopulate data otherwise
     if request.method == "POST":
         form = StaffPluginSubmission(request.POST, request.FILES)
         if(form.is_valid()):
             data = form.cleaned_data
-
-            # update scalar fields
-            plugin.name = data["plugin_name"]
-            plugin.date_released = data["date_released"]
-            plugin.price = data["price"]
-            plugin.description = data["description"]
-            plugin.size = data["size"]
-            plugin.download_link = data["download_link"]
-
-            # only replace if a new plugin was uploaded
-            if data.get("image") and plugin.image:
-                delete_cloudinary_file(plugin.image.name, default_resource_type="image")
-            if data.get("image"):
-                plugin.image = data["image"]
-            
-            plugin.save()
-            plugin.subcategories.set(data["subcategory"])
-
-            # have to update which ALT plugins point to this one
-            if plugin_type == "ALT":
-                # remove this alt from every pro plugin that currently links to it
-                for pro in ProPlugin.objects.filter(alternatives=plugin):
-                    pro.alternatives.remove(plugin)
-                # re-add only the ones the staff member selected
-                for pro in data.get("link_to_pro_plugins", []):
-                    pro.alternatives.add(plugin)
-            
-            # handle audio demos
-            # we have to 1.) delete old ones and 2.) save new ones
-            for i in range(1, 4):
-                audio_file = data.get(f"audio_demo_{i}")
-                title = data.get(f"demo_title_{i}", "")
-
-                if audio_file:
-                    # replace the i-th existing demo if it exists, else create
-                    demo_list = list(existing_demos)
-                    if i - 1 < len(demo_list):
-                        demo = demo_list[i - 1]
-                        delete_cloudinary_file(demo.audio_file.name, default_resource_type="video")
-                        demo.audio_file = audio_file
-                        demo.title = title or audio_file.name
-                        demo.save()
-                    else:
-                        demo = AudioDemo(audio_file=audio_file, title=title or audio_file.name)
-                        if plugin_type == "PRO":
-                            demo.pro_plugin = plugin
-                        else:
-                            demo.alt_plugin = plugin
-                        demo.save()
+            # cloudinary calls stay out of the transaction: a slow upload would hold
+            # it open, and an event id taken early and committed late is one the
+            # event log's readers have to wait for (see events.py)
+            uploads = _upload_edit_files(plugin, model, data)
+            try:
+                with log_query_count(f"edit {plugin_type} plugin {plugin.pk}"), transaction.atomic():
+                    replaced = _apply_plugin_edit(plugin, model, data, existing_demos, uploads)
+            except Exception:
+                for name, resource_type in uploads.values():
+                    delete_cloudinary_file(name, default_resource_type=resource_type)
+                raise
+            for name, resource_type in replaced:
+                delete_cloudinary_file(name, default_resource_type=resource_type)
             messages.success(request, f"'{plugin.name}' updated successfully.")
-            if plugin_type == "PRO":
-                return redirect("plugin_detail", pk=plugin.pk)
-            else:
-                return redirect("alt_plugin_detail", pk=plugin.pk)
+            return redirect(model.detail_url_name, pk=plugin.pk)
     else:
         # pre-populate the form with existing data
         initial = {
@@ -287,10 +401,11 @@ def edit_plugin(request, plugin_type, plugin_id):
             "description": plugin.description,
             "size": plugin.size,
             "download_link": plugin.download_link,
-            "subcategory": plugin.subcategories.all(),
+            # the pickers only need ids, they look up labels for just these rows
+            "subcategory": list(plugin.subcategories.values_list("pk", flat=True)),
         }
         if plugin_type == "ALT":
-            initial["link_to_pro_plugins"] = ProPlugin.objects.filter(alternatives=plugin)
+            initial["link_to_pro_plugins"] = list(plugin.pro_plugins.values_list("pk", flat=True))
 
         # pre-fill audio demo titles (files can't be pre-filled by browsers)
         for i, demo in enumerate(existing_demos[:3], start=1):
@@ -326,37 +441,41 @@ def register(request):
     return render(request, 'register.html', {'form': form})
 
 @login_required
+# throttles posting before the pending-suggestion COUNT below
+@ratelimit("suggest", "5/h", methods=["POST"])
 def profile_view(request):
     # handle the form submission
     if request.method == 'POST':
         form = SuggestionForm(request.POST)
         if form.is_valid():
-            # count how many PENDING suggestions this specific user has
-            pending_count = PluginSuggestion.objects.filter(
-                submitter=request.user, 
-                status='PENDING'
-            ).count()
-
-            # if they have 3 or more, stop them.
-            if pending_count >= 3:
+            # if they already have 3 pending, stop them.
+            if moderation.at_pending_limit(request.user):
                 form.add_error(None, "You have reached the limit of 3 pending suggestions. Please wait for staff approval.")
             else:
                 # they are under the limit, save as normal
                 suggestion = form.save(commit=False)
                 suggestion.submitter = request.user
-                suggestion.save()
+                # the suggestion and its catalog event commit together
+                with transaction.atomic():
+                    suggestion.save()
+                # staff see this on the queue, the user sees it in their history
+                flag_suggestion(suggestion)
                 return redirect('profile')
     else:
         form = SuggestionForm()
 
-    # fetch user's history
-    user_suggestions = PluginSuggestion.objects.filter(
-        submitter=request.user
-    ).order_by('-date_suggested')
+    # fetch user's history, a page at a time
+    user_suggestions, next_cursor = keyset_page(
+        PluginSuggestion.objects.filter(submitter=request.user),
+        "-date_suggested",
+        after=request.GET.get("after"),
+        size=moderation.HISTORY_PAGE_SIZE,
+    )
 
     context = {
         'form': form,
-        'user_suggestions': user_suggestions
+        'user_suggestions': user_suggestions,
+        'next_cursor': next_cursor,
     }
     return render(request, 'profile.html', context)
 
@@ -367,11 +486,21 @@ def profile_view(request):
 def staff_dashboard(request):
     # handling rejecting a plugin
     if request.method == "POST" and "reject_suggestion" in request.POST:
-        s_id = request.POST.get("suggestion_id")
-        PluginSuggestion.objects.filter(pk=s_id).update(status='REJECTED')
+        suggestion_id = request.POST.get("suggestion_id", "")
+        if not suggestion_id.isdigit():
+            raise Http404("No such suggestion.")
+        moderation.set_status([suggestion_id], "REJECTED")
         messages.info(request, "Suggestion rejected.")
         return redirect("staff_dashboard")
 
+    # ticked suggestions approved or rejected together, in one UPDATE
+    if request.method == "POST" and request.POST.get("batch_action") in ("approve", "reject"):
+        status = "APPROVED" if request.POST["batch_action"] == "approve" else "REJECTED"
+        ids = [i for i in request.POST.getlist("suggestion_ids") if i.isdigit()]
+        changed = moderation.set_status(ids, status)
+        messages.info(request, f"{len(changed)} suggestions marked as {status.lower()}.")
+        return redirect("staff_dashboard")
+
     # handling a plugin submission from a staff member
     if request.method == "POST" and "submit_plugin" in request.POST:
         form = StaffPluginSubmission(request.POST, request.FILES)
@@ -389,61 +518,69 @@ def staff_dashboard(request):
                 image=data.get("image"),
             )
 
-            created_plugin = None
-            is_pro = False
-
-            if data["plugin_type"] == "PRO":
-                plugin = ProPlugin.objects.create(**common)
-                plugin.subcategories.set(data["subcategory"])
-                created_plugin = plugin
-                is_pro = True
-            else:
-                alt = AlternativePlugin.objects.create(**common)
-                alt.subcategories.set(data["subcategory"])
-                for pro in data.get("link_to_pro_plugins", []):
-                    pro.alternatives.add(alt)
-                created_plugin = alt 
-                is_pro = False # pedantic
-
-            for i in range(1, 4):
-                audio_file = data.get(f"audio_demo_{i}")
-                title = data.get(f"demo_title_{i}")
-
-                if audio_file:
-                    demo = AudioDemo(
-                        audio_file=audio_file,
-                        title=title if title else audio_file.name # fallback to filename
-                    )
-                    # Link to the correct parent
-                    if is_pro:
-                        demo.pro_plugin = created_plugin
-                    else:
-                        demo.alt_plugin = created_plugin
-                    
-                    demo.save()
+            # the plugin, its links, demos and events land together or not at all
+            with transaction.atomic():
+                model = get_plugin_model(data["plugin_type"])
+                created_plugin = model.objects.create(**common)
+                created_plugin.subcategories.set(data["subcategory"])
+                if model is AlternativePlugin:
+                    # one insert for all the links, same as .set() on the edit page
+                    created_plugin.pro_plugins.add(*data.get("link_to_pro_plugins", []))
+
+                for i in range(1, 4):
+                    audio_file = data.get(f"audio_demo_{i}")
+                    title = data.get(f"demo_title_{i}")
+
+                    if audio_file:
+                        demo = AudioDemo(
+                            audio_file=audio_file,
+                            title=title if title else audio_file.name # fallback to filename
+                        )
+                        # Link to the correct parent
+                        setattr(demo, model.demo_field, created_plugin)
+                        demo.save()
             
-            # checking if the comes from a submission
-            sid = data.get("suggestion_id")
-            if sid:
-                PluginSuggestion.objects.filter(pk=sid).update(status='APPROVED')
+                # checking if the comes from a submission
+                sid = data.get("suggestion_id")
+                if sid:
+                    moderation.set_status([sid], "APPROVED")
 
             messages.success(request, "Plugin submitted successfully!")
+            # not blocking, some plugins really do share a name
+            match = find_duplicate(created_plugin.name, created_plugin.download_link, exclude=(model.plugin_type, created_plugin.pk))
+            if match and match.kind != "sugg":
+                messages.warning(request, f"'{created_plugin.name}' looks like the existing plugin '{match.label}' ({match.reason}).")
             return redirect("staff_dashboard")
     else:
         form = StaffPluginSubmission()
 
-    # fetching peding suggestions from the UI
-    suggestions = PluginSuggestion.objects.filter(status='PENDING').order_by('date_suggested')
+    # fetching peding suggestions for the UI, oldest first, a page at a time
+    pending = PluginSuggestion.objects.filter(status='PENDING')
+    suggestions, next_cursor = keyset_page(
+        pending.select_related("submitter"),
+        "date_suggested",
+        after=request.GET.get("after"),
+        size=moderation.QUEUE_PAGE_SIZE,
+    )
 
-    # fetching pro and alt plugins
-    my_pro_plugins = ProPlugin.objects.filter(submitter=request.user).order_by('-date_released')
-    my_alt_plugins = AlternativePlugin.objects.filter(submitter=request.user).order_by('-date_released')
+    # fetching pro and alt plugins, newest first, each list paged on its own
+    my_pro_plugins, next_pro_cursor = keyset_page(
+        ProPlugin.objects.submitted_by(request.user).cards(), "-date_released", after=request.GET.get("pro_after"),
+    )
+    my_alt_plugins, next_alt_cursor = keyset_page(
+        AlternativePlugin.objects.submitted_by(request.user).cards(), "-date_released", after=request.GET.get("alt_after"),
+    )
 
     return render(request, "staff_dashboard.html", {
         "form": form,
         "suggestions": suggestions,
+        # counted off the (status, date_suggested) index
+        "pending_count": pending.count() if suggestions else 0,
+        "next_cursor": next_cursor,
         "my_pro_plugins": my_pro_plugins,
         "my_alt_plugins": my_alt_plugins,
+        "next_pro_cursor": next_pro_cursor,
+        "next_alt_cursor": next_alt_cursor,
     })
 
 @user_passes_test(staff_check, login_url="login")
@@ -452,11 +589,8 @@ def delete_plugin(request):
     plugin_id = request.POST.get('plugin_id')
     plugin_type = request.POST.get('plugin_type')
     
-    if plugin_type == 'PRO':
-        model = ProPlugin
-    elif plugin_type == 'ALT':
-        model = AlternativePlugin
-    else:
+    model = get_plugin_model(plugin_type)
+    if model is None:
         messages.error(request, "Invalid plugin type.")
         return redirect("staff_dashboard")
         
@@ -475,40 +609,222 @@ def delete_plugin(request):
     
     return redirect("staff_dashboard")
 
+# recent request profiles, see profiling.py
+@user_passes_test(staff_check, login_url="login")
+def profile_list(request):
+    return render(request, "staff_profiles.html", {
+        "profiles": profiling.recent(limit=settings.PROFILE_KEEP),
+        "sample_percent": settings.PROFILE_SAMPLE_RATE * 100,
+        "header": profiling.HEADER,
+    })
+
+# collapsed stacks, ready for flamegraph.pl or speedscope
+@user_passes_test(staff_check, login_url="login")
+def profile_stacks(request, profile_id):
+    path = profiling.folded_path(profile_id)
+    if path is None:
+        return HttpResponse("No such profile.", status=404, content_type="text/plain")
+    with open(path) as f:
+        return HttpResponse(f.read(), content_type="text/plain")
+
+# one page of picker options for the staff forms' searchable multi-selects
+@user_passes_test(staff_check, login_url="login")
+def picker(request, source):
+    if source not in PICKERS:
+        return JsonResponse({'error': 'Unknown picker'}, status=404)
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    rows, has_more = PICKERS[source].search((request.GET.get('q') or '').strip(), page)
+    return JsonResponse({
+        'results': [{'id': pk, 'label': label} for pk, label in rows],
+        'has_more': has_more,
+    })
+
 def about(request):
     return render(request, "about.html")
 
-def search_plugins(request):
+# one search hit (a catalog() card), shaped for the navbar dropdown
+def _search_result(card, sub_names):
+    model = get_plugin_model(card.plugin_type)
+    return {
+        'name': card.name,
+        # build a readable category string from subcategories
+        'category': ", ".join(sub_names) if sub_names else "Uncategorized",
+        'type': 'Pro/Paid' if model is ProPlugin else 'Free',
+        'image': card.image_url,
+        'url': reverse(model.detail_url_name, args=[card.pk])
+    }
+
+# navbar dropdown rows per plugin type
+NAVBAR_RESULTS_PER_TYPE = 3
+
+# one request per keystroke, anonymous, so limited per IP
+@ratelimit("search", "30/10s", key="ip")
+async def search_plugins(request):
     query = (request.GET.get('q') or '').strip()
     results = []
 
     if len(query) > 1:
-        # limit + prefetch to avoid N+1 queries
-        alts = AlternativePlugin.objects.filter(name__icontains=query).prefetch_related('subcategories')[:3]
-        for item in alts:
-            # build a readable category string from subcategories
-            sub_names = list(item.subcategories.order_by('parent__name', 'name').values_list('name', flat=True))
-            category_display = ", ".join(sub_names) if sub_names else "Uncategorized"
-
-            results.append({
-                'name': item.name,
-                'category': category_display,
-                'type': 'Free',
-                'image': item.image_url,
-                'url': reverse('alt_plugin_detail', args=[item.pk])
-            })
-
-        pros = ProPlugin.objects.filter(name__icontains=query).prefetch_related('subcategories')[:3]
-        for item in pros:
-            sub_names = list(item.subcategories.order_by('parent__name', 'name').values_list('name', flat=True))
-            category_display = ", ".join(sub_names) if sub_names else "Uncategorized"
-
-            results.append({
-                'name': item.name,
-                'category': category_display,
-                'type': 'Pro/Paid',
-                'image': item.image_url,
-                'url': reverse('plugin_detail', args=[item.pk])
-            })
+        # up to 3 of each type in one query, free ones first like before. the limit
+        # sits in an id subquery per side, sqlite won't take LIMIT inside a UNION
+        def first_matches(model):
+            matches = model.objects.search(query)
+            return matches.filter(pk__in=matches.order_by('name', 'id').values('pk')[:NAVBAR_RESULTS_PER_TYPE])
+
+        cards = await _alist(
+            catalog(first_matches(ProPlugin), first_matches(AlternativePlugin)).order_by('plugin_type', 'name')
+        )
+
+        # then the subcategory names for just those rows, one query per type
+        sub_names = {}
+        for model in (ProPlugin, AlternativePlugin):
+            ids = [card.pk for card in cards if card.plugin_type == model.plugin_type]
+            if not ids:
+                continue
+            links = model.subcategories.through.objects.filter(**{f"{model._meta.model_name}_id__in": ids})
+            async for plugin_id, name in links.order_by('subcategory__parent__name', 'subcategory__name').values_list(
+                f"{model._meta.model_name}_id", 'subcategory__name'
+            ):
+                sub_names.setdefault((model.plugin_type, plugin_id), []).append(name)
+
+        results = [_search_result(card, sub_names.get((card.plugin_type, card.pk))) for card in cards]
+        metrics.SEARCHES.inc(source="navbar")
+        if not results:
+            metrics.ZERO_RESULT_SEARCHES.inc(source="navbar")
 
     return JsonResponse({'results': results})
+
+
+# k-hop neighbourhood and ranked replacements from the in-memory alternatives graph
+async def alternatives_graph(request, plugin_type, pk):
+    model = get_plugin_model(plugin_type)
+    if model is None:
+        return JsonResponse({'error': 'Invalid plugin type'}, status=400)
+    if not await model.objects.filter(pk=pk).aexists():
+        return JsonResponse({'error': 'Plugin not found'}, status=404)
+
+    try:
+        hops = min(max(int(request.GET.get('hops', 2)), 1), 6)
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({'error': 'hops and limit must be numbers'}, status=400)
+
+    graph = await _aget_graph()
+    neighborhood = graph.k_hop(model.plugin_type, pk, hops)
+    replacements = await _ranked_alternatives(model.plugin_type, pk, limit)
+
+    return JsonResponse({
+        'plugin': {'type': model.plugin_type, 'id': pk},
+        'hops': hops,
+        'neighborhood': {
+            side: [{'id': node, 'distance': distance} for node, distance in sorted(nodes.items(), key=lambda n: (n[1], n[0]))]
+            for side, nodes in neighborhood.items()
+        },
+        'replacements': [
+            {
+                'id': card.pk,
+                'name': card.name,
+                'price': card.price,
+                'image': card.image_url,
+                'url': reverse('alt_plugin_detail', args=[card.pk]),
+                'score': score,
+            }
+            for card, score in replacements
+        ],
+    })
+
+
+# ---------
+# sitemap / robots
+# ---------
+
+# plugin urls per sitemap file, well under the 50k the protocol allows
+SITEMAP_CHUNK = 10000
+
+def _sitemap(request, tag, entries):
+    # entries: (path, lastmod or None)
+    def lines():
+        yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+        yield f'<{tag} xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        item = "sitemap" if tag == "sitemapindex" else "url"
+        for path, lastmod in entries:
+            yield f"<{item}><loc>{escape(request.build_absolute_uri(path))}</loc>"
+            if lastmod:
+                yield f"<lastmod>{lastmod.date().isoformat()}</lastmod>"
+            yield f"</{item}>\n"
+        yield f"</{tag}>\n"
+    return HttpResponse(lines(), content_type="application/xml")
+
+
+@cache_control(public=True, max_age=3600)
+def sitemap_index(request):
+    sections = [(reverse("sitemap_section", args=["pages", 1]), None)]
+    for model in (ProPlugin, AlternativePlugin):
+        pages = math.ceil(model.objects.count() / SITEMAP_CHUNK)
+        sections += [(reverse("sitemap_section", args=[model.plugin_type, page]), None) for page in range(1, pages + 1)]
+    return _sitemap(request, "sitemapindex", sections)
+
+
+@cache_control(public=True, max_age=3600)
+def sitemap_section(request, section, page):
+    if section == "pages":
+        if page != 1:
+            return HttpResponse(status=404)
+        paths = [reverse("home"), reverse("plugins"), reverse("plugins") + "?tab=alt", reverse("about")]
+        return _sitemap(request, "urlset", [(path, None) for path in paths])
+
+    model = get_plugin_model(section)
+    # only the files the index lists, a huge page number would overflow the OFFSET
+    if model is None or not 1 <= page <= math.ceil(model.objects.count() / SITEMAP_CHUNK):
+        return HttpResponse(status=404)
+    # pk and updated_at only, streamed off the cursor rather than built as model instances
+    start = (page - 1) * SITEMAP_CHUNK
+    rows = model.objects.order_by("pk").values_list("pk", "updated_at")[start:start + SITEMAP_CHUNK]
+    return _sitemap(request, "urlset", (
+        (reverse(model.detail_url_name, args=[pk]), updated_at) for pk, updated_at in rows.iterator(chunk_size=2000)
+    ))
+
+
+def robots_txt(request):
+    lines = [
+        "User-agent: *",
+        # search results are unbounded, filtered listings carry noindex instead
+        "Disallow: /plugins?*q=",
+        "Disallow: /ajax/",
+        "Disallow: /api/",
+        "Disallow: /staff/",
+        "Disallow: /rate/",
+        "Disallow: /submissions/",
+        "Disallow: /profile/",
+        "Disallow: /metrics",
+        f"Sitemap: {request.build_absolute_uri(reverse('sitemap_index'))}",
+    ]
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain")
+
+
+# prometheus scrape target, see metrics.py
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+    return HttpResponse(metrics.exposition(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# media for storage.LocalCloudinaryStorage, at the same paths cloudinary would use:
+# <resource_type>/upload/[<transformation>/][v<version>/]<public_id>. the original
+# file is served whatever the transformation asks for
+CLOUDINARY_SEGMENT = re.compile(r"^([a-z]{1,3}_[^/,]+(,[a-z]{1,3}_[^/,]+)*|v\d+)$")
+
+def local_media(request, resource_type, path):
+    segments = path.split("/")
+    while len(segments) > 1 and CLOUDINARY_SEGMENT.match(segments[0]):
+        segments.pop(0)
+    try:
+        file_path = default_storage.locate("/".join(segments), resource_type)
+    except SuspiciousFileOperation:
+        file_path = None
+    if file_path is None:
+        raise Http404("No such media file")
+    return FileResponse(open(file_path, "rb"))
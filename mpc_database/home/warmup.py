@@ -0,0 +1,23 @@
+from pathlib import Path
+
+from django.template import engines
+
+# -----------------------
+# TEMPLATE WARM-UP
+# -----------------------
+
+# parse every template under home/templates into the cached loader when a worker
+# boots, so the first request to each page doesn't pay for it. called from wsgi.py/asgi.py
+
+TEMPLATE_DIR = Path(__file__).resolve().parent / "templates"
+
+
+def template_names():
+    return sorted(path.relative_to(TEMPLATE_DIR).as_posix() for path in TEMPLATE_DIR.rglob("*.html"))
+
+
+def warm_templates():
+    engine = engines["django"]
+    for name in template_names():
+        engine.get_template(name)
+    return len(template_names())
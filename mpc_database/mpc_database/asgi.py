@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mpc_database.settings')
 
 application = get_asgi_application()
+
+# compile every template up front so no request ever parses one
+from home.warmup import warm_templates  # noqa: E402 (needs the app registry loaded above)
+
+warm_templates()
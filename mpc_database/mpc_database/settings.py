@@ -13,10 +13,10 @@ from dotenv import load_dotenv
 load_dotenv()
 from pathlib import Path
 import shutil
-import subprocess
+import sys
+import tempfile
 import os
 import dj_database_url
-import cloudinary
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,24 +49,31 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'cloudinary', 
     'django.contrib.staticfiles',
     'home',
-    'tailwind',
-    'theme',
 ]
 
+# tailwind/theme only build the stylesheet (manage.py tailwind ..., and collectstatic
+# picking up theme/static). a worker serving requests never needs them, so outside
+# DEBUG they're installed for manage.py commands only, or with DJANGO_BUILD_APPS=1
+BUILD_APPS = DEBUG or os.path.basename(sys.argv[0]) == "manage.py" or os.environ.get("DJANGO_BUILD_APPS") == "1"
+if BUILD_APPS:
+    INSTALLED_APPS += ['tailwind', 'theme']
+
 if DEBUG:
     # Add django_browser_reload only in DEBUG mode
     INSTALLED_APPS += ['django_browser_reload']
 
 MIDDLEWARE = [
+    'home.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'home.snapshots.SnapshotMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'home.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware' 
 ]
@@ -83,13 +90,20 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # spelled out instead of APP_DIRS so every template is parsed once per worker,
+            # whatever DEBUG is set to. runserver's autoreloader still clears it on edits
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -98,6 +112,8 @@ WSGI_APPLICATION = 'mpc_database.wsgi.application'
 
 # tailwind
 TAILWIND_APP_NAME = 'theme'
+# the built stylesheet, base.html links it with {% stylesheet %} so serving doesn't need the tailwind app
+TAILWIND_CSS_PATH = 'css/dist/styles.css'
 
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'home'
@@ -109,6 +125,50 @@ DATABASES = {
     'default': dj_database_url.config(default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}")
 }
 
+# one cache every worker process shares: card fragments and the version numbers
+# that tell each process its in-memory copies (alternatives graph, asset
+# manifest) are stale. a per-process LocMemCache would never pass a version bump
+# on. redis with REDIS_URL, otherwise a table in the main database (created by a
+# migration).
+#
+# rate limits (home/ratelimit.py) count in their own alias, RATELIMIT_CACHE, so a
+# burst of counters can't cull the cards and version keys (and the other way
+# round). its keys carry their own timeouts and are never culled early. only
+# redis makes the counting atomic and keeps it off the database; the table
+# fallback is for runserver and single-worker deploys.
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        },
+        "ratelimit": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+            "KEY_PREFIX": "ratelimit",
+            "TIMEOUT": None,
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "django_cache",
+        },
+        "ratelimit": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "ratelimit_cache",
+            "TIMEOUT": None,
+            "OPTIONS": {"MAX_ENTRIES": 1_000_000},
+        },
+    }
+
+# behind railway's proxy REMOTE_ADDR is the proxy, so the client is read from
+# X-Forwarded-For: RATELIMIT_TRUST_FORWARDED_FOR is how many proxies sit in front
+# of the app (0 when nothing does, as with runserver)
+RATELIMIT_CACHE = "ratelimit"
+RATELIMIT_TRUST_FORWARDED_FOR = int(os.environ.get("RATELIMIT_TRUST_FORWARDED_FOR") or (0 if DEBUG else 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -140,15 +200,48 @@ STORAGES = {
         "BACKEND": "home.storage.CloudinaryStorage",
     },
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+        # whitenoise's hashed + gzip/brotli storage, plus avif/webp image variants
+        "BACKEND": "home.storage.OptimizedStaticFilesStorage",
+    },
+}
+
+# hashed file names never change content, so browsers can keep them for good
+WHITENOISE_IMMUTABLE_FILE_TEST = r"^.+\.[0-9a-f]{12}\.\w+$"
+
+# prerendered detail pages for logged-out visitors (manage.py prerender), off unless set
+PRERENDER_ROOT = os.environ.get("PRERENDER_ROOT") or None
+
+# sampling profiler (home/profiling.py) for this fraction of requests, plus staff
+# requests sent with an X-Profile header. the newest PROFILE_KEEP profiles are
+# kept on local disk, away from MEDIA_ROOT
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE") or 0)
+PROFILE_ROOT = os.environ.get("PROFILE_ROOT") or os.path.join(tempfile.gettempdir(), "mpc_database-profiles")
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP") or 200)
+PROFILE_INTERVAL = 0.005
+
+# app metrics at /metrics (home/metrics.py). with several worker processes, set
+# METRICS_DIR to a directory they share and empty it on each deploy. with
+# METRICS_TOKEN set, scrapes need "Authorization: Bearer <token>"
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+
+# media on local disk with cloudinary's naming, urls and deletes (the default with
+# DEBUG, or LOCAL_MEDIA=1). MEDIA_LATENCY/MEDIA_JITTER (seconds) and
+# MEDIA_FAILURE_RATE (0-1) slow down or fail its calls, for load-testing uploads
+LOCAL_MEDIA_STORAGE = {
+    "BACKEND": "home.storage.LocalCloudinaryStorage",
+    "OPTIONS": {
+        "latency": float(os.environ.get("MEDIA_LATENCY") or 0),
+        "jitter": float(os.environ.get("MEDIA_JITTER") or 0),
+        "failure_rate": float(os.environ.get("MEDIA_FAILURE_RATE") or 0),
     },
 }
+if os.environ.get("LOCAL_MEDIA") == "1":
+    STORAGES["default"] = LOCAL_MEDIA_STORAGE
 
 if DEBUG:
     STORAGES = {
-        "default": {
-            "BACKEND": "django.core.files.storage.FileSystemStorage",
-        },
+        "default": LOCAL_MEDIA_STORAGE,
         "staticfiles": {
             "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
         },
@@ -175,7 +268,23 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# npm
-NPM_BIN_PATH = shutil.which("npm") or "npm"
+# npm, only looked up when the tailwind commands can run
+if BUILD_APPS:
+    NPM_BIN_PATH = shutil.which("npm") or "npm"
 
 AUTH_USER_MODEL = "home.CustomUser"
+
+# app logs (query counts for staff edits, storage warnings) go to stdout
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "home": {
+            "handlers": ["console"],
+            "level": os.environ.get("HOME_LOG_LEVEL", "INFO"),
+        },
+    },
+}
@@ -18,12 +18,17 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
+from home.views import local_media
 
 urlpatterns = [
     path('', include('home.urls')),
     path('admin/', admin.site.urls),
 ]
 
+if settings.STORAGES["default"]["BACKEND"] == "home.storage.LocalCloudinaryStorage":
+    # cloudinary-shaped media urls for the local stand-in, ahead of the plain media route below
+    urlpatterns += [path(f"{settings.MEDIA_URL.strip('/')}/<str:resource_type>/upload/<path:path>", local_media)]
+
 if settings.DEBUG:
     # Include django_browser_reload URLs only in DEBUG mode
     urlpatterns += [ path("__reload__/", include("django_browser_reload.urls")), ]